@@ -1,86 +1,163 @@
-import json
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 import random
-from textblob import TextBlob
 import logging
+from conversation_history import ConversationHistory
+from feedback_sink import get_feedback_sink
+from kb_registry import FAQ_PATH, FAQMatch, KnowledgeBase, get_knowledge_base, prefetch_knowledge_base
+from metrics import metrics
+from near_duplicate import NearDuplicateIndex, cached_faq_lookup, cached_faq_lookup_batch
+from sentiment import get_analyzer
+from turn_log import turn_log
+from warmup import ENGINE_TASKS, start_background
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+DEFAULT_FAQ = {
+    "greetings": {
+        "responses": ["Hello! How can I assist you today?", "Hi there! What can I help you with?"]
+    },
+    "goodbye": {
+        "responses": ["Goodbye! Have a great day!", "Thank you for chatting with us. Goodbye!"]
+    },
+    "help": {
+        "responses": ["I can help you with general inquiries, product information, and more. What would you like to know?"]
+    }
+}
+
+# Default for _check_faq: look the match up rather than take one from the caller
+_LOOKUP = object()
+
 class AIChatbot:
-    def __init__(self):
-        self.conversation_history: List[Dict] = []
-        self.faq = self._load_faq()
+    def __init__(self, fuzzy_min_score: float = 3.0, faq_path: str = FAQ_PATH,
+                 history_capacity: int = 1000, history_max_bytes: Optional[int] = 1 << 20,
+                 sentiment_backend: str = 'textblob', near_duplicates: Optional[NearDuplicateIndex] = None):
+        self.conversation_history = ConversationHistory(capacity=history_capacity, max_bytes=history_max_bytes)
+        self.sentiment_backend = sentiment_backend
+        self.sentiment = get_analyzer(sentiment_backend)
+        self.faq_path = faq_path
+        self.fuzzy_min_score = fuzzy_min_score
+        # Rephrasings of earlier questions reuse their FAQ match instead of rescanning
+        self.near_duplicates = near_duplicates
+        # Compiled off the critical path; the first reply waits for it if needed
+        prefetch_knowledge_base(self.faq_path, DEFAULT_FAQ)
         self.user_context = {}
         
-    def _load_faq(self) -> Dict:
-        """Load FAQ knowledge base from JSON file."""
-        try:
-            with open('faq_knowledge_base.json', 'r') as f:
-                return json.load(f)
-        except FileNotFoundError:
-            logging.warning("FAQ knowledge base not found. Using default FAQs.")
-            return {
-                "greetings": {
-                    "responses": ["Hello! How can I assist you today?", "Hi there! What can I help you with?"]
-                },
-                "goodbye": {
-                    "responses": ["Goodbye! Have a great day!", "Thank you for chatting with us. Goodbye!"]
-                },
-                "help": {
-                    "responses": ["I can help you with general inquiries, product information, and more. What would you like to know?"]
-                }
-            }
+    def _load_faq(self) -> KnowledgeBase:
+        """Get the shared, precompiled FAQ knowledge base (reloaded when the file changes)."""
+        return get_knowledge_base(self.faq_path, DEFAULT_FAQ)
+    
+    @property
+    def faq(self) -> Dict:
+        return self._load_faq().faq
     
     def analyze_sentiment(self, text: str) -> float:
         """Analyze the sentiment of the input text."""
-        analysis = TextBlob(text)
-        return analysis.sentiment.polarity
+        return self.sentiment.analyze(text)
+    
+    def analyze_sentiment_batch(self, texts: List[str]) -> List[float]:
+        """Analyze the sentiment of many messages in one call."""
+        return self.sentiment.analyze_batch(texts)
     
     def get_response(self, user_input: str) -> str:
         """Generate a response to user input."""
-        # Add user input to conversation history
-        self.conversation_history.append({
-            'role': 'user',
-            'content': user_input,
-            'timestamp': datetime.now().isoformat()
-        })
-        
-        # Analyze sentiment
-        sentiment = self.analyze_sentiment(user_input)
-        
-        # Check for FAQ matches
-        response = self._check_faq(user_input)
-        if response:
-            return self._format_response(response, sentiment)
-        
-        # Handle fallback for unclear queries
-        if self._is_unclear_query(user_input):
-            return self._handle_unclear_query()
-        
-        # Default response if no FAQ match
-        return self._generate_default_response(sentiment)
+        return self._respond(user_input, _LOOKUP)
     
-    def _check_faq(self, user_input: str) -> Optional[str]:
-        """Check if user input matches any FAQ questions."""
-        user_input = user_input.lower()
-        
-        # Check for direct matches
-        for intent, data in self.faq.items():
-            if 'patterns' in data:
-                for pattern in data['patterns']:
-                    if pattern.lower() in user_input:
-                        return random.choice(data['responses'])
+    def respond_to_match(self, match: Optional[FAQMatch], user_input: str,
+                         kb: Optional[KnowledgeBase] = None) -> str:
+        """Generate a response to input whose FAQ match (or None) the caller already looked up.
+
+        Pass the ``kb`` snapshot the match was found in, so a hot reload in
+        between cannot answer it from a knowledge base without that intent.
+        """
+        return self._respond(user_input, match, kb)
+    
+    def _respond(self, user_input: str, match, kb: Optional[KnowledgeBase] = None) -> str:
+        with metrics.stage('ai', 'total'):
+            # Add user input to conversation history
+            self.conversation_history.append('user', user_input)
+            
+            # Analyze sentiment
+            with metrics.stage('ai', 'sentiment'):
+                sentiment = self.analyze_sentiment(user_input)
+            
+            # Check for FAQ matches
+            with metrics.stage('ai', 'faq'):
+                match, response = self._check_faq(user_input, match, kb)
+            if response:
+                turn_log.record('ai', user_input, 'faq', match, sentiment)
+                with metrics.stage('ai', 'format'):
+                    return self._format_response(response, sentiment)
+            
+            # Handle fallback for unclear queries
+            with metrics.stage('ai', 'unclear'):
+                unclear = self._is_unclear_query(user_input)
+            if unclear:
+                metrics.fallback('ai', 'unclear')
+                turn_log.record('ai', user_input, 'unclear', sentiment=sentiment)
+                return self._handle_unclear_query()
+            
+            # Default response if no FAQ match
+            metrics.fallback('ai', 'default')
+            turn_log.record('ai', user_input, 'default', sentiment=sentiment)
+            return self._generate_default_response(sentiment)
+    
+    def get_responses(self, messages: Iterable[str], workers: int = 1,
+                      chunk_size: int = 256) -> Iterator[str]:
+        """Answer many independent messages, yielding replies in input order.
+
+        Conversation history is left untouched. With ``workers`` > 1 the
+        chunks are answered in a process pool (see batch_inference.py).
+        """
+        from batch_inference import respond_all
+        return respond_all(self, messages, workers, chunk_size)
+    
+    def _respond_batch(self, messages: List[str]) -> List[str]:
+        """Answer one chunk: sentiment and FAQ matching run once for the whole chunk."""
+        with metrics.stage('ai', 'batch'):
+            sentiments = self.analyze_sentiment_batch(messages)
+            kb = self._load_faq()
+            matches = cached_faq_lookup_batch(self.near_duplicates, kb, messages, self.fuzzy_min_score)
         
-        # Check for keyword matches
-        for intent, data in self.faq.items():
-            if 'keywords' in data:
-                for keyword in data['keywords']:
-                    if keyword in user_input:
-                        return random.choice(data['responses'])
+        responses = []
+        for user_input, sentiment, match in zip(messages, sentiments, matches):
+            metrics.faq_lookup('ai', match)
+            if match is not None:
+                turn_log.record('ai', user_input, 'faq', match, sentiment)
+                response = random.choice(kb.faq[match.intent]['responses'])
+                responses.append(self._format_response(response, sentiment))
+            elif self._is_unclear_query(user_input):
+                metrics.fallback('ai', 'unclear')
+                turn_log.record('ai', user_input, 'unclear', sentiment=sentiment)
+                responses.append(self._handle_unclear_query())
+            else:
+                metrics.fallback('ai', 'default')
+                turn_log.record('ai', user_input, 'default', sentiment=sentiment)
+                responses.append(self._generate_default_response(sentiment))
+        return responses
+    
+    def match_faq(self, user_input: str, kb: Optional[KnowledgeBase] = None) -> Optional[FAQMatch]:
+        """Find the FAQ intent for the input, with a confidence score."""
+        if kb is None:
+            kb = self._load_faq()
+        return cached_faq_lookup(self.near_duplicates, kb, user_input, self.fuzzy_min_score)
+    
+    def _check_faq(self, user_input: str, match=_LOOKUP,
+                   kb: Optional[KnowledgeBase] = None) -> Tuple[Optional[FAQMatch], Optional[str]]:
+        """Check if user input matches any FAQ questions; return the match and a response."""
+        if kb is None:
+            kb = self._load_faq()
+        if match is not _LOOKUP and match is not None and match.intent not in kb.faq:
+            # Matched against an older snapshot; a reload has since dropped the intent
+            match = _LOOKUP
+        if match is _LOOKUP:
+            match = cached_faq_lookup(self.near_duplicates, kb, user_input, self.fuzzy_min_score)
+        metrics.faq_lookup('ai', match)
+        if match is not None:
+            return match, random.choice(kb.faq[match.intent]['responses'])
         
-        return None
+        return None, None
     
     def _is_unclear_query(self, user_input: str) -> bool:
         """Determine if the user's query is unclear or vague."""
@@ -134,20 +211,20 @@ class AIChatbot:
             'timestamp': datetime.now().isoformat(),
             'feedback': feedback,
             'rating': rating,
-            'conversation': self.conversation_history[-5:]  # Store last 5 interactions
+            'conversation': self.conversation_history.tail(5)  # Store last 5 interactions
         }
         
-        try:
-            with open('feedback.json', 'a') as f:
-                f.write(json.dumps(feedback_data) + '\n')
+        # Queued for the background writer; never blocks the conversation
+        if get_feedback_sink().submit(feedback_data):
             return "Thank you for your valuable feedback!"
-        except Exception as e:
-            logging.error(f"Error saving feedback: {e}")
-            return "We encountered an error saving your feedback. Thank you anyway!"
+        logging.warning("Feedback queue full, dropping feedback")
+        return "We encountered an error saving your feedback. Thank you anyway!"
 
 
 def main():
     print("AI Chatbot: Hello! I'm your AI assistant. Type 'quit' to exit.")
+    # Load TextBlob and the knowledge base while the user types
+    start_background(ENGINE_TASKS['ai'])
     chatbot = AIChatbot()
     
     while True:
@@ -0,0 +1,310 @@
+"""Offline analytics over turn logs and feedback logs.
+
+Reads JSONL files written by turn_log.py (one record per answered turn) and
+by feedback_sink.py (``feedback.json``), in any mix, and reports:
+
+* unmatched queries (turns answered by the unclear or default fallback, or
+  escalated to OpenAI), clustered by their content words, most frequent first
+* FAQ hit rate per bot, and hits per intent and match source
+* the distribution of user sentiment, overall and per outcome
+* feedback ratings
+
+Files are streamed line by line, so memory stays flat however large they
+are. Plain files are split into ``--chunk-mb`` byte ranges (aligned to line
+boundaries) that are summarized in parallel worker processes; gzipped files
+are read whole by one worker. Unmatched-query clusters are counted with a
+bounded heavy-hitters summary (``--capacity`` clusters): the reported counts
+are exact unless more distinct clusters than that were seen, in which case
+they are lower bounds.
+
+Usage:
+    python analytics.py turns.jsonl* feedback.json* [--workers 4] [--top 20] [--json]
+"""
+import argparse
+import gzip
+import json
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from faq_terms import STOPWORDS, TOKEN_RE
+
+CHUNK_BYTES = 64 << 20
+UNMATCHED_OUTCOMES = ('unclear', 'default', 'llm')
+# Upper edges of all but the last sentiment bin; the FAQ bots score in [-1, 1]
+SENTIMENT_EDGES = (-0.6, -0.2, 0.2, 0.6)
+SENTIMENT_LABELS = ('very negative', 'negative', 'neutral', 'positive', 'very positive')
+
+Chunk = Tuple[str, int, int]
+
+
+def cluster_key(query: str) -> str:
+    """Queries with the same content words (any order, case or punctuation) share a cluster."""
+    words = TOKEN_RE.findall(query.lower())
+    content = sorted({w for w in words if w not in STOPWORDS})
+    return ' '.join(content or sorted(set(words)))
+
+
+def sentiment_bin(score: float) -> str:
+    for edge, label in zip(SENTIMENT_EDGES, SENTIMENT_LABELS):
+        if score < edge:
+            return label
+    return SENTIMENT_LABELS[-1]
+
+
+class HeavyHitters:
+    """Misra-Gries summary: the most frequent keys in at most ``capacity`` counters.
+
+    Any key seen more than n / (capacity + 1) times is kept. Counts are
+    lower bounds, exact while no more than ``capacity`` keys were seen.
+    Summaries from different chunks merge into one.
+    """
+
+    def __init__(self, capacity: int = 10000):
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+        self.examples: Dict[str, str] = {}
+
+    def add(self, key: str, example: str):
+        if key in self.counts:
+            self.counts[key] += 1
+        elif len(self.counts) < self.capacity:
+            self.counts[key] = 1
+            self.examples[key] = example
+        else:
+            self._decrement(1)
+
+    def _decrement(self, amount: int):
+        for key in list(self.counts):
+            self.counts[key] -= amount
+            if self.counts[key] <= 0:
+                del self.counts[key]
+                del self.examples[key]
+
+    def merge(self, other: 'HeavyHitters'):
+        for key, count in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + count
+            self.examples.setdefault(key, other.examples[key])
+        if len(self.counts) > self.capacity:
+            # Subtracting the (capacity + 1)-th largest count keeps the error bound
+            self._decrement(sorted(self.counts.values(), reverse=True)[self.capacity])
+
+    def top(self, n: int) -> List[Tuple[str, int, str]]:
+        ranked = sorted(self.counts.items(), key=lambda item: (-item[1], item[0]))[:n]
+        return [(key, count, self.examples[key]) for key, count in ranked]
+
+
+class Summary:
+    """Counters for one chunk of records; chunks are combined with ``merge``."""
+
+    def __init__(self, capacity: int = 10000):
+        self.outcomes: Counter = Counter()          # (bot, outcome)
+        self.intents: Counter = Counter()
+        self.sources: Counter = Counter()
+        self.sentiment_bins: Counter = Counter()
+        self.sentiment_totals: Counter = Counter()  # outcome -> summed score
+        self.sentiment_counts: Counter = Counter()  # outcome -> scored turns
+        self.ratings: Counter = Counter()
+        self.unmatched = HeavyHitters(capacity)
+        self.malformed = 0
+        self.ignored = 0
+
+    def add(self, record: Dict):
+        if 'outcome' in record:
+            self._add_turn(record)
+        elif 'rating' in record:
+            self.ratings[str(record['rating'])] += 1
+        else:
+            self.ignored += 1
+
+    def _add_turn(self, record: Dict):
+        outcome = record['outcome']
+        self.outcomes[(record.get('bot') or '?', outcome)] += 1
+        if record.get('intent') is not None:
+            self.intents[record['intent']] += 1
+            self.sources[record.get('source') or '?'] += 1
+        if outcome in UNMATCHED_OUTCOMES:
+            query = record.get('query') or ''
+            self.unmatched.add(cluster_key(query), query)
+        sentiment = record.get('sentiment')
+        if isinstance(sentiment, (int, float)):
+            self.sentiment_bins[sentiment_bin(sentiment)] += 1
+            self.sentiment_totals[outcome] += sentiment
+            self.sentiment_counts[outcome] += 1
+
+    def merge(self, other: 'Summary'):
+        self.outcomes.update(other.outcomes)
+        self.intents.update(other.intents)
+        self.sources.update(other.sources)
+        self.sentiment_bins.update(other.sentiment_bins)
+        self.sentiment_totals.update(other.sentiment_totals)
+        self.sentiment_counts.update(other.sentiment_counts)
+        self.ratings.update(other.ratings)
+        self.unmatched.merge(other.unmatched)
+        self.malformed += other.malformed
+        self.ignored += other.ignored
+
+    def report(self, top: int = 20) -> Dict:
+        bots: Dict[str, Counter] = {}
+        for (bot, outcome), count in self.outcomes.items():
+            bots.setdefault(bot, Counter())[outcome] += count
+        turns = sum(self.outcomes.values())
+        faq_turns = sum(count for (_, outcome), count in self.outcomes.items() if outcome == 'faq')
+        ratings = sum(self.ratings.values())
+        numeric = [(float(r), c) for r, c in self.ratings.items() if _is_number(r)]
+        return {
+            'turns': turns,
+            'faq_hit_rate': faq_turns / turns if turns else 0.0,
+            'bots': {
+                bot: {'turns': sum(c.values()), 'hit_rate': c['faq'] / sum(c.values()), 'outcomes': dict(c)}
+                for bot, c in sorted(bots.items())
+            },
+            'intents': dict(self.intents.most_common()),
+            'sources': dict(self.sources.most_common()),
+            'unmatched': [
+                {'cluster': key, 'count': count, 'example': example}
+                for key, count, example in self.unmatched.top(top)
+            ],
+            'sentiment': {
+                'bins': {label: self.sentiment_bins[label] for label in SENTIMENT_LABELS},
+                'mean_by_outcome': {
+                    outcome: round(self.sentiment_totals[outcome] / count, 4)
+                    for outcome, count in sorted(self.sentiment_counts.items())
+                },
+            },
+            'ratings': {
+                'count': ratings,
+                'breakdown': dict(sorted(self.ratings.items())),
+                'mean': (sum(r * c for r, c in numeric) / sum(c for _, c in numeric)) if numeric else None,
+            },
+            'malformed_lines': self.malformed,
+            'ignored_records': self.ignored,
+        }
+
+
+def _is_number(value: str) -> bool:
+    try:
+        float(value)
+    except ValueError:
+        return False
+    return True
+
+
+def split_file(path: str, chunk_bytes: int = CHUNK_BYTES) -> List[Chunk]:
+    """Byte ranges covering ``path``; a gzipped file is a single range."""
+    if path.endswith('.gz'):
+        return [(path, 0, -1)]
+    size = os.path.getsize(path)
+    return [(path, start, min(start + chunk_bytes, size)) for start in range(0, size, chunk_bytes)]
+
+
+def iter_lines(path: str, start: int = 0, end: int = -1) -> Iterator[bytes]:
+    """Yield the lines that begin inside [start, end) (``end=-1``: to the end of the file)."""
+    if path.endswith('.gz'):
+        with gzip.open(path, 'rb') as f:
+            yield from f
+        return
+    with open(path, 'rb') as f:
+        if start > 0:
+            # The line straddling ``start`` belongs to the previous range
+            f.seek(start - 1)
+            f.readline()
+        pos = f.tell()
+        while end < 0 or pos < end:
+            line = f.readline()
+            if not line:
+                break
+            pos += len(line)
+            yield line
+
+
+def summarize_chunk(chunk: Chunk, capacity: int = 10000) -> Summary:
+    summary = Summary(capacity)
+    for line in iter_lines(*chunk):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            # e.g. a line cut short while the writer was still appending
+            summary.malformed += 1
+            continue
+        if isinstance(record, dict):
+            summary.add(record)
+        else:
+            summary.ignored += 1
+    return summary
+
+
+def _summarize(args: Tuple[Chunk, int]) -> Summary:
+    return summarize_chunk(*args)
+
+
+def analyze(paths: List[str], workers: Optional[int] = None, chunk_bytes: int = CHUNK_BYTES,
+            capacity: int = 10000) -> Summary:
+    """Summarize every file in ``paths``, in parallel when ``workers`` > 1."""
+    chunks = [chunk for path in paths for chunk in split_file(path, chunk_bytes)]
+    total = Summary(capacity)
+    workers = min(workers or os.cpu_count() or 1, len(chunks))
+    if workers <= 1:
+        for chunk in chunks:
+            total.merge(summarize_chunk(chunk, capacity))
+        return total
+    with ProcessPoolExecutor(workers) as pool:
+        for summary in pool.map(_summarize, [(chunk, capacity) for chunk in chunks]):
+            total.merge(summary)
+    return total
+
+
+def format_report(report: Dict) -> str:
+    lines = [f"Turns: {report['turns']}  FAQ hit rate: {report['faq_hit_rate']:.1%}"]
+    for bot, stats in report['bots'].items():
+        outcomes = ', '.join(f"{k} {v}" for k, v in sorted(stats['outcomes'].items()))
+        lines.append(f"  {bot:<8} {stats['turns']:>8} turns  hit rate {stats['hit_rate']:.1%}  ({outcomes})")
+
+    lines.append("\nTop unmatched query clusters:")
+    for item in report['unmatched']:
+        lines.append(f"  {item['count']:>7}  {item['cluster'] or '(empty)'}   e.g. {item['example']!r}")
+
+    lines.append("\nIntent hits:")
+    for intent, count in list(report['intents'].items())[:20]:
+        lines.append(f"  {count:>7}  {intent}")
+    if report['sources']:
+        lines.append("  by source: " + ', '.join(f"{k} {v}" for k, v in report['sources'].items()))
+
+    sentiment = report['sentiment']
+    lines.append("\nSentiment:")
+    lines.append("  " + ', '.join(f"{label} {count}" for label, count in sentiment['bins'].items()))
+    for outcome, mean in sentiment['mean_by_outcome'].items():
+        lines.append(f"  mean for {outcome}: {mean:+.3f}")
+
+    ratings = report['ratings']
+    lines.append(f"\nFeedback ratings: {ratings['count']}"
+                 + (f"  mean {ratings['mean']:.2f}" if ratings['mean'] is not None else ''))
+    for rating, count in ratings['breakdown'].items():
+        lines.append(f"  {rating:>7}: {count}")
+
+    if report['malformed_lines'] or report['ignored_records']:
+        lines.append(f"\nSkipped {report['malformed_lines']} malformed lines "
+                     f"and {report['ignored_records']} other records")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report FAQ coverage, sentiment and ratings from chatbot logs.')
+    parser.add_argument('paths', nargs='+', help='turn logs and feedback logs (JSONL, optionally .gz)')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: one per CPU)')
+    parser.add_argument('--chunk-mb', type=int, default=CHUNK_BYTES >> 20, help='bytes per parallel chunk, in MiB')
+    parser.add_argument('--capacity', type=int, default=10000, help='unmatched clusters tracked')
+    parser.add_argument('--top', type=int, default=20, help='unmatched clusters to report')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    summary = analyze(args.paths, args.workers, args.chunk_mb << 20, args.capacity)
+    report = summary.report(args.top)
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+
+
+if __name__ == '__main__':
+    main()
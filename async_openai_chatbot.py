@@ -0,0 +1,216 @@
+import asyncio
+import os
+import weakref
+from typing import AsyncIterator, Optional
+
+from metrics import metrics
+from openai_chatbot import OpenAIChatbot, load_env
+from warmup import ENGINE_TASKS, start_background
+
+# One pooled client per event loop, shared by every session on that loop
+_clients: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]' = weakref.WeakKeyDictionary()
+
+# Connection pool size shared by every session on a loop
+POOL_MAX_CONNECTIONS = 200
+POOL_MAX_KEEPALIVE = 50
+
+
+def get_async_client() -> 'AsyncOpenAI':
+    """Return the AsyncOpenAI client (and its connection pool) for the running loop."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        # Imported here so that importing this module stays cheap
+        import httpx
+        from openai import AsyncOpenAI
+        limits = httpx.Limits(max_connections=POOL_MAX_CONNECTIONS, max_keepalive_connections=POOL_MAX_KEEPALIVE)
+        client = AsyncOpenAI(
+            api_key=os.getenv('OPENAI_API_KEY'),
+            http_client=httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(60.0, connect=5.0)),
+        )
+        _clients[loop] = client
+    return client
+
+
+async def close_async_client():
+    """Close the running loop's shared client; call once at shutdown."""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
+
+
+class AsyncOpenAIChatbot(OpenAIChatbot):
+    """OpenAIChatbot for asyncio servers: one instance per session, one shared connection pool.
+
+    Requests accept a ``timeout`` in seconds covering the whole completion;
+    cancelling the awaiting task aborts the upstream request. The assistant
+    reply is only recorded once it has been received in full. Session log
+    writes, fsyncs and compaction run off the event loop.
+    """
+
+    background_log = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._turn_lock = asyncio.Lock()
+
+    def _create_client(self):
+        # The pooled client is bound to an event loop, so it is looked up per request
+        return None
+
+    def _async_client(self) -> 'AsyncOpenAI':
+        client = get_async_client()
+        # With a scheduler, retries are its job; the client's own would multiply them
+        return client.with_options(max_retries=0) if self.scheduler is not None else client
+
+    async def _schedule(self, create):
+        if self.scheduler is None:
+            return await create()
+        return await self.scheduler.asubmit(create, self._estimated_tokens(), self.priority)
+
+    async def _adegraded_response(self, user_input: str) -> str:
+        # The FAQ bots are synchronous; keep the loop free while one answers
+        metrics.fallback('openai', 'degraded')
+        assistant_response = await asyncio.to_thread(self.fallback.get_response, user_input)
+        await self._finish_turn(assistant_response)
+        return assistant_response
+
+    async def get_response(self, user_input: str, timeout: Optional[float] = None) -> str:
+        """Get a complete response from OpenAI's API."""
+        async with self._turn_lock:
+            self._record('user', user_input)
+            messages = self._request_messages()
+            assistant_response, scope = self._near_duplicate_lookup(user_input, messages)
+            if assistant_response is not None:
+                await self._finish_turn(assistant_response)
+                return assistant_response
+
+            async def create():
+                with metrics.stage('openai', 'api'):
+                    return await self._async_client().chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        temperature=self.temperature,
+                        max_tokens=self.max_tokens
+                    )
+
+            async def request() -> str:
+                response = await self._schedule(create)
+                metrics.token_usage(self.model, getattr(response, 'usage', None))
+                return response.choices[0].message.content
+
+            try:
+                if self.response_cache is not None:
+                    key = self.response_cache.make_key(messages, self.model, self.temperature, self.max_tokens)
+                    pending = self.response_cache.aget_or_compute(key, request)
+                else:
+                    pending = request()
+                with metrics.stage('openai', 'total'):
+                    assistant_response = await asyncio.wait_for(pending, timeout)
+                await self._finish_turn(assistant_response)
+                self._remember_near_duplicate(user_input, assistant_response, scope)
+                return assistant_response
+            except Exception as e:
+                if self._should_degrade(e):
+                    return await self._adegraded_response(user_input)
+                metrics.fallback('openai', 'error')
+                return f"I'm sorry, I encountered an error: {str(e) or type(e).__name__}"
+
+    async def stream_response(self, user_input: str, timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """Yield the response token by token as it arrives from OpenAI's API."""
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+
+        def remaining() -> Optional[float]:
+            return None if deadline is None else max(0.0, deadline - loop.time())
+
+        async with self._turn_lock:
+            self._record('user', user_input)
+            messages = self._request_messages()
+            assistant_response, scope = self._near_duplicate_lookup(user_input, messages)
+            if assistant_response is not None:
+                yield assistant_response
+                await self._finish_turn(assistant_response)
+                return
+            key = None
+            if self.response_cache is not None:
+                key = self.response_cache.make_key(messages, self.model, self.temperature, self.max_tokens)
+                cached = self.response_cache.get(key)
+                if cached is not None:
+                    yield cached
+                    await self._finish_turn(cached)
+                    return
+            parts = []
+            try:
+                # The deadline is enforced around each await rather than around
+                # the whole body, which would also cancel the consumer's code
+                # while this generator is suspended at a yield.
+                # Admission covers opening the stream, which is where a 429 arrives
+                stream = await asyncio.wait_for(self._schedule(lambda: self._async_client().chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=self.temperature,
+                    max_tokens=self.max_tokens,
+                    stream=True
+                )), remaining())
+                try:
+                    chunks = stream.__aiter__()
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(chunks.__anext__(), remaining())
+                        except StopAsyncIteration:
+                            break
+                        token = chunk.choices[0].delta.content if chunk.choices else None
+                        if token:
+                            parts.append(token)
+                            yield token
+                finally:
+                    # Release the pooled connection even if the consumer stops early
+                    await stream.close()
+            except Exception as e:
+                if not parts and self._should_degrade(e):
+                    yield await self._adegraded_response(user_input)
+                    return
+                metrics.fallback('openai', 'error')
+                yield f"I'm sorry, I encountered an error: {str(e) or type(e).__name__}"
+                return
+            assistant_response = ''.join(parts)
+            if key is not None:
+                self.response_cache.set(key, assistant_response)
+            await self._finish_turn(assistant_response)
+            self._remember_near_duplicate(user_input, assistant_response, scope)
+
+    async def _finish_turn(self, assistant_response: str):
+        self._record('assistant', assistant_response)
+        if self.session_log.should_compact():
+            await asyncio.to_thread(self.save_conversation_context)
+
+
+async def main():
+    load_env()
+    if not os.getenv('OPENAI_API_KEY'):
+        print("Error: OPENAI_API_KEY not found. See openai_chatbot.py for setup instructions.")
+        return
+
+    print("AI Chatbot: Hello! I'm your AI assistant. Type 'quit' to exit.")
+    start_background(ENGINE_TASKS['openai'])
+    chatbot = AsyncOpenAIChatbot()
+    try:
+        while True:
+            user_input = await asyncio.to_thread(input, "\nYou: ")
+            if user_input.lower() in ['quit', 'exit', 'bye']:
+                print("AI Chatbot: Goodbye! Have a great day!")
+                break
+            print("AI Chatbot: ", end='', flush=True)
+            async for token in chatbot.stream_response(user_input, timeout=60):
+                print(token, end='', flush=True)
+            print()
+    except (KeyboardInterrupt, EOFError):
+        print("\nAI Chatbot: Goodbye! Have a great day!")
+    finally:
+        chatbot.save_conversation_context()
+        await close_async_client()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,206 @@
+"""Batch inference for the FAQ bots: many independent messages, replies in order.
+
+``bot.get_responses(messages, workers=...)`` (AIChatbot, SimpleChatbot,
+RuleBasedChatbot) cuts the messages into chunks of ``chunk_size``. Each
+chunk is answered in one go: sentiment is scored for the whole chunk,
+duplicates are looked up once, and every message without an exact
+pattern hit is ranked in a single vectorized BM25 call. With ``workers``
+> 1 the chunks go to a process pool; at most ``PREFETCH`` chunks per
+worker are in flight, so memory stays flat however long the input is, and
+replies are yielded in input order as soon as their chunk is done.
+
+Workers rebuild the bot from its constructor options (FAQ path, fuzzy
+threshold, sentiment backend, near-duplicate settings); with the fork
+start method they share the parent's compiled knowledge base
+copy-on-write. Conversation history is not used, and each worker keeps
+its own near-duplicate index.
+
+Usage:
+    python batch_inference.py messages.jsonl -o replies.jsonl [--engine ai] [--workers 4]
+
+Each input line is a JSON object with a ``message`` field (``--field``)
+or a bare JSON string. Each output line is the input object plus
+``response``; lines that cannot be parsed are written back with ``error``
+instead, so every non-blank input line gets one output line, in order.
+"""
+import argparse
+import importlib
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from turn_log import turn_log
+
+CHUNK_SIZE = 256
+# Chunks in flight per worker process
+PREFETCH = 2
+
+BATCH_ENGINES = {
+    'ai': ('ai_chatbot', 'AIChatbot'),
+    'simple': ('simple_chatbot', 'SimpleChatbot'),
+    'rule': ('simple_rule_bot', 'RuleBasedChatbot'),
+}
+
+
+def create_batch_bot(engine: str, faq_path: Optional[str] = None, **options):
+    """Build a FAQ bot for batch use; imports are deferred like chat_server.create_bot."""
+    if engine not in BATCH_ENGINES:
+        raise ValueError(f"Engine {engine!r} has no batch API")
+    module, name = BATCH_ENGINES[engine]
+    if faq_path is not None:
+        options['faq_path'] = faq_path
+    return getattr(importlib.import_module(module), name)(**options)
+
+
+def chunked(items: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(items)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _bot_spec(bot) -> Tuple[type, Dict, Optional[Tuple[float, int]]]:
+    """The class and constructor options a worker process rebuilds ``bot`` from."""
+    options = {'faq_path': bot.faq_path, 'fuzzy_min_score': bot.fuzzy_min_score}
+    if hasattr(bot, 'sentiment_backend'):
+        options['sentiment_backend'] = bot.sentiment_backend
+    near_duplicates = None
+    if bot.near_duplicates is not None:
+        near_duplicates = (bot.near_duplicates.threshold, bot.near_duplicates.capacity)
+    return type(bot), options, near_duplicates
+
+
+_worker_bot = None
+
+
+def _init_worker(bot_class: type, options: Dict, near_duplicates: Optional[Tuple[float, int]],
+                 turn_log_path: Optional[str]):
+    global _worker_bot
+    if near_duplicates is not None:
+        from near_duplicate import NearDuplicateIndex
+        threshold, capacity = near_duplicates
+        options = dict(options, near_duplicates=NearDuplicateIndex(threshold=threshold, capacity=capacity))
+    _worker_bot = bot_class(**options)
+    # Spawned workers re-import turn_log and would miss an enable() made in the parent
+    turn_log.path = turn_log_path
+
+
+def _respond_chunk(messages: List[str]) -> List[str]:
+    responses = _worker_bot._respond_batch(messages)
+    if turn_log.enabled:
+        # Workers are terminated, not shut down, once the last chunk is in
+        from feedback_sink import get_feedback_sink
+        get_feedback_sink(turn_log.path).flush()
+    return responses
+
+
+def _context():
+    # Fork shares the parent's compiled knowledge base; spawn (Windows) loads it per worker
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('fork' if 'fork' in methods else 'spawn')
+
+
+def respond_all(bot, messages: Iterable[str], workers: int = 1,
+                chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    """Yield ``bot``'s reply to every message, in input order (the body of ``get_responses``)."""
+    chunks = chunked(messages, chunk_size)
+    if workers <= 1:
+        for chunk in chunks:
+            yield from bot._respond_batch(chunk)
+        return
+
+    # Load (and compile) the knowledge base once, before the workers fork
+    bot._load_faq()
+    bot_class, options, near_duplicates = _bot_spec(bot)
+    with _context().Pool(workers, initializer=_init_worker,
+                         initargs=(bot_class, options, near_duplicates, turn_log.path)) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(_respond_chunk, (chunk,)))
+            if len(pending) >= workers * PREFETCH:
+                yield from pending.popleft().get()
+        while pending:
+            yield from pending.popleft().get()
+
+
+def _parse(line: str, field: str) -> Tuple[Dict, Optional[str], Optional[str]]:
+    """Return (record, message, error) for one input line."""
+    try:
+        value = json.loads(line)
+    except ValueError as e:
+        return {'line': line.rstrip('\n')}, None, f"invalid JSON: {e}"
+    if isinstance(value, str):
+        return {field: value}, value, None
+    if isinstance(value, dict) and isinstance(value.get(field), str):
+        return value, value[field], None
+    return {'line': line.rstrip('\n')}, None, f"no string {field!r} field"
+
+
+def run(bot, lines: Iterable[str], out, field: str = 'message', workers: int = 1,
+        chunk_size: int = CHUNK_SIZE) -> Dict[str, int]:
+    """Answer every JSONL line in ``lines``, writing one JSONL line each to ``out``."""
+    parsed = (_parse(line, field) for line in lines if line.strip())
+    # One copy feeds the bot, the other pairs its replies back up with their records;
+    # tee only buffers the records the pool has read ahead
+    feed, records = itertools.tee(parsed)
+    responses = bot.get_responses((message for _, message, error in feed if error is None),
+                                  workers, chunk_size)
+    counts = {'answered': 0, 'errors': 0}
+    for record, message, error in records:
+        if error is None:
+            record = dict(record, response=next(responses))
+            counts['answered'] += 1
+        else:
+            record = dict(record, error=error)
+            counts['errors'] += 1
+        out.write(json.dumps(record, ensure_ascii=False) + '\n')
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Answer a JSONL file of messages with a FAQ bot.')
+    parser.add_argument('input', help="JSONL messages ('-' for stdin)")
+    parser.add_argument('-o', '--output', default='-', help="JSONL replies ('-' for stdout)")
+    parser.add_argument('--engine', choices=sorted(BATCH_ENGINES), default='simple')
+    parser.add_argument('--faq-path', default=None, help='knowledge base to answer from (JSON or SQLite)')
+    parser.add_argument('--sentiment', choices=('textblob', 'lexicon'), default=None,
+                        help="sentiment backend of the 'ai' engine")
+    parser.add_argument('--field', default='message', help='message field of the input objects')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: one per CPU)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='messages per chunk')
+    args = parser.parse_args()
+
+    options = {}
+    if args.sentiment:
+        if args.engine != 'ai':
+            parser.error("--sentiment only applies to the 'ai' engine")
+        options['sentiment_backend'] = args.sentiment
+    from near_duplicate import get_near_duplicate_index
+    bot = create_batch_bot(args.engine, args.faq_path, near_duplicates=get_near_duplicate_index(), **options)
+
+    workers = args.workers or os.cpu_count() or 1
+    source = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8')
+    out = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    start = time.perf_counter()
+    try:
+        counts = run(bot, source, out, args.field, workers, args.chunk_size)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - start
+    total = counts['answered'] + counts['errors']
+    print(f"Answered {counts['answered']} messages ({counts['errors']} unreadable lines) in {elapsed:.1f}s"
+          f" ({total / elapsed if elapsed else 0:.0f} lines/s, {workers} workers)", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Compare a get_response loop with get_responses, serially and across worker processes.
+
+The replay corpus is repeated to ``--messages`` messages and shuffled.
+Every bot answers them one call at a time, then as one batch in-process,
+then with each ``--workers`` count.
+
+Usage: python benchmarks/bench_batch_inference.py [--messages 100000] [--workers 2 4]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+
+from batch_inference import BATCH_ENGINES, CHUNK_SIZE, create_batch_bot
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--corpus', default=os.path.join(BENCH_DIR, 'corpus.jsonl'))
+    parser.add_argument('--messages', type=int, default=100000)
+    parser.add_argument('--workers', nargs='+', type=int, default=[2, 4])
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--engines', nargs='+', choices=sorted(BATCH_ENGINES), default=['rule', 'simple', 'ai'])
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    with open(args.corpus) as f:
+        corpus = [json.loads(line)['message'] for line in f if line.strip()]
+    messages = (corpus * (args.messages // len(corpus) + 1))[:args.messages]
+    random.Random(7).shuffle(messages)
+
+    print(f"{len(messages)} messages, chunks of {args.chunk_size}")
+    print(f"{'engine':<8} {'mode':<12} {'msg/s':>10} {'speedup':>8}")
+    for engine in args.engines:
+        # The offline lexicon keeps the 'ai' bot from timing TextBlob
+        options = {'sentiment_backend': 'lexicon'} if engine == 'ai' else {}
+        bot = create_batch_bot(engine, **options)
+        bot.get_response('warm up')
+
+        start = time.perf_counter()
+        for message in messages:
+            bot.get_response(message)
+        loop = time.perf_counter() - start
+        print(f"{engine:<8} {'loop':<12} {len(messages) / loop:>10.0f} {1.0:>7.1f}x")
+
+        for workers in [1] + args.workers:
+            bot = create_batch_bot(engine, **options)
+            start = time.perf_counter()
+            for _ in bot.get_responses(messages, workers, args.chunk_size):
+                pass
+            elapsed = time.perf_counter() - start
+            mode = 'batch' if workers == 1 else f'{workers} workers'
+            print(f"{engine:<8} {mode:<12} {len(messages) / elapsed:>10.0f} {loop / elapsed:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Load-test chat_server.py: concurrent sessions, throughput and p99 latency.
+
+Starts the server in a subprocess, opens ``--sessions`` keep-alive
+connections that each send ``--turns`` messages, and reports requests per
+second, p50/p99 latency and sessions per core (sessions divided by the
+cores the server process actually used, from /proc).
+
+Usage: python benchmarks/bench_chat_server.py [--engine simple] [--sessions 500] [--turns 20]
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from hybrid_router import percentile
+
+MESSAGES = [
+    'hello there',
+    'how do I track my order?',
+    'what is your return policy',
+    'do you ship internationally?',
+    'I want to reset my password',
+    'something completely unrelated to support',
+]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def cpu_seconds(pid: int) -> float:
+    """utime + stime of a process, or 0.0 where /proc is unavailable."""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+    except OSError:
+        return 0.0
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+async def post(reader, writer, body: bytes) -> dict:
+    writer.write(b'POST /chat HTTP/1.1\r\nHost: bench\r\nContent-Type: application/json\r\n'
+                 b'Content-Length: %d\r\n\r\n' % len(body) + body)
+    await writer.drain()
+    head = await reader.readuntil(b'\r\n\r\n')
+    length = 0
+    for line in head.split(b'\r\n'):
+        if line.lower().startswith(b'content-length:'):
+            length = int(line.split(b':', 1)[1])
+    return json.loads(await reader.readexactly(length))
+
+
+async def session(port: int, index: int, turns: int, engine: str, latencies: list):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    session_id = f'bench-{index}'
+    try:
+        for turn in range(turns):
+            body = json.dumps({'session_id': session_id, 'engine': engine,
+                               'message': MESSAGES[(index + turn) % len(MESSAGES)]}).encode()
+            start = time.perf_counter()
+            await post(reader, writer, body)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+
+async def run_load(port: int, sessions: int, turns: int, engine: str) -> list:
+    latencies = []
+    await asyncio.gather(*(session(port, i, turns, engine, latencies) for i in range(sessions)))
+    return latencies
+
+
+def wait_for_port(port: int, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('chat server did not start')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--engine', default='simple', choices=('ai', 'simple', 'rule', 'openai', 'hybrid'))
+    parser.add_argument('--sessions', type=int, default=500)
+    parser.add_argument('--turns', type=int, default=20)
+    args = parser.parse_args()
+
+    port = free_port()
+    server = subprocess.Popen([sys.executable, os.path.join(ROOT, 'chat_server.py'),
+                               '--port', str(port), '--engine', args.engine],
+                              cwd=ROOT, stdout=subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+        cpu_before = cpu_seconds(server.pid)
+        start = time.perf_counter()
+        latencies = asyncio.run(run_load(port, args.sessions, args.turns, args.engine))
+        elapsed = time.perf_counter() - start
+        cores_used = (cpu_seconds(server.pid) - cpu_before) / elapsed
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(f"{args.engine} engine: {args.sessions} sessions x {args.turns} turns")
+    print(f"  throughput: {len(latencies) / elapsed:,.0f} req/s")
+    print(f"  latency:    p50 {percentile(latencies, 50) * 1000:.1f} ms, p99 {percentile(latencies, 99) * 1000:.1f} ms")
+    if cores_used:
+        print(f"  server CPU: {cores_used:.2f} cores, {args.sessions / cores_used:,.0f} sessions/core")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Compare FAQMatcher against the original nested-loop FAQ scan.
+
+Usage: python benchmarks/bench_faq_matcher.py [--sizes 10 1000 50000] [--queries 200]
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from faq_matcher import FAQMatcher
+
+
+def legacy_check_faq(faq: Dict, user_input: str) -> Optional[str]:
+    """The two-pass scan previously used by AIChatbot/SimpleChatbot._check_faq."""
+    user_input = user_input.lower()
+    for intent, data in faq.items():
+        if 'patterns' in data:
+            for pattern in data['patterns']:
+                if pattern.lower() in user_input:
+                    return intent
+    for intent, data in faq.items():
+        if 'keywords' in data:
+            for keyword in data['keywords']:
+                if keyword in user_input:
+                    return intent
+    return None
+
+
+def _word(rng: random.Random) -> str:
+    return ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 9)))
+
+
+def build_faq(num_patterns: int, rng: random.Random, patterns_per_intent: int = 5) -> Dict:
+    faq = {}
+    for i in range(max(1, num_patterns // patterns_per_intent)):
+        faq[f'intent_{i}'] = {
+            'patterns': [' '.join(_word(rng) for _ in range(rng.randint(1, 3)))
+                         for _ in range(patterns_per_intent - 1)],
+            'keywords': [_word(rng)],
+            'responses': [f'Response {i}'],
+        }
+    return faq
+
+
+def build_queries(faq: Dict, count: int, rng: random.Random) -> List[str]:
+    needles = [n for data in faq.values() for n in data['patterns'] + data['keywords']]
+    queries = []
+    for i in range(count):
+        words = [_word(rng) for _ in range(rng.randint(5, 15))]
+        if i % 2 == 0:
+            # Half the queries contain a known pattern or keyword
+            words.insert(rng.randrange(len(words) + 1), rng.choice(needles).upper())
+        queries.append(' '.join(words))
+    return queries
+
+
+def _time_per_query(fn, queries: List[str]) -> float:
+    start = time.perf_counter()
+    for query in queries:
+        fn(query)
+    return (time.perf_counter() - start) / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1000, 50000])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'patterns':>10} {'build ms':>10} {'legacy us':>12} {'matcher us':>12} {'speedup':>9}")
+    for size in args.sizes:
+        faq = build_faq(size, rng)
+        queries = build_queries(faq, args.queries, rng)
+
+        start = time.perf_counter()
+        matcher = FAQMatcher(faq)
+        build = time.perf_counter() - start
+
+        for query in queries:
+            assert matcher.match(query) == legacy_check_faq(faq, query), query
+
+        legacy = _time_per_query(lambda q: legacy_check_faq(faq, q), queries)
+        compiled = _time_per_query(matcher.match, queries)
+        print(f'{size:>10} {build * 1e3:>10.1f} {legacy * 1e6:>12.1f} '
+              f'{compiled * 1e6:>12.1f} {legacy / compiled:>8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Measure bytes per session for 10k-turn conversations.
+
+Compares the original list of dicts with ISO timestamps against
+ConversationHistory, both unbounded and with the bots' default limits.
+
+Usage: python benchmarks/bench_history_memory.py [--turns 10000] [--sessions 10]
+"""
+import argparse
+import os
+import sys
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conversation_history import ConversationHistory
+
+
+def legacy_session(turns: int):
+    history = []
+    for i in range(turns):
+        history.append({
+            'role': 'user' if i % 2 == 0 else 'assistant',
+            'content': f'message number {i} about my order status',
+            'timestamp': datetime.now().isoformat()
+        })
+    return history
+
+
+def ring_session(turns: int, **kwargs):
+    history = ConversationHistory(**kwargs)
+    for i in range(turns):
+        history.append('user' if i % 2 == 0 else 'assistant', f'message number {i} about my order status')
+    return history
+
+
+def measure(build, sessions: int) -> float:
+    tracemalloc.start()
+    held = [build() for _ in range(sessions)]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del held
+    return current / sessions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--turns', type=int, default=10000)
+    parser.add_argument('--sessions', type=int, default=10)
+    args = parser.parse_args()
+
+    cases = [
+        ('list of dicts', lambda: legacy_session(args.turns)),
+        ('ring buffer, unbounded', lambda: ring_session(args.turns, capacity=args.turns, max_bytes=None)),
+        ('ring buffer, defaults', lambda: ring_session(args.turns)),
+        ('ring buffer, 100 turns', lambda: ring_session(args.turns, capacity=100)),
+    ]
+    print(f"{args.turns} turns per session, {args.sessions} sessions")
+    for name, build in cases:
+        print(f"{name:>24}: {measure(build, args.sessions) / 1024:>10.1f} KiB/session")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""Measure the near-duplicate index: hit rate on rephrasings, wrong reuse, cost and memory.
+
+Every distinct message in the replay corpus is answered once (its FAQ
+match is remembered), then rephrased variants (typos, swapped words,
+punctuation and case) are looked up. A hit is "wrong" when the reused match
+names a different intent than the original message's. For comparison,
+"FAQ agrees" is how often a fresh FAQ lookup of the variant finds the
+original's intent; typos often break exact patterns.
+
+Usage: python benchmarks/bench_near_duplicate.py [--thresholds 0.6 0.7 0.8 0.9] [--variants 5]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from typing import List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+
+import near_duplicate
+from kb_registry import get_knowledge_base
+from near_duplicate import NearDuplicateIndex
+from simple_chatbot import DEFAULT_FAQ
+
+
+def rephrase(text: str, rng: random.Random) -> str:
+    """One random surface edit: a typo, two swapped words, or changed punctuation/case."""
+    words = text.split()
+    kind = rng.randrange(4)
+    if kind == 0 and len(text) > 4:
+        i = rng.randrange(len(text) - 1)
+        return text[:i] + text[i + 1] + text[i] + text[i + 2:]
+    if kind == 1 and len(text) > 4:
+        i = rng.randrange(len(text))
+        return text[:i] + text[i + 1:]
+    if kind == 2 and len(words) > 2:
+        i = rng.randrange(len(words) - 1)
+        words[i], words[i + 1] = words[i + 1], words[i]
+        return ' '.join(words)
+    return text.capitalize().rstrip('?!.') + rng.choice(['?', '!', '...', ' ?'])
+
+
+def time_per_call(fn, items: List[str], repeat: int = 5) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for item in items:
+            fn(item)
+    return (time.perf_counter() - start) / (repeat * len(items))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--corpus', default=os.path.join(BENCH_DIR, 'corpus.jsonl'))
+    parser.add_argument('--thresholds', nargs='+', type=float, default=[0.6, 0.7, 0.8, 0.9])
+    parser.add_argument('--variants', type=int, default=5, help='rephrasings per message')
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    kb = get_knowledge_base(default=DEFAULT_FAQ)
+    with open(args.corpus) as f:
+        messages = sorted({json.loads(line)['message'] for line in f if line.strip()})
+    rng = random.Random(7)
+    known = {m.lower() for m in messages}
+    pairs = [(m, rephrase(m, rng)) for m in messages for _ in range(args.variants)]
+    pairs = [(m, v) for m, v in pairs if v.lower() not in known]
+    variants = [v for _, v in pairs]
+
+    def intent(message: str):
+        match = kb.lookup(message, 3.0)
+        return match and match.intent
+
+    expected = {m: intent(m) for m in messages}
+    agrees = sum(intent(v) == expected[m] for m, v in pairs) / len(pairs)
+    print(f"{len(messages)} messages, {len(pairs)} rephrasings; FAQ agrees on {agrees:.1%} of rephrasings")
+    print(f"{'threshold':>9} {'hit rate':>9} {'wrong':>7} {'cross-hits':>10}")
+    for threshold in args.thresholds:
+        index = NearDuplicateIndex(threshold=threshold)
+        for message in messages:
+            index.add(message, kb.lookup(message, 3.0))
+        hits = wrong = 0
+        for message, variant in pairs:
+            hit = index.lookup(variant)
+            if hit is not None:
+                hits += 1
+                wrong += (hit[0] and hit[0].intent) != expected[message]
+        # Distinct corpus messages that would be answered as one another
+        cross = 0
+        for message in messages:
+            alone = NearDuplicateIndex(threshold=threshold)
+            for other in messages:
+                if other != message:
+                    alone.add(other, None)
+            cross += alone.lookup(message) is not None
+        print(f"{threshold:>9.2f} {hits / len(pairs):>9.1%} {wrong / max(hits, 1):>7.1%} {cross:>10}")
+
+    index = NearDuplicateIndex()
+    for message in messages:
+        index.add(message, kb.lookup(message, 3.0))
+    misses = [f'{m} zq{i} completely different words' for i, m in enumerate(messages)]
+    print(f"\nFAQ lookup:           {time_per_call(lambda q: kb.lookup(q, 3.0), variants) * 1e6:8.1f} us")
+    print(f"index lookup (hits):  {time_per_call(index.lookup, variants) * 1e6:8.1f} us")
+    print(f"index lookup (miss):  {time_per_call(index.lookup, misses) * 1e6:8.1f} us")
+    cached = NearDuplicateIndex()
+    print(f"cached_faq_lookup:    "
+          f"{time_per_call(lambda q: near_duplicate.cached_faq_lookup(cached, kb, q, 3.0), variants) * 1e6:8.1f} us")
+    sets = [near_duplicate.shingle_hashes(near_duplicate.normalize(v)) for v in variants]
+    vectorized = time_per_call(index.signature, sets)
+    near_duplicate._numpy.cache_clear()
+    sys.modules['numpy'] = None  # force the pure-Python path
+    pure = time_per_call(index.signature, sets)
+    print(f"signature:            {vectorized * 1e6:8.1f} us (NumPy if installed)  {pure * 1e6:.1f} us (pure Python)")
+
+    tracemalloc.start()
+    big = NearDuplicateIndex(capacity=10000)
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(10000):
+        big.add(f'{messages[i % len(messages)]} order {i}', None)
+    per_entry = (tracemalloc.get_traced_memory()[0] - before) / len(big)
+    tracemalloc.stop()
+    print(f"memory:               {per_entry:8.0f} bytes per remembered message")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Cold-start time of each chatbot entry point.
+
+For every bot, in fresh interpreters:
+  * import time of its module, and the slowest imports under it (``-X importtime``)
+  * time to first response: interpreter start, import, construct the bot and
+    answer one message. The OpenAI bot talks to the local stub.
+
+Each measurement is the median of ``--runs`` processes. Cases slower than
+``--target-ms`` to first response are flagged, and the exit status is 1.
+
+Usage: python benchmarks/bench_startup.py [--runs 5] [--target-ms 1000] [--top 5] [--prewarm]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENTRY_POINTS = {
+    'ai': ('ai_chatbot', 'AIChatbot()'),
+    'simple': ('simple_chatbot', 'SimpleChatbot()'),
+    'rule': ('simple_rule_bot', 'RuleBasedChatbot()'),
+    'openai': ('openai_chatbot', 'OpenAIChatbot(use_cache=False)'),
+}
+
+FIRST_RESPONSE = """
+import sys
+sys.path.insert(0, {root!r})
+from {module} import *
+bot = {constructor}
+bot.get_response('how do I track my order?')
+"""
+
+
+def run(args, env=None) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable] + args, cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+
+
+def import_profile(module: str, top: int):
+    """(total import ms, [(ms, module)] of the slowest direct and nested imports)."""
+    stderr = run(['-X', 'importtime', '-c', f'import {module}']).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative) / 1000, name.rstrip()))
+    total = next((ms for ms, name in reversed(rows) if name.strip() == module), 0.0)
+    slowest = sorted((r for r in rows if r[1].strip() != module), reverse=True)[:top]
+    return total, slowest
+
+
+def first_response_ms(bot: str, env) -> float:
+    module, constructor = ENTRY_POINTS[bot]
+    code = FIRST_RESPONSE.format(root=ROOT, module=module, constructor=constructor)
+    start = time.perf_counter()
+    run(['-c', code], env=env)
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bots', nargs='+', choices=sorted(ENTRY_POINTS), default=list(ENTRY_POINTS))
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--target-ms', type=float, default=1000.0)
+    parser.add_argument('--top', type=int, default=5, help='slowest imports to list per bot')
+    parser.add_argument('--stub-latency', type=float, default=0.0)
+    parser.add_argument('--prewarm', action='store_true', help='run warmup.py first (writes the KB snapshot)')
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    from openai_stub_server import serve_in_thread
+    _, base_url = serve_in_thread(latency=args.stub_latency)
+    env = dict(os.environ, OPENAI_API_KEY='stub', OPENAI_BASE_URL=base_url,
+               CHATBOT_KB_CACHE=os.path.join(tempfile.mkdtemp(), '.kb_cache'))
+    if args.prewarm:
+        run([os.path.join(ROOT, 'warmup.py'), '--engines'] + args.bots, env=env)
+
+    missed = False
+    python_ms = statistics.median(
+        (lambda s: (run(['-c', 'pass']), (time.perf_counter() - s) * 1000)[1])(time.perf_counter())
+        for _ in range(args.runs)
+    )
+    print(f"bare interpreter start: {python_ms:.0f} ms")
+    for bot in args.bots:
+        module = ENTRY_POINTS[bot][0]
+        total, slowest = import_profile(module, args.top)
+        ttfr = statistics.median(first_response_ms(bot, env) for _ in range(args.runs))
+        over = ttfr > args.target_ms
+        missed |= over
+        print(f"\n{bot}: import {total:.0f} ms, first response {ttfr:.0f} ms"
+              f" ({'over' if over else 'within'} {args.target_ms:.0f} ms target)")
+        for ms, name in slowest:
+            print(f"    {ms:8.1f} ms  {name}")
+    sys.exit(1 if missed else 0)
+
+
+if __name__ == '__main__':
+    main()
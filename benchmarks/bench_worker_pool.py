@@ -0,0 +1,77 @@
+"""Throughput scaling and memory per worker for the prefork worker pool.
+
+Runs the same workload through WorkerPool at 1..N workers and reports
+requests per second with the RSS and PSS (proportional set size, which
+splits shared copy-on-write pages between the processes sharing them) of
+each worker, read from /proc.
+
+Usage: python benchmarks/bench_worker_pool.py [--engine ai] [--max-workers N] [--requests 2000]
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import wait
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from worker_pool import POOL_ENGINES, WorkerPool
+
+MESSAGES = [
+    'hello there',
+    'how do I track my order?',
+    'this is terrible, my package is late',
+    'what is your return policy',
+    'great service, thanks!',
+    'something completely unrelated to support',
+]
+
+
+def memory_kib(pid: int):
+    """(RSS, PSS) of a process in KiB, or (0, 0) where smaps_rollup is unavailable."""
+    values = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                name, _, rest = line.partition(':')
+                if name in ('Rss', 'Pss'):
+                    values[name] = int(rest.split()[0])
+    except OSError:
+        pass
+    return values.get('Rss', 0), values.get('Pss', 0)
+
+
+def run(engine: str, workers: int, requests: int, sessions: int):
+    with WorkerPool(engine, workers) as pool:
+        # Warm every worker so start-up cost stays out of the timing
+        wait([pool.submit(f'warm-{i}', 'hello') for i in range(workers * 4)])
+        start = time.perf_counter()
+        futures = [pool.submit(f'session-{i % sessions}', f'{MESSAGES[i % len(MESSAGES)]} #{i}')
+                   for i in range(requests)]
+        wait(futures)
+        elapsed = time.perf_counter() - start
+        memory = [memory_kib(pid) for pid in pool.pids]
+    return requests / elapsed, memory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--engine', default='ai', choices=POOL_ENGINES)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--sessions', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{args.engine} engine, {args.requests} requests over {args.sessions} sessions")
+    baseline = None
+    for workers in range(1, args.max_workers + 1):
+        throughput, memory = run(args.engine, workers, args.requests, args.sessions)
+        baseline = baseline or throughput
+        rss = sum(m[0] for m in memory) / len(memory)
+        pss = sum(m[1] for m in memory) / len(memory)
+        print(f"{workers:>3} workers: {throughput:>8,.0f} req/s ({throughput / baseline:.2f}x), "
+              f"per worker RSS {rss / 1024:.1f} MiB, PSS {pss / 1024:.1f} MiB")
+
+
+if __name__ == '__main__':
+    main()
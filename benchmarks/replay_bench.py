@@ -0,0 +1,226 @@
+"""Replay a JSONL corpus through every chatbot class and record performance.
+
+Each line of the corpus is ``{"session_id": ..., "message": ...}``; every
+session gets its own bot instance. The FAQ bots run against the shipped
+knowledge base padded with synthetic intents up to each ``--faq-sizes``
+entry. OpenAIChatbot runs against openai_stub_server with
+``--stub-latency``. Every (bot, FAQ size) case runs in a fresh subprocess
+so peak RSS is measured per case.
+
+Reports throughput, p50/p95/p99 latency, peak RSS and the peak bytes
+allocated per call (tracemalloc, on a separate pass). Write the results
+with ``--output`` and compare two runs with ``--compare``.
+
+Usage:
+    python benchmarks/replay_bench.py [--bots ai simple rule openai] [--faq-sizes 10 1000 100000]
+                                      [--corpus benchmarks/corpus.jsonl] [--output results.json]
+    python benchmarks/replay_bench.py --compare before.json after.json [--threshold 10]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+
+from bench_faq_matcher import build_faq
+from hybrid_router import percentile
+
+BOTS = ('ai', 'simple', 'rule', 'openai')
+DEFAULT_CORPUS = os.path.join(BENCH_DIR, 'corpus.jsonl')
+
+
+def load_corpus(path: str) -> List[Dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def write_faq(size: int, directory: str) -> str:
+    """Write the shipped FAQ padded with synthetic intents to ``size`` intents."""
+    with open(os.path.join(ROOT, 'faq_knowledge_base.json')) as f:
+        faq = json.load(f)
+    extra = size - len(faq)
+    if extra > 0:
+        faq.update(build_faq(extra * 5, random.Random(size)))
+    path = os.path.join(directory, f'faq_{size}.json')
+    with open(path, 'w') as f:
+        json.dump(faq, f)
+    return path
+
+
+def make_factory(bot: str, faq_path: str, stub_latency: float):
+    if bot == 'ai':
+        from ai_chatbot import AIChatbot
+        return lambda session_id: AIChatbot(faq_path=faq_path)
+    if bot == 'simple':
+        from simple_chatbot import SimpleChatbot
+        return lambda session_id: SimpleChatbot(faq_path=faq_path)
+    if bot == 'rule':
+        from simple_rule_bot import RuleBasedChatbot
+        return lambda session_id: RuleBasedChatbot(faq_path=faq_path)
+    from openai_stub_server import serve_in_thread
+    _, base_url = serve_in_thread(latency=stub_latency)
+    os.environ['OPENAI_BASE_URL'] = base_url
+    os.environ['OPENAI_API_KEY'] = 'stub'
+    from openai_chatbot import OpenAIChatbot
+    return lambda session_id: OpenAIChatbot(session_id=session_id, use_cache=False, sync='never')
+
+
+def run_case(bot: str, faq_size: int, corpus: List[Dict], repeat: int,
+             stub_latency: float, alloc_calls: int) -> Dict:
+    """Run one case in this process (called in the per-case subprocess)."""
+    workdir = tempfile.mkdtemp(prefix='replay_bench_')
+    os.chdir(workdir)  # session logs, KB snapshots and feedback stay out of the repo
+
+    start = time.perf_counter()
+    faq_path = write_faq(faq_size, workdir)
+    factory = make_factory(bot, faq_path, stub_latency)
+    bots = {}
+    for item in corpus:
+        if item['session_id'] not in bots:
+            bots[item['session_id']] = factory(item['session_id'])
+    setup_s = time.perf_counter() - start
+
+    # Warm caches and lazy imports outside the timed region
+    for item in corpus[:5]:
+        bots[item['session_id']].get_response(item['message'])
+
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for item in corpus:
+            t0 = time.perf_counter()
+            bots[item['session_id']].get_response(item['message'])
+            latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    peaks = []
+    for item in corpus[:alloc_calls]:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        bots[item['session_id']].get_response(item['message'])
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+
+    return {
+        'bot': bot,
+        'faq_intents': faq_size if bot != 'openai' else None,
+        'calls': len(latencies),
+        'setup_s': setup_s,
+        'throughput_rps': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'peak_rss_kib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'alloc_peak_bytes_per_call': sum(peaks) / len(peaks) if peaks else 0,
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def run_all(args) -> Dict:
+    results = []
+    for bot in args.bots:
+        # The OpenAI bot does not use the FAQ, so it runs once
+        for size in (args.faq_sizes if bot != 'openai' else args.faq_sizes[:1]):
+            cmd = [sys.executable, os.path.abspath(__file__), '--run-case', bot, str(size),
+                   '--corpus', os.path.abspath(args.corpus), '--repeat', str(args.repeat),
+                   '--stub-latency', str(args.stub_latency), '--alloc-calls', str(args.alloc_calls)]
+            output = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            results.append(result)
+            print(f"{bot:>7} {str(result['faq_intents'] or '-'):>7} intents: "
+                  f"{result['throughput_rps']:>9,.0f} req/s  p50 {result['p50_ms']:.3f} ms  "
+                  f"p95 {result['p95_ms']:.3f} ms  p99 {result['p99_ms']:.3f} ms  "
+                  f"RSS {result['peak_rss_kib'] / 1024:.0f} MiB  "
+                  f"{result['alloc_peak_bytes_per_call'] / 1024:.1f} KiB/call", flush=True)
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'corpus': os.path.basename(args.corpus),
+            'repeat': args.repeat,
+            'stub_latency': args.stub_latency,
+        },
+        'results': results,
+    }
+
+
+def compare(before_path: str, after_path: str, threshold: float) -> int:
+    """Print per-case changes; return 1 if any case regressed beyond ``threshold`` percent."""
+    with open(before_path) as f:
+        before = {(r['bot'], r['faq_intents']): r for r in json.load(f)['results']}
+    with open(after_path) as f:
+        after = json.load(f)['results']
+
+    def change(old: float, new: float) -> float:
+        return (new - old) / old * 100 if old else 0.0
+
+    regressed = False
+    print(f"{'case':>16} {'req/s':>9} {'p99':>9} {'RSS':>9}")
+    for result in after:
+        key = (result['bot'], result['faq_intents'])
+        if key not in before:
+            continue
+        old = before[key]
+        rps = change(old['throughput_rps'], result['throughput_rps'])
+        p99 = change(old['p99_ms'], result['p99_ms'])
+        rss = change(old['peak_rss_kib'], result['peak_rss_kib'])
+        flag = rps < -threshold or p99 > threshold or rss > threshold
+        regressed |= flag
+        case = f"{key[0]}/{key[1] or '-'}"
+        print(f"{case:>16} {rps:>+8.1f}% {p99:>+8.1f}% {rss:>+8.1f}%{'  REGRESSION' if flag else ''}")
+    return 1 if regressed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bots', nargs='+', choices=BOTS, default=list(BOTS))
+    parser.add_argument('--faq-sizes', nargs='+', type=int, default=[10, 1000, 100000])
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS)
+    parser.add_argument('--repeat', type=int, default=5, help='times to replay the corpus')
+    parser.add_argument('--stub-latency', type=float, default=0.0, help='seconds the OpenAI stub waits per request')
+    parser.add_argument('--alloc-calls', type=int, default=100, help='calls traced for allocation size')
+    parser.add_argument('--output', help='write the results as JSON')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'))
+    parser.add_argument('--threshold', type=float, default=10.0, help='percent change counted as a regression')
+    parser.add_argument('--run-case', nargs=2, metavar=('BOT', 'FAQ_SIZE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(compare(*args.compare, args.threshold))
+    if args.run_case:
+        bot, size = args.run_case
+        result = run_case(bot, int(size), load_corpus(args.corpus), args.repeat,
+                          args.stub_latency, args.alloc_calls)
+        print(json.dumps(result))
+        return
+
+    results = run_all(args)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
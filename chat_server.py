@@ -0,0 +1,437 @@
+"""Multi-session asyncio chat server for every bot engine.
+
+One process holds many concurrent sessions. The FAQ engines share the one
+compiled knowledge base from kb_registry and run in a thread pool so
+CPU-bound steps (TextBlob sentiment, FAQ matching) never block the event
+loop; the OpenAI engine uses the async client directly. Idle sessions are
+evicted after ``--idle-timeout`` seconds. With ``--processes N`` the FAQ
+engine runs in a prefork worker pool (see worker_pool.py) to use N cores.
+
+HTTP:
+    POST /chat        {"message": "...", "session_id": "...", "engine": "..."}
+                      -> {"session_id": "...", "response": "..."}
+    GET  /stats       session count, request counters and OpenAI scheduler state
+    GET  /metrics     Prometheus text from metrics.py (set CHATBOT_METRICS=1)
+    GET  /health
+WebSocket:
+    GET  /ws?session_id=...&engine=...   one text frame per message; replies are
+                      {"type": "response", "data": "..."} (or "token" frames
+                      followed by "done" for the streaming OpenAI engine;
+                      {"type": "error", ...} when a turn fails)
+
+Malformed requests get 400 and bodies over 1 MiB get 413; both close the
+connection.
+
+Usage: python chat_server.py [--host 127.0.0.1] [--port 8080] [--engine simple]
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import os
+import struct
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple, Union
+from urllib.parse import parse_qs, urlsplit
+
+ENGINES = ('ai', 'simple', 'rule', 'openai', 'hybrid')
+
+_WS_GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+_MAX_BODY = 1 << 20
+
+
+class _BadRequest(Exception):
+    """A request that cannot be parsed; answered with ``status`` and the connection is closed."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def create_bot(engine: str, session_id: str):
+    """Build the bot for one session. Imports are deferred so unused engines cost nothing."""
+    from near_duplicate import get_near_duplicate_index
+    # Shared by every session, so one session's question answers another's rephrasing
+    near_duplicates = get_near_duplicate_index()
+    if engine == 'ai':
+        from ai_chatbot import AIChatbot
+        return AIChatbot(near_duplicates=near_duplicates)
+    if engine == 'simple':
+        from simple_chatbot import SimpleChatbot
+        return SimpleChatbot(near_duplicates=near_duplicates)
+    if engine == 'rule':
+        from simple_rule_bot import RuleBasedChatbot
+        return RuleBasedChatbot(near_duplicates=near_duplicates)
+    if engine == 'openai':
+        from async_openai_chatbot import AsyncOpenAIChatbot
+        return AsyncOpenAIChatbot(session_id=session_id, near_duplicates=near_duplicates)
+    if engine == 'hybrid':
+        from hybrid_router import HybridRouter
+        from simple_chatbot import SimpleChatbot
+        return HybridRouter(local=SimpleChatbot(near_duplicates=near_duplicates), session_id=session_id)
+    raise ValueError(f"Unknown engine: {engine}")
+
+
+class Session:
+    __slots__ = ('session_id', 'engine', 'bot', 'last_seen', 'lock')
+
+    def __init__(self, session_id: str, engine: str, bot):
+        self.session_id = session_id
+        self.engine = engine
+        self.bot = bot
+        self.last_seen = time.monotonic()
+        self.lock = asyncio.Lock()
+
+
+class ChatServer:
+    def __init__(self, engine: str = 'simple', idle_timeout: float = 900.0,
+                 max_sessions: int = 100000, workers: Optional[int] = None, processes: int = 0):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine: {engine}")
+        self.engine = engine
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.executor = ThreadPoolExecutor(max_workers=workers or min(32, (os.cpu_count() or 1) + 4))
+        self.processes = processes
+        self.pool = None
+        self.sessions: Dict[str, Session] = {}
+        self.requests = 0
+        self.errors = 0
+        self.evicted = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._evictor: Optional[asyncio.Task] = None
+        # Evicted sessions whose history is still being written, by id
+        self._saving: Dict[str, asyncio.Future] = {}
+
+    # -- sessions ---------------------------------------------------------
+
+    async def _session(self, session_id: Optional[str], engine: Optional[str]) -> Session:
+        session_id = session_id or uuid.uuid4().hex
+        session = self.sessions.get(session_id)
+        if session is None:
+            if len(self.sessions) >= self.max_sessions:
+                await self._evict_oldest()
+            saving = self._saving.get(session_id)
+            if saving is not None:
+                # Let the evicted bot finish writing before a new one reads its history
+                await asyncio.shield(saving)
+            session = self.sessions.get(session_id)
+        if session is None:
+            engine = engine or self.engine
+            # Sessions on the pool's engine live in a worker process, not here
+            bot = None if self.pool and engine == self.pool.engine else create_bot(engine, session_id)
+            session = Session(session_id, engine, bot)
+            self.sessions[session_id] = session
+        session.last_seen = time.monotonic()
+        return session
+
+    async def _evict_oldest(self):
+        oldest = min(self.sessions.values(), key=lambda s: s.last_seen)
+        await self._close_session(oldest)
+
+    async def _close_session(self, session: Session):
+        self.sessions.pop(session.session_id, None)
+        self.evicted += 1
+        if session.bot is None:
+            self.pool.end_session(session.session_id)
+            return
+        save = getattr(session.bot, 'save_conversation_context', None)
+        if save is None:
+            return
+        # Compaction fsyncs; keep it off the event loop
+        saving = asyncio.get_running_loop().run_in_executor(self.executor, save)
+        self._saving[session.session_id] = saving
+        try:
+            await saving
+        except OSError as e:
+            logging.error(f"Error saving session {session.session_id}: {e}")
+        finally:
+            if self._saving.get(session.session_id) is saving:
+                del self._saving[session.session_id]
+
+    async def _evict_idle(self):
+        while True:
+            await asyncio.sleep(min(60.0, max(1.0, self.idle_timeout / 4)))
+            cutoff = time.monotonic() - self.idle_timeout
+            for session in [s for s in self.sessions.values() if s.last_seen < cutoff]:
+                if not session.lock.locked() and self.sessions.get(session.session_id) is session:
+                    await self._close_session(session)
+
+    async def respond(self, session: Session, message: str) -> str:
+        """Run one turn for the session; sync bots run on the thread pool."""
+        self.requests += 1
+        async with session.lock:
+            session.last_seen = time.monotonic()
+            if session.bot is None:
+                return await asyncio.wrap_future(self.pool.submit(session.session_id, message))
+            if session.engine == 'openai':
+                return await session.bot.get_response(message)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, session.bot.get_response, message)
+
+    def stats(self) -> Dict:
+        stats = {
+            'sessions': len(self.sessions),
+            'requests': self.requests,
+            'errors': self.errors,
+            'evicted': self.evicted,
+            'engine': self.engine,
+        }
+        from near_duplicate import get_near_duplicate_index
+        near_duplicates = get_near_duplicate_index()
+        if near_duplicates is not None:
+            stats['near_duplicates'] = near_duplicates.stats()
+        if self.engine in ('openai', 'hybrid'):
+            from openai_scheduler import get_scheduler
+            stats['openai_scheduler'] = get_scheduler().stats()
+        return stats
+
+    # -- lifecycle --------------------------------------------------------
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8080):
+        if self.processes:
+            from worker_pool import WorkerPool
+            # Fork before any executor threads exist
+            self.pool = WorkerPool(self.engine, self.processes).start()
+        else:
+            # Load the knowledge base and heavy dependencies before taking traffic
+            from warmup import ENGINE_TASKS, warm
+            await asyncio.get_running_loop().run_in_executor(self.executor, warm, ENGINE_TASKS[self.engine])
+        self._server = await asyncio.start_server(self._handle_connection, host, port, backlog=1024)
+        self._evictor = asyncio.create_task(self._evict_idle())
+        return self._server
+
+    async def close(self):
+        if self._evictor is not None:
+            self._evictor.cancel()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for session in list(self.sessions.values()):
+            await self._close_session(session)
+        if self.pool is not None:
+            self.pool.close()
+        self.executor.shutdown(wait=False)
+        if self.engine in ('openai', 'hybrid'):
+            try:
+                from async_openai_chatbot import close_async_client
+                await close_async_client()
+            except ImportError:
+                pass
+
+    # -- HTTP -------------------------------------------------------------
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except _BadRequest as e:
+                    # What follows on the stream cannot be trusted; answer and hang up
+                    self._write_response(writer, e.status, {'error': str(e)}, keep_alive=False)
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+                method, target, headers, body = request
+                url = urlsplit(target)
+                if (url.path == '/ws' and headers.get('upgrade', '').lower() == 'websocket'
+                        and 'sec-websocket-key' in headers):
+                    await self._websocket(reader, writer, headers, parse_qs(url.query))
+                    break
+                status, payload = await self._route(method, url.path, body)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                self._write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict, bytes]]:
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+        except asyncio.IncompleteReadError:
+            return None
+        except asyncio.LimitOverrunError:
+            raise _BadRequest(400, 'Request headers too large')
+        lines = head.decode('latin-1').split('\r\n')
+        parts = lines[0].split(' ', 2)
+        if len(parts) != 3:
+            raise _BadRequest(400, f'Malformed request line: {lines[0][:100]!r}')
+        method, target, _ = parts
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise _BadRequest(400, 'Invalid Content-Length')
+        if length < 0:
+            raise _BadRequest(400, 'Invalid Content-Length')
+        if length > _MAX_BODY:
+            # The body is not read, so the connection is closed rather than reused
+            raise _BadRequest(413, f'Body larger than {_MAX_BODY} bytes')
+        body = await reader.readexactly(length) if length else b''
+        return method, target, headers, body
+
+    @staticmethod
+    def _write_response(writer: asyncio.StreamWriter, status: int, payload: Union[Dict, str], keep_alive: bool):
+        reason = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 413: 'Payload Too Large',
+                  500: 'Internal Server Error'}[status]
+        if isinstance(payload, str):
+            data, content_type = payload.encode('utf-8'), 'text/plain; version=0.0.4'
+        else:
+            data, content_type = json.dumps(payload).encode('utf-8'), 'application/json'
+        writer.write(
+            f'HTTP/1.1 {status} {reason}\r\nContent-Type: {content_type}\r\n'
+            f'Content-Length: {len(data)}\r\nConnection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'
+            .encode('latin-1') + data
+        )
+
+    async def _route(self, method: str, path: str, body: bytes) -> Tuple[int, Union[Dict, str]]:
+        if method == 'GET' and path == '/health':
+            return 200, {'status': 'ok'}
+        if method == 'GET' and path == '/stats':
+            return 200, self.stats()
+        if method == 'GET' and path == '/metrics':
+            from metrics import metrics
+            return 200, metrics.render_prometheus()
+        if method != 'POST' or path != '/chat':
+            return 404, {'error': f'No route for {method} {path}'}
+        try:
+            data = json.loads(body or b'{}')
+            message = data['message']
+            if not isinstance(message, str):
+                raise TypeError("'message' must be a string")
+            session = await self._session(data.get('session_id'), data.get('engine'))
+        except (ValueError, KeyError, TypeError) as e:
+            return 400, {'error': f'Invalid request: {e}'}
+        try:
+            response = await self.respond(session, message)
+        except Exception as e:
+            self.errors += 1
+            logging.exception("Error handling chat request")
+            return 500, {'error': str(e)}
+        return 200, {'session_id': session.session_id, 'response': response}
+
+    # -- WebSocket --------------------------------------------------------
+
+    async def _websocket(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                         headers: Dict, query: Dict):
+        accept = base64.b64encode(hashlib.sha1(headers['sec-websocket-key'].encode() + _WS_GUID).digest())
+        writer.write(b'HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n'
+                     b'Connection: Upgrade\r\nSec-WebSocket-Accept: ' + accept + b'\r\n\r\n')
+        await writer.drain()
+        try:
+            session = await self._session(query.get('session_id', [None])[0], query.get('engine', [None])[0])
+        except ValueError as e:
+            self._send_frame(writer, 0x1, json.dumps({'type': 'error', 'data': str(e)}).encode())
+            self._send_frame(writer, 0x8, b'')
+            return
+
+        while True:
+            opcode, payload = await self._read_frame(reader)
+            if opcode == 0x8:
+                self._send_frame(writer, 0x8, payload[:2])
+                break
+            if opcode == 0x9:
+                self._send_frame(writer, 0xA, payload)
+                continue
+            if opcode != 0x1:
+                continue
+            message = payload.decode('utf-8', errors='replace')
+            try:
+                if session.engine == 'openai':
+                    await self._stream_turn(writer, session, message)
+                else:
+                    response = await self.respond(session, message)
+                    self._send_frame(writer, 0x1, json.dumps({'type': 'response', 'data': response}).encode())
+            except ConnectionError:
+                raise
+            except Exception as e:
+                # One failed turn should not take the connection down with it
+                self.errors += 1
+                logging.exception("Error handling WebSocket message")
+                self._send_frame(writer, 0x1, json.dumps({'type': 'error', 'data': str(e)}).encode())
+            await writer.drain()
+
+    async def _stream_turn(self, writer: asyncio.StreamWriter, session: Session, message: str):
+        self.requests += 1
+        parts = []
+        async with session.lock:
+            session.last_seen = time.monotonic()
+            async for token in session.bot.stream_response(message):
+                parts.append(token)
+                self._send_frame(writer, 0x1, json.dumps({'type': 'token', 'data': token}).encode())
+                await writer.drain()
+        self._send_frame(writer, 0x1, json.dumps({'type': 'done', 'data': ''.join(parts)}).encode())
+
+    @staticmethod
+    async def _read_frame(reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+        first, second = await reader.readexactly(2)
+        opcode = first & 0x0F
+        length = second & 0x7F
+        if length == 126:
+            length, = struct.unpack('!H', await reader.readexactly(2))
+        elif length == 127:
+            length, = struct.unpack('!Q', await reader.readexactly(8))
+        if length > _MAX_BODY:
+            raise ConnectionError('WebSocket frame too large')
+        mask = await reader.readexactly(4) if second & 0x80 else None
+        payload = await reader.readexactly(length)
+        if mask:
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        return opcode, payload
+
+    @staticmethod
+    def _send_frame(writer: asyncio.StreamWriter, opcode: int, payload: bytes):
+        length = len(payload)
+        if length < 126:
+            header = struct.pack('!BB', 0x80 | opcode, length)
+        elif length < 1 << 16:
+            header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+        writer.write(header + payload)
+
+
+async def serve(host: str, port: int, **options):
+    server = ChatServer(**options)
+    await server.start(host, port)
+    print(f"Chat server ({server.engine} engine) on http://{host}:{port}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--engine', choices=ENGINES, default='simple')
+    parser.add_argument('--idle-timeout', type=float, default=900.0, help='seconds before an idle session is dropped')
+    parser.add_argument('--max-sessions', type=int, default=100000)
+    parser.add_argument('--workers', type=int, default=None, help='threads for CPU-bound bot work')
+    parser.add_argument('--processes', type=int, default=0, help='prefork N worker processes for the FAQ engine')
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port, engine=args.engine, idle_timeout=args.idle_timeout,
+                          max_sessions=args.max_sessions, workers=args.workers,
+                          processes=args.processes))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
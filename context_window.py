@@ -0,0 +1,138 @@
+import re
+from collections import deque
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional
+
+from conversation_history import Message
+
+# Fixed cost OpenAI charges per chat message for role and separators
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+@lru_cache(maxsize=None)
+def get_encoding():
+    """Load the tiktoken encoding on first use; None if tiktoken or its data is unavailable."""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding('cl100k_base')
+    except Exception:  # tiktoken not installed or its encoding unavailable offline
+        return None
+
+
+def estimate_tokens(text: str) -> int:
+    """Count tokens with tiktoken when available, else approximate by words and punctuation."""
+    encoding = get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return len(_TOKEN_RE.findall(text))
+
+
+def count_tokens(message: Message) -> int:
+    """Return the token cost of a message, caching it on the message."""
+    if message.tokens is None:
+        message.tokens = estimate_tokens(message.content) + MESSAGE_OVERHEAD_TOKENS
+    return message.tokens
+
+
+def extractive_summarizer(summary: str, messages: List[Message], max_tokens: int) -> str:
+    """Fold turns into the running summary without an API call.
+
+    Keeps the first sentence of each turn and drops the oldest lines once
+    the summary would exceed ``max_tokens``.
+    """
+    lines = summary.splitlines() if summary else []
+    for message in messages:
+        first_sentence = re.split(r'(?<=[.!?])\s', message.content.strip(), maxsplit=1)[0]
+        if first_sentence:
+            lines.append(f"{message.role}: {first_sentence[:200]}")
+    while len(lines) > 1 and estimate_tokens('\n'.join(lines)) > max_tokens:
+        lines.pop(0)
+    return '\n'.join(lines)
+
+
+def llm_summarizer(client, model: str = "gpt-3.5-turbo") -> Callable[[str, List[Message], int], str]:
+    """Build a summarizer that asks the chat completions API to update the summary."""
+    def summarize(summary: str, messages: List[Message], max_tokens: int) -> str:
+        transcript = '\n'.join(f"{m.role}: {m.content}" for m in messages)
+        response = client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": "Update the running summary of a customer support "
+                                              "conversation with the new turns. Keep facts the "
+                                              "assistant will need later. Reply with the summary only."},
+                {"role": "user", "content": f"Summary so far:\n{summary or '(none)'}\n\nNew turns:\n{transcript}"},
+            ],
+            temperature=0,
+            max_tokens=max_tokens
+        )
+        return response.choices[0].message.content
+    return summarize
+
+
+class ContextWindow:
+    """Token-budgeted view of a conversation for chat completion requests.
+
+    The pinned system messages are always sent. The most recent turns are
+    kept while they fit in ``budget`` tokens; older turns are folded into a
+    running summary, sent as a second system message. Token counts are
+    cached per message and the summary is only updated when turns fall out
+    of the window, so each new turn costs O(new messages).
+    """
+
+    def __init__(self, budget: int = 3000, summary_budget: int = 300,
+                 summarizer: Optional[Callable[[str, List[Message], int], str]] = None):
+        self.budget = budget
+        self.summary_budget = summary_budget
+        self.summarizer = summarizer or extractive_summarizer
+        self.summary = ''
+        self._summary_tokens = 0
+        self._pinned_tokens = 0
+        self._window: deque = deque()
+        self._window_tokens = 0
+
+    def pin(self, messages: Iterable[Message]):
+        """Set the messages that are always sent, such as the system prompt."""
+        self._pinned_tokens = sum(count_tokens(m) for m in messages)
+        self._trim()
+
+    def add(self, message: Message):
+        """Add the newest turn, folding older turns into the summary if over budget."""
+        self._window.append(message)
+        self._window_tokens += count_tokens(message)
+        self._trim()
+
+    def extend(self, messages: Iterable[Message]):
+        for message in messages:
+            self._window.append(message)
+            self._window_tokens += count_tokens(message)
+        self._trim()
+
+    def _trim(self):
+        # The summary is bounded by summary_budget, so that much is held back for it
+        limit = self.budget - self._pinned_tokens - self.summary_budget
+        folded = []
+        while len(self._window) > 1 and self._window_tokens > limit:
+            message = self._window.popleft()
+            self._window_tokens -= count_tokens(message)
+            folded.append(message)
+        if folded and self.summary_budget:
+            self.summary = self.summarizer(self.summary, folded, self.summary_budget)
+            self._summary_tokens = estimate_tokens(self.summary) + MESSAGE_OVERHEAD_TOKENS
+
+    @property
+    def total_tokens(self) -> int:
+        """Tokens the request messages will use."""
+        return self._pinned_tokens + self._summary_tokens + self._window_tokens
+
+    def __len__(self) -> int:
+        return len(self._window)
+
+    def messages(self, pinned: Iterable[Message] = ()) -> List[Dict]:
+        """Return the request messages: pinned, then the summary, then recent turns."""
+        result = [{'role': m.role, 'content': m.content} for m in pinned]
+        if self.summary:
+            result.append({'role': 'system', 'content': f"Summary of the earlier conversation:\n{self.summary}"})
+        result.extend({'role': m.role, 'content': m.content} for m in self._window)
+        return result
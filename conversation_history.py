@@ -0,0 +1,159 @@
+import json
+import logging
+import sys
+import time
+from collections import deque
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+# Rough per-message overhead (record + float + deque slot) used for the memory cap
+_MESSAGE_OVERHEAD = 120
+
+
+class Message:
+    """A single conversation turn; roles are interned and timestamps are epoch seconds."""
+
+    __slots__ = ('role', 'content', 'timestamp', 'tokens')
+
+    def __init__(self, role: str, content: str, timestamp: Optional[float] = None):
+        self.role = sys.intern(role)
+        self.content = content
+        self.timestamp = time.time() if timestamp is None else timestamp
+        # Token count, filled in lazily by context_window.count_tokens
+        self.tokens: Optional[int] = None
+
+    def __repr__(self) -> str:
+        return f"Message(role={self.role!r}, content={self.content!r}, timestamp={self.timestamp})"
+
+    def nbytes(self) -> int:
+        return len(self.content) + _MESSAGE_OVERHEAD
+
+    def to_dict(self) -> Dict:
+        return {'role': self.role, 'content': self.content, 'timestamp': self.timestamp}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Message':
+        timestamp = data.get('timestamp')
+        return cls(data['role'], data['content'], timestamp if isinstance(timestamp, (int, float)) else None)
+
+
+class ConversationHistory:
+    """Bounded ring buffer of conversation turns.
+
+    Keeps at most ``capacity`` messages and roughly ``max_bytes`` of
+    content, dropping the oldest turns first. Dropped turns are appended
+    to ``spill_path`` as JSON lines when one is given; with ``defer_spill``
+    they are held until ``flush_spill`` instead, so the caller decides when
+    that file is written. ``pinned`` messages (such as an OpenAI system
+    prompt) are never evicted and always come first.
+    """
+
+    def __init__(self, capacity: int = 1000, max_bytes: Optional[int] = 1 << 20,
+                 spill_path: Optional[str] = None, pinned: Iterable[Message] = (),
+                 defer_spill: bool = False):
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self.spill_path = spill_path
+        self.defer_spill = defer_spill
+        self.pinned: List[Message] = list(pinned)
+        self._messages: deque = deque()
+        self._bytes = 0
+        self._unspilled: List[Message] = []
+        self.evicted = 0
+
+    @classmethod
+    def from_dicts(cls, messages: Iterable[Dict], **kwargs) -> 'ConversationHistory':
+        """Build a history from plain dicts, pinning any leading system messages."""
+        history = cls(**kwargs)
+        for data in messages:
+            message = Message.from_dict(data)
+            if message.role == 'system' and not history._messages:
+                history.pinned.append(message)
+            else:
+                history._push(message)
+        history._evict()
+        return history
+
+    def __len__(self) -> int:
+        return len(self.pinned) + len(self._messages)
+
+    def __iter__(self) -> Iterator[Message]:
+        yield from self.pinned
+        yield from self._messages
+
+    def turns(self) -> Iterator[Message]:
+        """Iterate over the unpinned messages, oldest first."""
+        return iter(self._messages)
+
+    def __getitem__(self, index: Union[int, slice]):
+        # deque has no slicing, so materialize only for slices
+        if isinstance(index, slice):
+            return list(self)[index]
+        if index < 0:
+            index += len(self)
+        if index < len(self.pinned):
+            return self.pinned[index]
+        return self._messages[index - len(self.pinned)]
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the unpinned messages."""
+        return self._bytes
+
+    def append(self, role: str, content: str, timestamp: Optional[float] = None) -> Message:
+        """Record a turn, evicting the oldest ones if a limit is exceeded."""
+        message = Message(role, content, timestamp)
+        self._push(message)
+        self._evict()
+        return message
+
+    def _push(self, message: Message):
+        self._messages.append(message)
+        self._bytes += message.nbytes()
+
+    def _evict(self):
+        evicted = []
+        while self._messages and (
+            len(self._messages) > self.capacity
+            or (self.max_bytes is not None and self._bytes > self.max_bytes and len(self._messages) > 1)
+        ):
+            message = self._messages.popleft()
+            self._bytes -= message.nbytes()
+            evicted.append(message)
+        if evicted:
+            self.evicted += len(evicted)
+            self._spill(evicted)
+
+    def _spill(self, messages: List[Message]):
+        if not self.spill_path:
+            return
+        if self.defer_spill:
+            self._unspilled.extend(messages)
+            return
+        self._write_spill(messages)
+
+    def flush_spill(self):
+        """Append the turns dropped since the last flush to ``spill_path``."""
+        messages, self._unspilled = self._unspilled, []
+        if messages:
+            self._write_spill(messages)
+
+    def _write_spill(self, messages: List[Message]):
+        try:
+            with open(self.spill_path, 'a', encoding='utf-8') as f:
+                f.write(''.join(json.dumps(m.to_dict()) + '\n' for m in messages))
+        except OSError as e:
+            logging.error(f"Error spilling conversation history: {e}")
+
+    def tail(self, n: int) -> List[Dict]:
+        """Return the last ``n`` turns as JSON-serializable dicts."""
+        recent = list(islice(reversed(self._messages), n))
+        return [m.to_dict() for m in reversed(recent)]
+
+    def as_messages(self) -> List[Dict]:
+        """Return role/content dicts in the shape the chat completions API expects."""
+        return [{'role': m.role, 'content': m.content} for m in self]
+
+    def clear(self):
+        self._messages.clear()
+        self._bytes = 0
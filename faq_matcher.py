@@ -0,0 +1,142 @@
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+# Hit kinds recorded against each needle in the automaton
+PATTERN = 0
+KEYWORD = 1
+
+
+class Automaton:
+    """Aho-Corasick automaton that finds every needle in a single pass over the text."""
+
+    def __init__(self, needles: Iterable[Tuple[str, object]]):
+        # Node 0 is the root; each node has a goto table, a failure link and
+        # the payloads of every needle ending at it (including via failure links).
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple] = [()]
+        self._always: List[object] = []
+
+        for needle, payload in needles:
+            if not needle:
+                # The empty string is a substring of everything
+                self._always.append(payload)
+                continue
+            node = 0
+            for ch in needle:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                node = nxt
+            self._out[node] += (payload,)
+
+        self._build_failure_links()
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                if self._out[self._fail[child]]:
+                    self._out[child] += self._out[self._fail[child]]
+
+    def __len__(self) -> int:
+        return len(self._goto)
+
+    def iter_matches(self, text: str) -> Iterator[object]:
+        """Yield the payload of every needle occurrence in the text."""
+        yield from self._always
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                yield from out[node]
+
+    def matches(self, text: str) -> Set[object]:
+        """Return the distinct payloads of all needles found in the text."""
+        found = set(self._always)
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                found.update(out[node])
+        return found
+
+
+class FAQMatcher:
+    """Match user input against every FAQ pattern and keyword in one pass.
+
+    Built once per knowledge base. Results are identical to scanning the
+    intents one pattern at a time: patterns are lowercased, keywords are
+    compared as-is against the lowercased input, and ties are resolved by
+    the intent order of the knowledge base.
+    """
+
+    def __init__(self, faq: Dict):
+        self.intents: List[str] = list(faq)
+        needles = []
+        for index, data in enumerate(faq.values()):
+            for pattern in data.get('patterns', ()):
+                needles.append((pattern.lower(), (index, PATTERN)))
+            for keyword in data.get('keywords', ()):
+                needles.append((keyword, (index, KEYWORD)))
+        self._automaton = Automaton(needles)
+
+    def hits(self, user_input: str) -> Tuple[Set[int], Set[int]]:
+        """Return the indices of intents hit by a pattern and by a keyword."""
+        pattern_hits: Set[int] = set()
+        keyword_hits: Set[int] = set()
+        for index, kind in self._automaton.matches(user_input.lower()):
+            if kind == PATTERN:
+                pattern_hits.add(index)
+            else:
+                keyword_hits.add(index)
+        return pattern_hits, keyword_hits
+
+    def find(self, user_input: str, first: bool = False,
+             skip: Iterable[str] = ()) -> Optional[Tuple[str, int]]:
+        """Return the matched (intent, PATTERN or KEYWORD) pair, or None.
+
+        By default any pattern hit beats every keyword hit, mirroring the
+        two-pass scan in AIChatbot/SimpleChatbot._check_faq. With ``first``
+        the earliest intent hit by either wins, mirroring the single
+        per-intent scan in RuleBasedChatbot.get_response.
+        """
+        pattern_hits, keyword_hits = self.hits(user_input)
+        skip = set(skip)
+        if first:
+            for index in sorted(pattern_hits | keyword_hits):
+                if self.intents[index] not in skip:
+                    return self.intents[index], PATTERN if index in pattern_hits else KEYWORD
+            return None
+        for hits, kind in ((pattern_hits, PATTERN), (keyword_hits, KEYWORD)):
+            for index in sorted(hits):
+                if self.intents[index] not in skip:
+                    return self.intents[index], kind
+        return None
+
+    def match(self, user_input: str) -> Optional[str]:
+        """Return the intent matched by a pattern, falling back to keywords."""
+        hit = self.find(user_input)
+        return hit[0] if hit else None
+
+    def match_first(self, user_input: str, skip: Iterable[str] = ()) -> Optional[str]:
+        """Return the first intent hit by either a pattern or a keyword."""
+        hit = self.find(user_input, first=True, skip=skip)
+        return hit[0] if hit else None
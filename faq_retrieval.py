@@ -0,0 +1,116 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from faq_terms import BM25_B, BM25_K1, tokenize
+
+
+class FAQIndex:
+    """Ranked BM25 retrieval over the intents of an FAQ knowledge base.
+
+    Each intent becomes one document made of its patterns, keywords and
+    responses. Term weights are precomputed into a term-major sparse
+    layout (postings), so scoring a query is a gather plus a bincount and
+    a batch of queries is scored in one vectorized call.
+    """
+
+    def __init__(self, faq: Dict, k1: float = BM25_K1, b: float = BM25_B,
+                 min_score: float = 3.0, skip: Sequence[str] = ('default',)):
+        self.min_score = min_score
+        self.intents: List[str] = [intent for intent in faq if intent not in skip]
+        self.vocabulary: Dict[str, int] = {}
+
+        doc_terms = []
+        for intent in self.intents:
+            data = faq[intent]
+            text = ' '.join(list(data.get('patterns', ())) + list(data.get('keywords', ()))
+                            + list(data.get('responses', ())))
+            counts: Dict[int, int] = {}
+            for token in tokenize(text):
+                term = self.vocabulary.setdefault(token, len(self.vocabulary))
+                counts[term] = counts.get(term, 0) + 1
+            doc_terms.append(counts)
+
+        num_docs = len(self.intents)
+        num_terms = len(self.vocabulary)
+        lengths = np.array([sum(c.values()) for c in doc_terms], dtype=np.float64)
+        avg_length = lengths.mean() if num_docs and lengths.sum() else 1.0
+
+        terms = np.fromiter((t for c in doc_terms for t in c), dtype=np.int64)
+        docs = np.repeat(np.arange(num_docs, dtype=np.int64),
+                         [len(c) for c in doc_terms])
+        tf = np.fromiter((n for c in doc_terms for n in c.values()), dtype=np.float64)
+
+        df = np.bincount(terms, minlength=num_terms).astype(np.float64)
+        idf = np.log1p((num_docs - df + 0.5) / (df + 0.5))
+        norm = k1 * (1.0 - b + b * lengths[docs] / avg_length)
+        weights = idf[terms] * tf * (k1 + 1.0) / (tf + norm)
+
+        # Postings sorted by term: docs/weights for term t live in
+        # [indptr[t], indptr[t + 1])
+        order = np.argsort(terms, kind='stable')
+        self._post_docs = docs[order]
+        self._post_weights = weights[order]
+        self._indptr = np.zeros(num_terms + 1, dtype=np.int64)
+        np.cumsum(df.astype(np.int64), out=self._indptr[1:])
+
+    def __len__(self) -> int:
+        return len(self.intents)
+
+    def _query_terms(self, text: str) -> List[int]:
+        vocabulary = self.vocabulary
+        return [vocabulary[t] for t in tokenize(text) if t in vocabulary]
+
+    def score_batch(self, queries: Sequence[str]) -> np.ndarray:
+        """Return a (len(queries), len(intents)) matrix of BM25 scores."""
+        num_docs = len(self.intents)
+        query_ids, term_ids = [], []
+        for q, text in enumerate(queries):
+            terms = self._query_terms(text)
+            query_ids.extend([q] * len(terms))
+            term_ids.extend(terms)
+        if not term_ids or not num_docs:
+            return np.zeros((len(queries), num_docs))
+
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        starts = self._indptr[term_ids]
+        sizes = self._indptr[term_ids + 1] - starts
+        # Expand each (query, term) pair into the positions of its postings
+        offsets = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+        positions = np.repeat(starts, sizes) + offsets
+        rows = np.repeat(np.asarray(query_ids, dtype=np.int64), sizes)
+
+        cells = rows * num_docs + self._post_docs[positions]
+        scores = np.bincount(cells, weights=self._post_weights[positions],
+                             minlength=len(queries) * num_docs)
+        return scores.reshape(len(queries), num_docs)
+
+    def search_batch(self, queries: Sequence[str], k: int = 3,
+                     min_score: Optional[float] = None) -> List[List[Tuple[str, float]]]:
+        """Return the top-k (intent, score) pairs above the threshold for each query."""
+        threshold = self.min_score if min_score is None else min_score
+        scores = self.score_batch(queries)
+        k = min(k, scores.shape[1])
+        if k <= 0:
+            return [[] for _ in queries]
+
+        # k-th best score per query; everything tied with it is a candidate, so
+        # ties are broken by catalog order (as sqlite_kb does) rather than by
+        # wherever argpartition happened to leave them
+        kth = -np.partition(-scores, k - 1, axis=1)[:, k - 1]
+        results = []
+        for row, cutoff in zip(scores, kth):
+            candidates = np.flatnonzero((row >= max(cutoff, threshold)) & (row > 0))
+            candidates = candidates[np.argsort(-row[candidates], kind='stable')][:k]
+            results.append([(self.intents[i], float(row[i])) for i in candidates])
+        return results
+
+    def search(self, query: str, k: int = 3,
+               min_score: Optional[float] = None) -> List[Tuple[str, float]]:
+        """Return the top-k (intent, score) pairs above the threshold."""
+        return self.search_batch([query], k, min_score)[0]
+
+    def best(self, query: str, min_score: Optional[float] = None) -> Optional[str]:
+        """Return the highest-ranked intent, or None if nothing clears the threshold."""
+        hits = self.search(query, 1, min_score)
+        return hits[0][0] if hits else None
@@ -0,0 +1,28 @@
+"""Tokenizer and BM25 parameters shared by the FAQ retrieval backends.
+
+faq_retrieval.FAQIndex (NumPy, in memory) and sqlite_kb (SQLite postings)
+must turn text into the same terms and weigh them with the same BM25
+parameters, or ``fuzzy_min_score`` and the reported confidence would mean
+different things per backend. Both import them from here; this module
+needs no NumPy, so the SQLite backend and analytics.py work without it.
+"""
+import re
+from typing import List
+
+TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+# Words too common to say anything about which intent the user wants
+STOPWORDS = frozenset("""
+a an and are as at be but by can could do does for from have how i i'm is it
+its me my of on or our please so that the their them there this to us was we
+what when where which who why will with would you your
+""".split())
+
+# BM25 term-frequency saturation and length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase the text and split it into indexable terms."""
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
@@ -0,0 +1,172 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Dict, Optional
+
+FEEDBACK_PATH = 'feedback.json'
+
+
+class _Flush:
+    __slots__ = ('done',)
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+_STOP = object()
+
+
+class FeedbackSink:
+    """Non-blocking, batched JSONL writer for user feedback.
+
+    ``submit`` only enqueues the record; a background thread writes queued
+    records in batches of up to ``batch_size``, or every ``flush_interval``
+    seconds, each batch with a single write. When the queue is full the
+    record is dropped and counted rather than blocking the caller. With
+    ``max_bytes`` the file is rotated like logging's RotatingFileHandler,
+    keeping ``backup_count`` old files (``feedback.json.1`` is the newest).
+    """
+
+    def __init__(self, path: str = FEEDBACK_PATH, maxsize: int = 10000, batch_size: int = 100,
+                 flush_interval: float = 1.0, max_bytes: Optional[int] = None, backup_count: int = 5):
+        self.path = path
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self.errors = 0
+        self._queue: Optional[queue.Queue] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        # The writer is started lazily, and again in a forked child, which
+        # inherits the queue but not the thread
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(self.maxsize)
+                self._thread = threading.Thread(target=self._run, name='feedback-sink', daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def submit(self, record: Dict) -> bool:
+        """Queue a record for writing; return False if it was dropped."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def flush(self, timeout: Optional[float] = 5.0) -> bool:
+        """Block until everything queued so far has been written."""
+        if self._pid != os.getpid():
+            return True
+        marker = _Flush()
+        self._queue.put(marker)
+        return marker.done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = 5.0):
+        """Write out the queue and stop the writer thread."""
+        if self._pid != os.getpid():
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._pid = None
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            'queue_depth': self._queue.qsize() if self._pid == os.getpid() else 0,
+            'dropped': self.dropped,
+            'written': self.written,
+            'batches': self.batches,
+            'errors': self.errors,
+        }
+
+    def _run(self):
+        pending = []
+        markers = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = None
+            stop = item is _STOP
+            if isinstance(item, _Flush):
+                markers.append(item)
+            elif item is not None and not stop:
+                pending.append(item)
+
+            if pending and (stop or markers or len(pending) >= self.batch_size
+                            or time.monotonic() >= deadline):
+                self._write(pending)
+                pending = []
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.flush_interval
+            for marker in markers:
+                marker.done.set()
+            markers = []
+            if stop:
+                return
+
+    def _write(self, records):
+        data = ''.join(json.dumps(record) + '\n' for record in records)
+        try:
+            if self.max_bytes and self._size() + len(data) > self.max_bytes:
+                self._rotate()
+            with open(self.path, 'a') as f:
+                f.write(data)
+        except Exception as e:
+            self.errors += 1
+            self.dropped += len(records)
+            logging.error(f"Error saving feedback: {e}")
+            return
+        self.written += len(records)
+        self.batches += 1
+
+    def _size(self) -> int:
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    def _rotate(self):
+        if self._size() == 0:
+            return
+        if self.backup_count <= 0:
+            os.remove(self.path)
+            return
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f'{self.path}.{i}'
+            if os.path.exists(src):
+                os.replace(src, f'{self.path}.{i + 1}')
+        os.replace(self.path, f'{self.path}.1')
+
+
+_sinks: Dict[str, FeedbackSink] = {}
+_sinks_lock = threading.Lock()
+
+
+def get_feedback_sink(path: str = FEEDBACK_PATH, **options) -> FeedbackSink:
+    """Return the process-wide sink for ``path``, flushed at interpreter exit."""
+    sink = _sinks.get(path)
+    if sink is None:
+        with _sinks_lock:
+            sink = _sinks.get(path)
+            if sink is None:
+                sink = _sinks[path] = FeedbackSink(path, **options)
+                atexit.register(sink.close)
+    return sink
@@ -0,0 +1,153 @@
+import os
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+from kb_registry import FAQMatch, KnowledgeBase
+from metrics import metrics
+from turn_log import turn_log
+from simple_chatbot import SimpleChatbot
+from warmup import ENGINE_TASKS, start_background
+
+TIERS = ('faq', 'clarify', 'llm')
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of the samples (0.0 when empty)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+class HybridRouter:
+    """Answer from the local FAQ engine first and call the LLM only when needed.
+
+    Tier 1 ('faq') answers locally when the FAQ match confidence reaches
+    ``min_confidence``. Tier 2 ('clarify') asks a clarifying question for
+    vague input, without an API call. Tier 3 ('llm') escalates to the
+    OpenAI bot. Latency samples per tier and the escalation rate are kept
+    so the thresholds can be tuned. The default OpenAI bot keeps its
+    conversation under ``session_id``, so routers for different sessions
+    never share a prompt or a session log.
+    """
+
+    def __init__(self, local=None, llm_factory: Optional[Callable] = None,
+                 min_confidence: float = 0.6, clarify: bool = True, max_samples: int = 10000,
+                 session_id: Optional[str] = None):
+        self.local = local if local is not None else SimpleChatbot()
+        self.session_id = session_id
+        self.llm_factory = llm_factory or self._default_llm
+        self._custom_llm = llm_factory is not None
+        self.min_confidence = min_confidence
+        self.clarify = clarify
+        self._llm = None
+        self.counts: Dict[str, int] = {tier: 0 for tier in TIERS}
+        self.latencies: Dict[str, deque] = {tier: deque(maxlen=max_samples) for tier in TIERS}
+
+    def _default_llm(self):
+        # Imported lazily so the router works offline without the openai package
+        from openai_chatbot import OpenAIChatbot
+        return OpenAIChatbot(session_id=self.session_id)
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            self._llm = self.llm_factory()
+        return self._llm
+
+    def llm_available(self) -> bool:
+        return self._llm is not None or self._custom_llm or bool(os.getenv('OPENAI_API_KEY'))
+
+    def route(self, user_input: str) -> str:
+        """Pick the tier that should answer the input."""
+        return self._route(user_input, self.local._load_faq())[0]
+
+    def _route(self, user_input: str, kb: KnowledgeBase) -> Tuple[str, Optional[FAQMatch]]:
+        # Also returns the FAQ match so the local bot can answer without a second lookup
+        match = self.local.match_faq(user_input, kb)
+        if match is not None and match.confidence >= self.min_confidence:
+            return 'faq', match
+        if self.clarify and self.local._is_unclear_query(user_input):
+            return 'clarify', match
+        if not self.llm_available():
+            # Nothing to escalate to; the local bot's fallback is the best we have
+            return 'faq', match
+        return 'llm', match
+
+    def get_response(self, user_input: str) -> str:
+        """Generate a response using the cheapest tier that can answer."""
+        start = time.perf_counter()
+        # One snapshot for routing and answering, however the KB is reloaded in between
+        kb = self.local._load_faq()
+        tier, match = self._route(user_input, kb)
+        if tier == 'faq':
+            response = self.local.respond_to_match(match, user_input, kb)
+        elif tier == 'clarify':
+            self.local.conversation_history.append('user', user_input)
+            response = self.local._handle_unclear_query()
+            turn_log.record('hybrid', user_input, 'unclear')
+        else:
+            # Escalated: the FAQ had no confident answer
+            response = self.llm.get_response(user_input)
+            turn_log.record('hybrid', user_input, 'llm')
+        elapsed = time.perf_counter() - start
+        self.counts[tier] += 1
+        self.latencies[tier].append(elapsed)
+        metrics.observe('chatbot_stage_seconds', elapsed, bot='hybrid', stage=tier)
+        return response
+
+    @property
+    def escalation_rate(self) -> float:
+        total = sum(self.counts.values())
+        return self.counts['llm'] / total if total else 0.0
+
+    def stats(self) -> Dict:
+        """Return per-tier counts and latency percentiles (ms) plus the escalation rate."""
+        tiers = {}
+        for tier in TIERS:
+            samples = list(self.latencies[tier])
+            tiers[tier] = {
+                'count': self.counts[tier],
+                'p50_ms': percentile(samples, 50) * 1000,
+                'p95_ms': percentile(samples, 95) * 1000,
+            }
+        overall = [s for tier in TIERS for s in self.latencies[tier]]
+        return {
+            'tiers': tiers,
+            'escalation_rate': self.escalation_rate,
+            'p95_ms': percentile(overall, 95) * 1000,
+        }
+
+
+def main():
+    from openai_chatbot import load_env
+    load_env()
+
+    print("Hybrid Chatbot: Hello! I'm your AI assistant. Type 'quit' to exit.")
+    start_background(ENGINE_TASKS['hybrid'])
+    router = HybridRouter()
+    if not router.llm_available():
+        print("(OPENAI_API_KEY not set: answering from the local FAQ only)")
+
+    try:
+        while True:
+            user_input = input("\nYou: ")
+
+            if user_input.lower() in ['quit', 'exit', 'bye']:
+                print("Hybrid Chatbot: Goodbye! Have a great day!")
+                break
+
+            response = router.get_response(user_input)
+            print(f"Hybrid Chatbot: {response}")
+
+    except KeyboardInterrupt:
+        print("\nHybrid Chatbot: Goodbye! Have a great day!")
+    finally:
+        stats = router.stats()
+        print(f"\nEscalation rate: {stats['escalation_rate']:.0%}, p95 latency: {stats['p95_ms']:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
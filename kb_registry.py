@@ -0,0 +1,283 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, List, Mapping, NamedTuple, Optional, Sequence, Set
+
+from faq_matcher import PATTERN, FAQMatcher
+
+FAQ_PATH = 'faq_knowledge_base.json'
+
+# FAQ paths with these suffixes are opened as SQLite knowledge bases
+SQLITE_SUFFIXES = ('.sqlite', '.sqlite3', '.db')
+
+# Bump whenever the pickled layout of the matcher or index changes so that
+# stale snapshots are ignored rather than loaded.
+SNAPSHOT_VERSION = 1
+
+
+# BM25 score at which a fuzzy match counts as 50% confident
+RETRIEVAL_HALF_CONFIDENCE = 3.0
+
+
+@lru_cache(maxsize=None)
+def faq_index_class():
+    """Return faq_retrieval.FAQIndex, or None without NumPy.
+
+    Imported on first use rather than at module import: NumPy alone costs
+    more start-up time than the rest of the bots put together.
+    """
+    try:
+        from faq_retrieval import FAQIndex
+    except ImportError:  # NumPy not installed; fuzzy fallback is disabled
+        return None
+    return FAQIndex
+
+
+class FAQMatch(NamedTuple):
+    """An intent matched for a user message, with how it was found."""
+    intent: str
+    source: str  # 'pattern', 'keyword' or 'retrieval'
+    confidence: float
+
+
+class KnowledgeBase(NamedTuple):
+    """Immutable, precompiled snapshot of an FAQ knowledge base.
+
+    Shared by every bot instance in the process; treat all fields as read-only.
+    """
+    faq: Mapping
+    matcher: FAQMatcher
+    index: Optional['faq_retrieval.FAQIndex']
+    digest: str
+
+    @classmethod
+    def build(cls, faq: Dict, digest: str = '') -> 'KnowledgeBase':
+        """Compile the matcher and retrieval index for a parsed FAQ."""
+        index_class = faq_index_class()
+        index = index_class(faq) if index_class else None
+        return cls(MappingProxyType(faq), FAQMatcher(faq), index, digest)
+
+    def lookup(self, user_input: str, fuzzy_min_score: Optional[float] = None,
+               first: bool = False, skip: Sequence[str] = ()) -> Optional[FAQMatch]:
+        """Match exact patterns/keywords, falling back to ranked retrieval.
+
+        Verbatim pattern hits are fully confident and keyword hits slightly
+        less; retrieval confidence grows with the BM25 score. Pass
+        ``fuzzy_min_score=None`` to skip retrieval.
+        """
+        return self.lookup_batch([user_input], fuzzy_min_score, first, skip)[0]
+
+    def lookup_batch(self, user_inputs: Sequence[str], fuzzy_min_score: Optional[float] = None,
+                     first: bool = False, skip: Sequence[str] = ()) -> List[Optional[FAQMatch]]:
+        """``lookup`` for many messages; the unmatched ones are ranked in one vectorized call."""
+        matches = []
+        for user_input in user_inputs:
+            hit = self.matcher.find(user_input, first, skip)
+            if hit is None:
+                matches.append(None)
+            elif hit[1] == PATTERN:
+                matches.append(FAQMatch(hit[0], 'pattern', 1.0))
+            else:
+                matches.append(FAQMatch(hit[0], 'keyword', 0.75))
+
+        # Fall back to ranked retrieval when no pattern appears verbatim
+        misses = [i for i, match in enumerate(matches) if match is None]
+        if misses and self.index is not None and fuzzy_min_score is not None:
+            results = self.index.search_batch([user_inputs[i] for i in misses], 1 + len(skip), fuzzy_min_score)
+            for i, hits in zip(misses, results):
+                for intent, score in hits:
+                    if intent not in skip:
+                        matches[i] = FAQMatch(intent, 'retrieval', score / (score + RETRIEVAL_HALF_CONFIDENCE))
+                        break
+        return matches
+
+
+class _Entry:
+    __slots__ = ('kb', 'mtime_ns', 'size', 'checked_at', 'reloading')
+
+    def __init__(self, kb: Optional[KnowledgeBase], stat: Optional[os.stat_result]):
+        self.kb = kb
+        self.mtime_ns = stat.st_mtime_ns if stat else None
+        self.size = stat.st_size if stat else None
+        self.checked_at = time.monotonic()
+        self.reloading = False
+
+
+class KnowledgeBaseRegistry:
+    """Process-wide cache of compiled knowledge bases.
+
+    Each FAQ file is parsed and compiled once, and the compiled snapshot is
+    pickled to ``cache_dir`` keyed by the file's content hash so later
+    processes skip both steps. The file's mtime is polled at most every
+    ``check_interval`` seconds; when it changes a new snapshot is built in a
+    background thread and swapped in atomically. Callers keep whatever
+    snapshot they already hold, so in-flight requests are never blocked.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = '.kb_cache', check_interval: float = 2.0):
+        self.cache_dir = cache_dir
+        self.check_interval = check_interval
+        self._entries: Dict[str, _Entry] = {}
+        self._defaults: Dict[int, KnowledgeBase] = {}
+        self._databases: Dict[str, object] = {}
+        self._prefetching: Set[str] = set()
+        self._prefetch_lock = threading.Lock()
+        self._lock = threading.Lock()
+
+    def get(self, path: str = FAQ_PATH, default: Optional[Dict] = None) -> KnowledgeBase:
+        """Return the current snapshot for ``path``, or for ``default`` if the file is missing."""
+        key = os.path.abspath(path)
+        if key.endswith(SQLITE_SUFFIXES):
+            return self._database(key, default)
+        entry = self._entries.get(key)
+        if entry is None:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is None:
+                    entry = self._entries[key] = self._load(key)
+        elif time.monotonic() - entry.checked_at >= self.check_interval:
+            self._check(key, entry)
+
+        if entry.kb is not None:
+            return entry.kb
+        if default is None:
+            raise FileNotFoundError(path)
+        return self._default(default)
+
+    def prefetch(self, path: str = FAQ_PATH, default: Optional[Dict] = None):
+        """Start loading ``path`` on a background thread unless it is already loaded.
+
+        A later ``get`` waits for that load instead of starting its own.
+        """
+        key = os.path.abspath(path)
+        # Not self._lock, which is held for the whole of a load
+        with self._prefetch_lock:
+            if key in self._entries or key in self._databases or key in self._prefetching:
+                return
+            self._prefetching.add(key)
+        threading.Thread(target=self._prefetch, args=(path, default), daemon=True).start()
+
+    def _prefetch(self, path: str, default: Optional[Dict]):
+        try:
+            self.get(path, default)
+        except Exception as e:
+            logging.error(f"Error loading FAQ knowledge base {path}: {e}")
+
+    def _database(self, key: str, default: Optional[Dict]):
+        """Open an SQLite knowledge base (see sqlite_kb.py); intents stay on disk."""
+        kb = self._databases.get(key)
+        if kb is None:
+            if not os.path.exists(key):
+                if default is None:
+                    raise FileNotFoundError(key)
+                logging.warning("FAQ knowledge base not found. Using default FAQs.")
+                return self._default(default)
+            from sqlite_kb import SQLiteKnowledgeBase
+            with self._lock:
+                kb = self._databases.get(key)
+                if kb is None:
+                    kb = self._databases[key] = SQLiteKnowledgeBase(key)
+        return kb
+
+    def _default(self, faq: Dict) -> KnowledgeBase:
+        kb = self._defaults.get(id(faq))
+        if kb is None:
+            kb = self._defaults.setdefault(id(faq), KnowledgeBase.build(faq))
+        return kb
+
+    def _check(self, key: str, entry: _Entry):
+        entry.checked_at = time.monotonic()
+        try:
+            stat = os.stat(key)
+        except FileNotFoundError:
+            stat = None
+        if stat is not None and (stat.st_mtime_ns, stat.st_size) == (entry.mtime_ns, entry.size):
+            return
+        if stat is None and entry.kb is None:
+            return
+
+        with self._lock:
+            if entry.reloading:
+                return
+            entry.reloading = True
+        threading.Thread(target=self._reload, args=(key, stat), daemon=True).start()
+
+    def _reload(self, key: str, stat: Optional[os.stat_result]):
+        try:
+            new_entry = self._load(key)
+        except Exception as e:
+            logging.error(f"Error reloading FAQ knowledge base {key}: {e}")
+            entry = self._entries[key]
+            # Keep serving the old snapshot, and only retry once the file changes again
+            if stat is not None:
+                entry.mtime_ns, entry.size = stat.st_mtime_ns, stat.st_size
+            entry.reloading = False
+            return
+        self._entries[key] = new_entry
+        logging.info(f"Reloaded FAQ knowledge base {key}")
+
+    def _load(self, key: str) -> _Entry:
+        try:
+            with open(key, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                raw = f.read()
+        except FileNotFoundError:
+            logging.warning("FAQ knowledge base not found. Using default FAQs.")
+            return _Entry(None, None)
+
+        digest = hashlib.sha256(raw + b'\0%d' % SNAPSHOT_VERSION).hexdigest()
+        kb = self._read_snapshot(digest)
+        if kb is None:
+            kb = KnowledgeBase.build(json.loads(raw.decode('utf-8')), digest)
+            self._write_snapshot(kb)
+        return _Entry(kb, stat)
+
+    def _snapshot_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, f'{digest}.pickle')
+
+    def _read_snapshot(self, digest: str) -> Optional[KnowledgeBase]:
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._snapshot_path(digest), 'rb') as f:
+                faq, matcher, index = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable knowledge base snapshot: {e}")
+            return None
+        if index is None and faq_index_class() is not None:
+            index = faq_index_class()(faq)
+        return KnowledgeBase(MappingProxyType(faq), matcher, index, digest)
+
+    def _write_snapshot(self, kb: KnowledgeBase):
+        if not self.cache_dir:
+            return
+        path = self._snapshot_path(kb.digest)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                pickle.dump((dict(kb.faq), kb.matcher, kb.index), f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.warning(f"Could not write knowledge base snapshot: {e}")
+
+
+registry = KnowledgeBaseRegistry(cache_dir=os.getenv('CHATBOT_KB_CACHE', '.kb_cache'))
+
+
+def get_knowledge_base(path: str = FAQ_PATH, default: Optional[Dict] = None) -> KnowledgeBase:
+    """Return the shared snapshot for ``path`` from the process-wide registry."""
+    return registry.get(path, default)
+
+
+def prefetch_knowledge_base(path: str = FAQ_PATH, default: Optional[Dict] = None):
+    """Load the shared snapshot for ``path`` in the background (see KnowledgeBaseRegistry.prefetch)."""
+    registry.prefetch(path, default)
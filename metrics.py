@@ -0,0 +1,217 @@
+"""Low-overhead counters and latency histograms shared by every bot.
+
+Disabled by default; set ``CHATBOT_METRICS=1`` or call ``metrics.enable()``.
+While disabled every call returns immediately, and ``stage()`` hands back
+a shared no-op context manager, so instrumented code pays one method call
+per stage. Read the data with ``metrics.dump()`` or as Prometheus text via
+``metrics.render_prometheus()``, ``metrics.serve(port)`` or the chat
+server's ``GET /metrics``.
+"""
+import bisect
+import os
+import threading
+import time
+from typing import Dict, List, Tuple
+
+# Seconds; spans a cached FAQ lookup (~10us) up to a slow OpenAI call
+DEFAULT_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+                   0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    'chatbot_stage_seconds': 'Time spent in each stage of get_response',
+    'chatbot_faq_hits_total': 'FAQ lookups that matched, by intent and match source',
+    'chatbot_faq_misses_total': 'FAQ lookups that matched no intent',
+    'chatbot_fallback_total': 'Responses produced by a fallback path, by type',
+    'chatbot_openai_tokens_total': 'OpenAI token usage reported by the API',
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """(le, count) pairs as Prometheus expects them, ending with +Inf."""
+        result = []
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            result.append(('+Inf' if bound == float('inf') else repr(bound), total))
+        return result
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ('metrics', 'labels', 'start')
+
+    def __init__(self, metrics: 'Metrics', labels: Labels):
+        self.metrics = metrics
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics._observe('chatbot_stage_seconds', self.labels, time.perf_counter() - self.start)
+        return False
+
+
+class Metrics:
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._histograms: Dict[Tuple[str, Labels], Histogram] = {}
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    # -- recording --------------------------------------------------------
+
+    def stage(self, bot: str, stage: str):
+        """Context manager timing one stage of a bot's get_response."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, (('bot', bot), ('stage', stage)))
+
+    def inc(self, name: str, amount: float = 1, **labels: str):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels: str):
+        if self.enabled:
+            self._observe(name, tuple(sorted(labels.items())), value)
+
+    def _observe(self, name: str, labels: Labels, value: float):
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def faq_lookup(self, bot: str, match):
+        """Count an FAQ lookup result (a kb_registry.FAQMatch or None)."""
+        if not self.enabled:
+            return
+        if match is None:
+            self.inc('chatbot_faq_misses_total', bot=bot)
+        else:
+            self.inc('chatbot_faq_hits_total', bot=bot, intent=match.intent, source=match.source)
+
+    def fallback(self, bot: str, kind: str):
+        self.inc('chatbot_fallback_total', bot=bot, type=kind)
+
+    def token_usage(self, model: str, usage):
+        """Add the ``usage`` block of a chat completion response."""
+        if not self.enabled or usage is None:
+            return
+        self.inc('chatbot_openai_tokens_total', usage.prompt_tokens or 0, model=model, kind='prompt')
+        self.inc('chatbot_openai_tokens_total', usage.completion_tokens or 0, model=model, kind='completion')
+
+    # -- export -----------------------------------------------------------
+
+    def dump(self) -> Dict:
+        """Return every counter and histogram as plain data."""
+        with self._lock:
+            counters = list(self._counters.items())
+            histograms = [(key, h.count, h.sum, h.cumulative()) for key, h in self._histograms.items()]
+        result: Dict = {'counters': {}, 'histograms': {}}
+        for (name, labels), value in counters:
+            result['counters'].setdefault(name, []).append({'labels': dict(labels), 'value': value})
+        for (name, labels), count, total, buckets in histograms:
+            result['histograms'].setdefault(name, []).append({
+                'labels': dict(labels), 'count': count, 'sum': total, 'buckets': dict(buckets)
+            })
+        return result
+
+    def render_prometheus(self) -> str:
+        """Render the metrics in the Prometheus text exposition format."""
+        data = self.dump()
+        lines = []
+        for name, series in sorted(data['counters'].items()):
+            lines.append(f'# HELP {name} {HELP.get(name, name)}')
+            lines.append(f'# TYPE {name} counter')
+            for item in series:
+                lines.append(f'{name}{_format_labels(item["labels"])} {item["value"]}')
+        for name, series in sorted(data['histograms'].items()):
+            lines.append(f'# HELP {name} {HELP.get(name, name)}')
+            lines.append(f'# TYPE {name} histogram')
+            for item in series:
+                for le, count in item['buckets'].items():
+                    lines.append(f'{name}_bucket{_format_labels(item["labels"], le=le)} {count}')
+                lines.append(f'{name}_sum{_format_labels(item["labels"])} {item["sum"]}')
+                lines.append(f'{name}_count{_format_labels(item["labels"])} {item["count"]}')
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port: int = 9100, host: str = '127.0.0.1') -> 'ThreadingHTTPServer':
+        """Serve ``GET /metrics`` from a daemon thread and return the server."""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+def _format_labels(labels: Dict[str, str], **extra: str) -> str:
+    items = {**labels, **extra}
+    if not items:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in items.values())
+    return '{' + ','.join(f'{k}="{v}"' for k, v in zip(items, escaped)) + '}'
+
+
+metrics = Metrics(enabled=os.getenv('CHATBOT_METRICS', '') not in ('', '0'))
+
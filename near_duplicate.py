@@ -0,0 +1,301 @@
+"""Near-duplicate lookup of previously answered messages (MinHash + LSH).
+
+Rephrasings of one question (typos, word order, punctuation) rarely hit an
+exact-match cache. ``NearDuplicateIndex`` maps a message to a remembered
+one whose character-shingle Jaccard similarity reaches ``threshold``:
+
+* Messages are normalized (lowercase, punctuation dropped, whitespace
+  collapsed) and cut into ``shingle``-character shingles.
+* A ``num_perm``-value MinHash signature is split into ``bands`` bands.
+  Messages sharing any band land in the same bucket and become candidates.
+  With the defaults (16 bands of 4 rows), a pair at similarity 0.8 is found
+  with probability > 0.999.
+* Each candidate is verified with its exact shingle Jaccard, so LSH never
+  returns a message below the threshold.
+* At most ``capacity`` messages are kept; the least recently used is
+  evicted first.
+
+Entries live in a ``scope`` (e.g. the knowledge base version, or the
+conversation so far), and a lookup only sees its own scope.
+
+The FAQ bots and the OpenAI bots accept ``near_duplicates=`` an index, used
+ahead of the FAQ scan and ahead of the API call respectively; by default
+they do not use one (the FAQ bots' ``get_responses`` batches go through
+``cached_faq_lookup_batch``). The chat server gives every session the
+shared index from ``get_near_duplicate_index()`` when
+``CHATBOT_NEAR_DUPLICATES`` is set.
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import zlib
+from array import array
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable, Collection, Dict, FrozenSet, Hashable, List, Optional, Sequence, Set, Tuple
+
+_PRIME = (1 << 31) - 1
+_PUNCT_RE = re.compile(r"[^\w\s]")
+
+
+@lru_cache(maxsize=None)
+def _numpy():
+    try:
+        import numpy
+    except ImportError:  # the pure-Python path computes the same signatures
+        return None
+    return numpy
+
+
+def normalize(text: str) -> str:
+    return ' '.join(_PUNCT_RE.sub('', text.lower()).split())
+
+
+def shingles(text: str, k: int = 3) -> FrozenSet[str]:
+    """Character k-shingles of normalized text (the whole text if it is shorter than k)."""
+    if len(text) <= k:
+        return frozenset((text,))
+    return frozenset(text[i:i + k] for i in range(len(text) - k + 1))
+
+
+def shingle_hashes(text: str, k: int = 3) -> FrozenSet[int]:
+    """The shingles as stable 31-bit hashes; stored instead of the strings, which take far more memory."""
+    return frozenset(zlib.crc32(s.encode('utf-8')) % _PRIME for s in shingles(text, k))
+
+
+def jaccard(a: FrozenSet, b: Collection) -> float:
+    """Jaccard similarity of a set and a collection of distinct items (e.g. a packed array)."""
+    if not a and not b:
+        return 1.0
+    common = len(a.intersection(b))
+    return common / (len(a) + len(b) - common)
+
+
+def scope_key(*parts) -> str:
+    """A compact scope id for arbitrary JSON-serializable parts."""
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+class _Entry:
+    __slots__ = ('text', 'shingles', 'bands', 'value', 'scope')
+
+    def __init__(self, text: str, shingle_set: FrozenSet[int], bands: Tuple[int, ...], value, scope: Hashable):
+        self.text = text
+        # Packed arrays instead of a frozenset and a tuple of int objects: a fraction of the memory
+        self.shingles = array('L', shingle_set)
+        self.bands = array('q', bands)
+        self.value = value
+        self.scope = scope
+
+
+class NearDuplicateIndex:
+    def __init__(self, threshold: float = 0.8, num_perm: int = 64, bands: int = 16,
+                 shingle: int = 3, capacity: int = 10000, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle = shingle
+        self.capacity = capacity
+        rng = random.Random(seed)
+        self._a = [rng.randrange(1, _PRIME) for _ in range(num_perm)]
+        self._b = [rng.randrange(0, _PRIME) for _ in range(num_perm)]
+        self._arrays = None
+        self._entries: 'OrderedDict[int, _Entry]' = OrderedDict()
+        self._exact: Dict[Tuple[Hashable, str], int] = {}
+        # Lists, not sets: most buckets hold one id, and a set costs ~4x the memory
+        self._buckets: Dict[int, List[int]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.evictions = 0
+
+    def signature(self, hashes: FrozenSet[int]) -> List[int]:
+        """MinHash signature of a set of shingle hashes."""
+        hashes = list(hashes)
+        np = _numpy()
+        if np is not None:
+            if self._arrays is None:
+                self._arrays = (np.array(self._a, dtype=np.uint64)[:, None],
+                                np.array(self._b, dtype=np.uint64)[:, None])
+            a, b = self._arrays
+            # a, b, h < 2**31, so a * h + b cannot overflow 64 bits
+            return ((a * np.array(hashes, dtype=np.uint64) + b) % _PRIME).min(axis=1).tolist()
+        return [min((a * h + b) % _PRIME for h in hashes) for a, b in zip(self._a, self._b)]
+
+    def _band_keys(self, signature: List[int], scope: Hashable) -> Tuple[int, ...]:
+        r = self.rows
+        return tuple(hash((scope, band, *signature[band * r:(band + 1) * r])) for band in range(self.bands))
+
+    def _hash(self, norm: str, scope: Hashable) -> Tuple[FrozenSet[int], Tuple[int, ...]]:
+        shingle_set = shingle_hashes(norm, self.shingle)
+        return shingle_set, self._band_keys(self.signature(shingle_set), scope)
+
+    def lookup(self, text: str, scope: Hashable = None) -> Optional[Tuple[object, float]]:
+        """Return (value, similarity) for the closest remembered message, or None."""
+        return self._lookup(normalize(text), scope)[0]
+
+    def _lookup(self, norm: str, scope: Hashable):
+        # Also returns the hashed query (when it was computed) so a miss can be added without rehashing
+        with self._lock:
+            self.lookups += 1
+            entry_id = self._exact.get((scope, norm))
+            if entry_id is not None:
+                self._entries.move_to_end(entry_id)
+                self.exact_hits += 1
+                return (self._entries[entry_id].value, 1.0), None
+            if not self._entries:
+                return None, None
+
+        hashed = query, band_keys = self._hash(norm, scope)
+        with self._lock:
+            candidates: Set[int] = set()
+            for key in band_keys:
+                candidates.update(self._buckets.get(key, ()))
+            best_id, best = None, 0.0
+            for entry_id in candidates:
+                entry = self._entries[entry_id]
+                if entry.scope != scope:
+                    continue
+                similarity = jaccard(query, entry.shingles)
+                if similarity > best:
+                    best_id, best = entry_id, similarity
+            if best_id is None or best < self.threshold:
+                return None, hashed
+            self._entries.move_to_end(best_id)
+            self.near_hits += 1
+            return (self._entries[best_id].value, best), hashed
+
+    def add(self, text: str, value, scope: Hashable = None):
+        """Remember ``value`` as the answer to ``text`` within ``scope``."""
+        self._add(normalize(text), value, scope)
+
+    def get_or_compute(self, text: str, compute: Callable[[], object], scope: Hashable = None):
+        """Return the value remembered for a near-duplicate of ``text``, or compute and remember it."""
+        norm = normalize(text)
+        hit, hashed = self._lookup(norm, scope)
+        if hit is not None:
+            return hit[0]
+        value = compute()
+        self._add(norm, value, scope, hashed)
+        return value
+
+    def _add(self, norm: str, value, scope: Hashable, hashed=None):
+        shingle_set, band_keys = hashed or self._hash(norm, scope)
+        with self._lock:
+            old_id = self._exact.get((scope, norm))
+            if old_id is not None:
+                self._remove(old_id)
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = _Entry(norm, shingle_set, band_keys, value, scope)
+            self._exact[(scope, norm)] = entry_id
+            for key in band_keys:
+                self._buckets.setdefault(key, []).append(entry_id)
+            while len(self._entries) > self.capacity:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        del self._exact[(entry.scope, entry.text)]
+        for key in entry.bands:
+            bucket = self._buckets[key]
+            bucket.remove(entry_id)
+            if not bucket:
+                del self._buckets[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._exact.clear()
+            self._buckets.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict:
+        hits = self.exact_hits + self.near_hits
+        return {
+            'lookups': self.lookups,
+            'exact_hits': self.exact_hits,
+            'near_hits': self.near_hits,
+            'hit_rate': hits / self.lookups if self.lookups else 0.0,
+            'evictions': self.evictions,
+            'size': len(self._entries),
+            'capacity': self.capacity,
+            'threshold': self.threshold,
+        }
+
+
+def cached_faq_lookup(index: Optional[NearDuplicateIndex], kb, user_input: str, *args, **kwargs):
+    """``kb.lookup(user_input, ...)``, answered from ``index`` for near-duplicates of earlier input.
+
+    Misses (None) are remembered too, so rephrasings of unanswerable questions
+    skip the retrieval fallback as well. Entries are scoped to the knowledge
+    base version and the lookup arguments.
+    """
+    if index is None:
+        return kb.lookup(user_input, *args, **kwargs)
+    # Built-in default FAQs have no digest; tell them apart by object
+    scope = scope_key(getattr(kb, 'digest', '') or id(kb), args, kwargs)
+    return index.get_or_compute(user_input, lambda: kb.lookup(user_input, *args, **kwargs), scope)
+
+
+def cached_faq_lookup_batch(index: Optional[NearDuplicateIndex], kb, user_inputs: Sequence[str],
+                            *args, **kwargs) -> List:
+    """``cached_faq_lookup`` for many messages at once.
+
+    Each distinct message is looked up once, and everything not answered
+    from ``index`` goes to ``kb.lookup_batch`` in a single call.
+    """
+    distinct = list(dict.fromkeys(user_inputs))
+    if index is None:
+        found = dict(zip(distinct, kb.lookup_batch(distinct, *args, **kwargs)))
+        return [found[user_input] for user_input in user_inputs]
+    scope = scope_key(getattr(kb, 'digest', '') or id(kb), args, kwargs)
+    found, misses = {}, []
+    for user_input in distinct:
+        norm = normalize(user_input)
+        hit, hashed = index._lookup(norm, scope)
+        if hit is not None:
+            found[user_input] = hit[0]
+        else:
+            misses.append((user_input, norm, hashed))
+    if misses:
+        matches = kb.lookup_batch([user_input for user_input, _, _ in misses], *args, **kwargs)
+        for (user_input, norm, hashed), match in zip(misses, matches):
+            found[user_input] = match
+            index._add(norm, match, scope, hashed)
+    return [found[user_input] for user_input in user_inputs]
+
+
+_shared_index: Optional[NearDuplicateIndex] = None
+_shared_lock = threading.Lock()
+
+
+def get_near_duplicate_index() -> Optional[NearDuplicateIndex]:
+    """Return the process-wide index, or None unless ``CHATBOT_NEAR_DUPLICATES`` is set.
+
+    Its value is the similarity threshold (``1`` for the default 0.8);
+    ``CHATBOT_NEAR_DUPLICATES_CAPACITY`` caps the number of messages kept.
+    """
+    global _shared_index
+    value = os.getenv('CHATBOT_NEAR_DUPLICATES', '')
+    if value in ('', '0'):
+        return None
+    if _shared_index is None:
+        with _shared_lock:
+            if _shared_index is None:
+                _shared_index = NearDuplicateIndex(
+                    threshold=0.8 if value == '1' else float(value),
+                    capacity=int(os.getenv('CHATBOT_NEAR_DUPLICATES_CAPACITY', 10000)),
+                )
+    return _shared_index
@@ -1,69 +1,208 @@
 import os
-import json
-from typing import List, Dict
-from openai import OpenAI
-from dotenv import load_dotenv
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from context_window import ContextWindow
+from conversation_history import ConversationHistory
+from metrics import metrics
+from near_duplicate import NearDuplicateIndex, normalize, scope_key
+from openai_scheduler import OpenAIScheduler, SchedulerError, get_scheduler, is_retryable
+from response_cache import get_response_cache
+from session_log import SessionLog, session_snapshot_path
+from warmup import ENGINE_TASKS, start_background
 
-# Load environment variables from .env file
-load_dotenv()
+SYSTEM_PROMPT = """You are a helpful AI assistant designed for customer support. 
+                    Be friendly, professional, and provide accurate information. 
+                    If you don't know something, say so rather than making up an answer."""
+
+# Messages (including the new one) that must match for a near-duplicate answer to be reused
+NEAR_DUPLICATE_WINDOW = 4
+
+@lru_cache(maxsize=None)
+def load_env():
+    """Load environment variables from the .env file (once, on first use)."""
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        return
+    load_dotenv()
 
 class OpenAIChatbot:
-    def __init__(self):
-        # Initialize OpenAI client
-        self.client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-        self.conversation_history: List[Dict] = []
+    # Whether the session log writes on its own thread (see SessionLog)
+    background_log = False
+    
+    def __init__(self, history_capacity: int = 1000, history_max_bytes: Optional[int] = 1 << 20,
+                 session_id: Optional[str] = None, sync: str = 'group',
+                 model: str = "gpt-3.5-turbo", temperature: float = 0.7, max_tokens: int = 150,
+                 use_cache: bool = True, context_budget: int = 3000, summarizer=None,
+                 use_scheduler: bool = True, scheduler: Optional[OpenAIScheduler] = None,
+                 priority: int = 0, fallback=None, near_duplicates: Optional[NearDuplicateIndex] = None):
+        load_env()
+        # The OpenAI client is created on the first request; importing openai is slow
+        self._client = None
+        self.model = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        # Conversations that want fresh sampling every time pass use_cache=False
+        self.response_cache = get_response_cache() if use_cache else None
+        # Rate limits, retries and the circuit breaker are shared by every session
+        self.scheduler = (scheduler or get_scheduler()) if use_scheduler else None
+        self.priority = priority
+        # Answers from the local FAQ while OpenAI is rate limited or down
+        self._fallback = fallback
+        # Rephrasings of a question already answered in the same context skip the API
+        self.near_duplicates = near_duplicates
+        self.session_log = SessionLog(session_snapshot_path(session_id), sync=sync, background=self.background_log)
+        self.history_capacity = history_capacity
+        self.history_max_bytes = history_max_bytes
+        self.context_budget = context_budget
+        self.summarizer = summarizer
         self.load_conversation_context()
         
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = self._create_client()
+        return self._client
+    
+    def _create_client(self):
+        from openai import OpenAI
+        # With a scheduler, retries are its job; the client's own would multiply them
+        return OpenAI(api_key=os.getenv('OPENAI_API_KEY'), max_retries=0 if self.scheduler else 2)
+    
+    @property
+    def fallback(self):
+        if self._fallback is None:
+            from simple_chatbot import SimpleChatbot
+            self._fallback = SimpleChatbot()
+        return self._fallback
+    
+    def _estimated_tokens(self) -> int:
+        """Tokens the next request may use: the prompt plus the completion limit."""
+        return self.context_window.total_tokens + self.max_tokens
+    
+    def _should_degrade(self, error: Exception) -> bool:
+        """Whether to answer locally: the scheduler refused, or retries ran out."""
+        return self.scheduler is not None and (isinstance(error, SchedulerError) or is_retryable(error))
+    
+    def _near_duplicate_scope(self, messages: List[Dict]) -> str:
+        """Sampling settings plus the conversation before the new message (the cache's window)."""
+        system = [m for m in messages[:1] if m['role'] == 'system']
+        prior = messages[len(system):-1][-(NEAR_DUPLICATE_WINDOW - 1):]
+        return scope_key(self.model, self.temperature, self.max_tokens,
+                         [(m['role'], normalize(m['content'])) for m in system + prior])
+    
+    def _near_duplicate_lookup(self, user_input: str, messages: List[Dict]) -> Tuple[Optional[str], Optional[str]]:
+        """Return (earlier answer or None, scope to remember a new answer under)."""
+        if self.near_duplicates is None:
+            return None, None
+        scope = self._near_duplicate_scope(messages)
+        hit = self.near_duplicates.lookup(user_input, scope)
+        return (hit[0] if hit is not None else None), scope
+    
+    def _remember_near_duplicate(self, user_input: str, assistant_response: str, scope: Optional[str]):
+        if scope is not None:
+            self.near_duplicates.add(user_input, assistant_response, scope)
+    
+    def _degraded_response(self, user_input: str) -> str:
+        metrics.fallback('openai', 'degraded')
+        assistant_response = self.fallback.get_response(user_input)
+        self._record('assistant', assistant_response)
+        return assistant_response
+    
     def load_conversation_context(self):
         """Load any existing conversation context."""
-        try:
-            with open('conversation_context.json', 'r') as f:
-                self.conversation_history = json.load(f)
-        except FileNotFoundError:
+        snapshot, tail = self.session_log.load()
+        if snapshot is None:
             # Initialize with a system message
-            self.conversation_history = [
-                {
-                    "role": "system",
-                    "content": """You are a helpful AI assistant designed for customer support. 
-                    Be friendly, professional, and provide accurate information. 
-                    If you don't know something, say so rather than making up an answer."""
-                }
-            ]
+            snapshot = [{"role": "system", "content": SYSTEM_PROMPT}]
+        # Turns the ring buffer drops are archived at the next compaction, which
+        # is when they would otherwise leave the disk
+        self.conversation_history = ConversationHistory.from_dicts(
+            snapshot + tail, capacity=self.history_capacity, max_bytes=self.history_max_bytes,
+            spill_path=self.session_log.archive_path, defer_spill=True
+        )
+        self.context_window = ContextWindow(self.context_budget, summarizer=self.summarizer)
+        self.context_window.pin(self.conversation_history.pinned)
+        self.context_window.extend(self.conversation_history.turns())
     
     def save_conversation_context(self):
-        """Save the conversation context to a file."""
-        with open('conversation_context.json', 'w') as f:
-            json.dump(self.conversation_history, f)
+        """Compact the conversation context into a single snapshot file.
+
+        The snapshot holds only the turns still in the bounded history; older
+        ones are appended to the session log's ``archive_path`` before the log
+        that still holds them is truncated.
+        """
+        self.conversation_history.flush_spill()
+        self.session_log.compact(self.conversation_history.as_messages())
+    
+    def _record(self, role: str, content: str):
+        """Add a message to the history and append it to the session log."""
+        message = self.conversation_history.append(role, content)
+        self.context_window.add(message)
+        self.session_log.append({"role": role, "content": content})
+    
+    def _request_messages(self) -> List[Dict]:
+        """Messages to send: system prompt, summary of older turns, then recent turns."""
+        return self.context_window.messages(self.conversation_history.pinned)
     
     def get_response(self, user_input: str) -> str:
         """Get a response from OpenAI's API."""
         # Add user message to conversation history
-        self.conversation_history.append({"role": "user", "content": user_input})
+        self._record('user', user_input)
         
-        try:
+        messages = self._request_messages()
+        
+        assistant_response, scope = self._near_duplicate_lookup(user_input, messages)
+        if assistant_response is not None:
+            self._record('assistant', assistant_response)
+            return assistant_response
+        
+        def request() -> str:
             # Get response from OpenAI
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=self.conversation_history,
-                temperature=0.7,
-                max_tokens=150
-            )
+            def create():
+                with metrics.stage('openai', 'api'):
+                    return self.client.chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        temperature=self.temperature,
+                        max_tokens=self.max_tokens
+                    )
+            
+            if self.scheduler is not None:
+                response = self.scheduler.submit(create, self._estimated_tokens(), self.priority)
+            else:
+                response = create()
+            metrics.token_usage(self.model, getattr(response, 'usage', None))
             
             # Extract the assistant's response
-            assistant_response = response.choices[0].message.content
+            return response.choices[0].message.content
+        
+        try:
+            with metrics.stage('openai', 'total'):
+                if self.response_cache is not None:
+                    key = self.response_cache.make_key(messages, self.model, self.temperature, self.max_tokens)
+                    assistant_response = self.response_cache.get_or_compute(key, request)
+                else:
+                    assistant_response = request()
             
             # Add assistant's response to conversation history
-            self.conversation_history.append({"role": "assistant", "content": assistant_response})
+            self._record('assistant', assistant_response)
+            self._remember_near_duplicate(user_input, assistant_response, scope)
             
-            # Save the updated conversation context
-            self.save_conversation_context()
+            # Fold the log into the snapshot once it grows long
+            if self.session_log.should_compact():
+                self.save_conversation_context()
             
             return assistant_response
             
         except Exception as e:
+            if self._should_degrade(e):
+                return self._degraded_response(user_input)
+            metrics.fallback('openai', 'error')
             return f"I'm sorry, I encountered an error: {str(e)}"
 
 def main():
+    load_env()
     # Check if API key is set
     if not os.getenv('OPENAI_API_KEY'):
         print("""
@@ -74,6 +213,8 @@ def main():
         return
     
     print("AI Chatbot: Hello! I'm your AI assistant. Type 'quit' to exit.")
+    # Import openai while the user types the first message
+    start_background(ENGINE_TASKS['openai'])
     chatbot = OpenAIChatbot()
     
     try:
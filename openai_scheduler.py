@@ -0,0 +1,381 @@
+"""Admission control, rate limiting and retries in front of OpenAI calls.
+
+Every completion request goes through ``OpenAIScheduler.submit`` (or
+``asubmit`` from asyncio code):
+
+* Token buckets cap requests per minute and tokens per minute. A request
+  reserves its estimated tokens up front; the estimate is corrected from
+  ``response.usage`` once the reply arrives.
+* Waiting requests form a priority queue (lower number first). When it
+  holds ``max_queue`` requests, the lowest-priority request is shed with
+  ``QueueFullError``, whether that is the newcomer or one already queued.
+* 429s, 5xx responses, timeouts and connection errors are retried with
+  full-jitter exponential backoff. When the server sends a ``Retry-After``
+  header, that delay is used instead.
+* A circuit breaker opens after ``failure_threshold`` consecutive failed
+  requests. While it is open, calls fail fast with ``CircuitOpenError``
+  until ``reset_timeout`` passes; then one trial request is let through.
+  Only upstream failures count: a request rejected as the caller's fault
+  (400, 401, 404, 422, ...) neither opens nor closes the circuit.
+
+Callers catch ``SchedulerError`` (and exhausted retries) and fall back to a
+local answer; OpenAIChatbot answers from the FAQ.
+"""
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, TypeVar
+
+T = TypeVar('T')
+
+RETRYABLE_STATUS = frozenset({408, 409, 429, 500, 502, 503, 504})
+_RETRYABLE_ERRORS = ('APITimeoutError', 'APIConnectionError', 'RateLimitError', 'InternalServerError')
+
+
+class SchedulerError(Exception):
+    """The request was not sent upstream."""
+
+
+class QueueFullError(SchedulerError):
+    """Shed by admission control because the queue was full."""
+
+
+class CircuitOpenError(SchedulerError):
+    """Rejected because the circuit breaker is open."""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Rate limits, server errors, timeouts and dropped connections are worth retrying."""
+    status = getattr(error, 'status_code', None)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return isinstance(error, (TimeoutError, ConnectionError)) or type(error).__name__ in _RETRYABLE_ERRORS
+
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """Whether ``error`` says the service is unhealthy rather than the request bad."""
+    status = getattr(error, 'status_code', None)
+    return is_retryable(error) or (status is not None and status >= 500)
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Seconds the server asked us to wait (Retry-After / retry-after-ms), if any."""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000.0
+        if headers.get('retry-after'):
+            return float(headers['retry-after'])
+    except ValueError:  # an HTTP date; fall back to our own backoff
+        return None
+    return None
+
+
+class TokenBucket:
+    """Refills ``rate`` units per minute up to ``capacity`` (one minute's worth by default)."""
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until ``amount`` is available (0.0 if it is now). Not thread-safe."""
+        self._refill(now)
+        # A request bigger than the bucket may go once the bucket is full
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+    def give(self, amount: float):
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class CircuitBreaker:
+    """Closed -> open after consecutive failures -> half-open trial after ``reset_timeout``."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        # When the half-open trial started; a trial that never reports back
+        # (shed, cancelled) expires after another ``reset_timeout``
+        self._trial_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            now = time.monotonic()
+            if state == 'half-open' and (self._trial_at is None or now - self._trial_at >= self.reset_timeout):
+                self._trial_at = now
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_at = None
+
+    def record_neutral(self):
+        """The request failed on its own merits; free the half-open trial slot, if it held it."""
+        with self._lock:
+            self._trial_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial_at = None
+
+
+class _Ticket:
+    __slots__ = ('priority', 'seq', 'tokens', 'shed')
+
+    def __init__(self, priority: int, seq: int, tokens: int):
+        self.priority = priority
+        self.seq = seq
+        self.tokens = tokens
+        self.shed = False
+
+    def __lt__(self, other: '_Ticket') -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class OpenAIScheduler:
+    def __init__(self, rpm: float = 3500, tpm: float = 90000, max_queue: int = 256,
+                 max_concurrency: int = 16, max_retries: int = 4, base_delay: float = 0.5,
+                 max_delay: float = 20.0, queue_timeout: float = 30.0,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_queue = max_queue
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.queue_timeout = queue_timeout
+        self.breaker = breaker or CircuitBreaker()
+        self._queue: List[_Ticket] = []
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self.counters: Dict[str, int] = {
+            'completed': 0, 'failed': 0, 'retries': 0, 'rate_limited': 0, 'shed': 0, 'rejected_open': 0,
+        }
+
+    # -- admission --------------------------------------------------------
+
+    def _check_breaker(self):
+        # Once per request, not per attempt: retries belong to the request the breaker let through
+        if not self.breaker.allow():
+            self.counters['rejected_open'] += 1
+            raise CircuitOpenError("OpenAI circuit breaker is open")
+
+    def _enqueue(self, priority: int, tokens: int) -> _Ticket:
+        with self._cond:
+            ticket = _Ticket(priority, next(self._seq), tokens)
+            if len(self._queue) >= self.max_queue:
+                worst = max(self._queue)
+                self.counters['shed'] += 1
+                if not ticket < worst:
+                    raise QueueFullError("OpenAI request queue is full")
+                # The newcomer outranks the worst queued request, which is shed instead
+                worst.shed = True
+                self._queue.remove(worst)
+                heapq.heapify(self._queue)
+                self._cond.notify_all()
+            heapq.heappush(self._queue, ticket)
+            return ticket
+
+    def _poll(self, ticket: _Ticket) -> Optional[float]:
+        """None once the ticket is admitted, else how long to wait before asking again."""
+        with self._cond:
+            if ticket.shed:
+                raise QueueFullError("Shed from the OpenAI request queue by a higher-priority request")
+            if self._queue[0] is not ticket or self._in_flight >= self.max_concurrency:
+                return 1.0
+            now = time.monotonic()
+            wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(ticket.tokens, now))
+            if wait > 0:
+                return wait
+            self.requests.take(1)
+            self.tokens.take(ticket.tokens)
+            heapq.heappop(self._queue)
+            self._in_flight += 1
+            self._cond.notify_all()
+            return None
+
+    def _leave(self, ticket: _Ticket):
+        with self._cond:
+            if ticket in self._queue:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                self._cond.notify_all()
+
+    def _admit(self, ticket: _Ticket, deadline: float):
+        try:
+            while True:
+                wait = self._poll(ticket)
+                if wait is None:
+                    return
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.counters['shed'] += 1
+                    raise QueueFullError("Timed out waiting in the OpenAI request queue")
+                with self._cond:
+                    self._cond.wait(min(wait, remaining))
+        except BaseException:
+            self._leave(ticket)
+            raise
+
+    def _release(self, ticket: _Ticket, result):
+        with self._cond:
+            self._in_flight -= 1
+            usage = getattr(result, 'usage', None)
+            actual = getattr(usage, 'total_tokens', None)
+            if actual is not None and actual < ticket.tokens:
+                # Give back what the estimate over-reserved
+                self.tokens.give(ticket.tokens - actual)
+            self._cond.notify_all()
+
+    # -- retries ----------------------------------------------------------
+
+    def backoff(self, attempt: int, error: BaseException) -> float:
+        """Delay before retry ``attempt`` (0-based): Retry-After if given, else full jitter."""
+        if getattr(error, 'status_code', None) == 429:
+            self.counters['rate_limited'] += 1
+        requested = retry_after(error)
+        if requested is not None:
+            return min(self.max_delay, requested) + random.uniform(0, self.base_delay / 4)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _finish(self, error: Optional[BaseException]):
+        if error is None:
+            self.counters['completed'] += 1
+            self.breaker.record_success()
+        else:
+            self.counters['failed'] += 1
+            if is_upstream_failure(error):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_neutral()
+
+    def submit(self, call: Callable[[], T], tokens: int = 0, priority: int = 0) -> T:
+        """Run ``call`` once admitted, retrying transient failures; blocks the calling thread."""
+        self._check_breaker()
+        for attempt in range(self.max_retries + 1):
+            ticket = self._enqueue(priority, tokens)
+            self._admit(ticket, time.monotonic() + self.queue_timeout)
+            result = None
+            try:
+                result = call()
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_retries:
+                    self._finish(e)
+                    raise
+                self.counters['retries'] += 1
+                delay = self.backoff(attempt, e)
+            else:
+                self._finish(None)
+                return result
+            finally:
+                self._release(ticket, result)
+            time.sleep(delay)
+
+    async def asubmit(self, call: Callable[[], Awaitable[T]], tokens: int = 0, priority: int = 0) -> T:
+        """``submit`` for asyncio: waits with ``asyncio.sleep`` instead of blocking the loop."""
+        import asyncio
+        self._check_breaker()
+        for attempt in range(self.max_retries + 1):
+            ticket = self._enqueue(priority, tokens)
+            deadline = time.monotonic() + self.queue_timeout
+            try:
+                while True:
+                    wait = self._poll(ticket)
+                    if wait is None:
+                        break
+                    if time.monotonic() >= deadline:
+                        self.counters['shed'] += 1
+                        raise QueueFullError("Timed out waiting in the OpenAI request queue")
+                    # Woken by polling: a Condition cannot be awaited
+                    await asyncio.sleep(min(wait, 0.05))
+            except BaseException:
+                self._leave(ticket)
+                raise
+            result = None
+            try:
+                result = await call()
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_retries:
+                    self._finish(e)
+                    raise
+                self.counters['retries'] += 1
+                delay = self.backoff(attempt, e)
+            else:
+                self._finish(None)
+                return result
+            finally:
+                self._release(ticket, result)
+            await asyncio.sleep(delay)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            queued = len(self._queue)
+            in_flight = self._in_flight
+        return {
+            **self.counters,
+            'queued': queued,
+            'in_flight': in_flight,
+            'breaker': self.breaker.state,
+        }
+
+
+_shared_scheduler: Optional[OpenAIScheduler] = None
+_shared_lock = threading.Lock()
+
+
+def get_scheduler() -> OpenAIScheduler:
+    """Return the process-wide scheduler.
+
+    Limits come from ``OPENAI_RPM``, ``OPENAI_TPM`` and ``OPENAI_MAX_QUEUE``
+    (defaults: 3500 requests/min, 90000 tokens/min, 256 queued requests).
+    """
+    global _shared_scheduler
+    if _shared_scheduler is None:
+        with _shared_lock:
+            if _shared_scheduler is None:
+                _shared_scheduler = OpenAIScheduler(
+                    rpm=float(os.getenv('OPENAI_RPM', 3500)),
+                    tpm=float(os.getenv('OPENAI_TPM', 90000)),
+                    max_queue=int(os.getenv('OPENAI_MAX_QUEUE', 256)),
+                )
+    return _shared_scheduler
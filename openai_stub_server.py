@@ -0,0 +1,191 @@
+"""Local stand-in for the OpenAI chat completions endpoint.
+
+Answers ``POST /v1/chat/completions`` with a canned reply (an echo of the
+last user message), either as one JSON body or as a ``stream=true``
+server-sent-event stream, after a configurable delay. Point a bot at it with
+``OPENAI_BASE_URL=http://127.0.0.1:8089/v1``.
+
+To exercise rate limiting and retries, it can answer 429 with a
+``Retry-After`` header: the first ``--fail-first`` requests, and a random
+``--error-rate`` fraction of the rest.
+
+Usage: python openai_stub_server.py [--port 8089] [--latency 0.2] [--token-delay 0.01]
+                                    [--error-rate 0.2] [--fail-first 3] [--retry-after 1]
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+
+class StubConfig:
+    """Behaviour knobs shared by every request the stub serves."""
+
+    def __init__(self, latency: float = 0.0, token_delay: float = 0.0, reply: str = '',
+                 error_rate: float = 0.0, fail_first: int = 0, retry_after: float = 1.0,
+                 seed: Optional[int] = None):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.reply = reply
+        self.error_rate = error_rate
+        self.fail_first = fail_first
+        self.retry_after = retry_after
+        self.requests = 0
+        self.rate_limited = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def next_request(self) -> int:
+        with self._lock:
+            self.requests += 1
+            return self.requests
+
+    def should_rate_limit(self, number: int) -> bool:
+        with self._lock:
+            limited = number <= self.fail_first or self._random.random() < self.error_rate
+            self.rate_limited += limited
+            return limited
+
+
+def _reply_for(messages: List[Dict], config: StubConfig) -> str:
+    if config.reply:
+        return config.reply
+    for message in reversed(messages):
+        if message.get('role') == 'user':
+            return f"You said: {message.get('content', '')}"
+    return "Hello from the stub server."
+
+
+def _usage(messages: List[Dict], reply: str) -> Dict:
+    prompt_tokens = sum(len(str(m.get('content', '')).split()) for m in messages)
+    completion_tokens = len(reply.split())
+    return {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    config = StubConfig()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: Dict, headers: Tuple = ()):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.flush()
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self._send_json(400, {'error': {'message': 'Invalid JSON body', 'type': 'invalid_request_error'}})
+            return
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': f'Unknown path {self.path}', 'type': 'invalid_request_error'}})
+            return
+
+        config = self.config
+        number = config.next_request()
+        messages = body.get('messages', [])
+        reply = _reply_for(messages, config)
+        model = body.get('model', 'stub-model')
+        completion_id = f'chatcmpl-stub-{number}'
+        created = int(time.time())
+        time.sleep(config.latency)
+
+        if config.should_rate_limit(number):
+            self._send_json(429, {'error': {'message': 'Rate limit reached (stub)', 'type': 'requests',
+                                            'code': 'rate_limit_exceeded'}},
+                            headers=(('Retry-After', f'{config.retry_after:g}'),))
+            return
+
+        if not body.get('stream'):
+            self._send_json(200, {
+                'id': completion_id, 'object': 'chat.completion', 'created': created, 'model': model,
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': reply}}],
+                'usage': _usage(messages, reply),
+            })
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        tokens = reply.split(' ')
+        try:
+            for i, token in enumerate(tokens):
+                delta = {'role': 'assistant', 'content': ''} if i == 0 else {}
+                delta['content'] = token if i == 0 else ' ' + token
+                chunk = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': created,
+                         'model': model, 'choices': [{'index': 0, 'delta': delta, 'finish_reason': None}]}
+                self._write_chunk(b'data: ' + json.dumps(chunk).encode('utf-8') + b'\n\n')
+                time.sleep(config.token_delay)
+            final = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': created,
+                     'model': model, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]}
+            self._write_chunk(b'data: ' + json.dumps(final).encode('utf-8') + b'\n\n')
+            self._write_chunk(b'data: [DONE]\n\n')
+            self._write_chunk(b'')
+        except (BrokenPipeError, ConnectionResetError):
+            # The client cancelled the stream
+            self.close_connection = True
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 512
+
+    def handle_error(self, request, client_address):
+        # Clients that time out or cancel simply hang up; that is not an error here
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+
+def serve_in_thread(host: str = '127.0.0.1', port: int = 0, **options) -> Tuple[ThreadingHTTPServer, str]:
+    """Start a stub server on a daemon thread and return it with its ``/v1`` base URL."""
+    handler = type('ConfiguredStubHandler', (StubHandler,), {'config': StubConfig(**options)})
+    server = StubServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://{host}:{server.server_address[1]}/v1'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds before the first byte')
+    parser.add_argument('--token-delay', type=float, default=0.0, help='seconds between streamed tokens')
+    parser.add_argument('--reply', default='', help='fixed reply instead of echoing the user')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with 429')
+    parser.add_argument('--fail-first', type=int, default=0, help='answer the first N requests with 429')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='Retry-After seconds sent with a 429')
+    args = parser.parse_args()
+
+    StubHandler.config = StubConfig(args.latency, args.token_delay, args.reply,
+                                    args.error_rate, args.fail_first, args.retry_after)
+    server = StubServer((args.host, args.port), StubHandler)
+    print(f"Stub OpenAI server on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+import atexit
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+def _normalize(text: str) -> str:
+    return ' '.join(text.lower().split())
+
+
+class _Flight:
+    """A single in-progress upstream call that concurrent callers wait on."""
+
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[str] = None
+        self.error: Optional[BaseException] = None
+
+
+class ResponseCache:
+    """LRU + TTL cache of completions with single-flight request coalescing.
+
+    Keys hash the system prompt and the last ``window`` messages (normalized
+    for case and whitespace) together with the sampling parameters, so
+    conversations that open with the same question share an answer. While
+    a key is being computed, identical requests wait for that one upstream
+    call instead of issuing their own. Failures are never cached.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600.0, window: int = 4,
+                 persist_path: Optional[str] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.window = window
+        self.persist_path = persist_path
+        self._entries: 'OrderedDict[str, Tuple[float, str]]' = OrderedDict()
+        self._inflight: Dict[str, _Flight] = {}
+        self._ainflight: Dict[str, 'asyncio.Future'] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+        if persist_path:
+            self.load()
+
+    def make_key(self, messages: List[Dict], model: str, temperature: float, max_tokens: int) -> str:
+        system = [m for m in messages[:1] if m['role'] == 'system']
+        recent = messages[len(system):][-self.window:]
+        payload = json.dumps([
+            model, temperature, max_tokens,
+            [(m['role'], _normalize(m['content'])) for m in system + recent],
+        ])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key: str, compute: Callable[[], str]) -> str:
+        """Return the cached value, or compute it once for all concurrent callers."""
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = compute()
+            self.set(key, flight.result)
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            flight.done.set()
+
+    async def aget_or_compute(self, key: str, compute: Callable[[], Awaitable[str]]) -> str:
+        """Async counterpart of get_or_compute for callers on one event loop."""
+        # Only async callers pay for importing asyncio
+        import asyncio
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        future = self._ainflight.get(key)
+        while future is not None:
+            self.coalesced += 1
+            try:
+                # Shield so one waiter's cancellation doesn't cancel the shared call
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The leader was cancelled (e.g. its own timeout); take over
+                future = self._ainflight.get(key)
+
+        future = asyncio.get_running_loop().create_future()
+        self._ainflight[key] = future
+        try:
+            value = await compute()
+            self.set(key, value)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so an unobserved failure isn't logged at shutdown
+            future.exception()
+            raise
+        finally:
+            del self._ainflight[key]
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss/coalescing counters and the current size."""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+        }
+
+    def load(self):
+        """Load unexpired entries from ``persist_path``."""
+        try:
+            with open(self.persist_path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return
+        except ValueError as e:
+            logging.warning(f"Ignoring unreadable response cache {self.persist_path}: {e}")
+            return
+        now = time.time()
+        with self._lock:
+            for key, expires_at, value in entries[-self.maxsize:]:
+                if expires_at >= now:
+                    self._entries[key] = (expires_at, value)
+
+    def save(self):
+        """Write the cache to ``persist_path`` atomically."""
+        if not self.persist_path:
+            return
+        with self._lock:
+            entries = [[key, expires_at, value] for key, (expires_at, value) in self._entries.items()]
+        tmp_path = f'{self.persist_path}.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.persist_path)
+        except OSError as e:
+            logging.error(f"Error saving response cache: {e}")
+
+
+_shared_cache: Optional[ResponseCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Return the process-wide response cache.
+
+    Set ``CHATBOT_RESPONSE_CACHE`` to a file path to persist it across runs.
+    """
+    global _shared_cache
+    if _shared_cache is None:
+        with _shared_lock:
+            if _shared_cache is None:
+                cache = ResponseCache(persist_path=os.getenv('CHATBOT_RESPONSE_CACHE') or None)
+                if cache.persist_path:
+                    atexit.register(cache.save)
+                _shared_cache = cache
+    return _shared_cache
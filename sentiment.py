@@ -0,0 +1,160 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from faq_matcher import Automaton
+
+_NON_WORD_RE = re.compile(r"[^a-z0-9']+")
+
+# Compact polarity lexicon for the offline scorer, roughly on TextBlob's scale
+DEFAULT_LEXICON = {
+    'good': 0.7, 'great': 0.8, 'excellent': 1.0, 'awesome': 1.0, 'amazing': 0.6,
+    'happy': 0.8, 'love': 0.5, 'nice': 0.6, 'perfect': 1.0, 'wonderful': 1.0,
+    'thanks': 0.2, 'thank you': 0.2, 'helpful': 0.5, 'fine': 0.4, 'glad': 0.5,
+    'bad': -0.7, 'terrible': -1.0, 'awful': -1.0, 'horrible': -1.0, 'worst': -1.0,
+    'angry': -0.5, 'frustrated': -0.7, 'frustrating': -0.7, 'annoyed': -0.6,
+    'unhappy': -0.6, 'disappointed': -0.75, 'useless': -0.5, 'broken': -0.4,
+    'hate': -0.8, 'poor': -0.4, 'wrong': -0.5, 'slow': -0.3, 'stupid': -0.8,
+}
+
+
+def normalize(text: str) -> str:
+    """Canonical form used as the cache key: whitespace collapsed.
+
+    Case is kept: TextBlob's emoticon polarity is case-sensitive (":D" is
+    positive, ":d" is not), so lowercasing could change the score.
+    """
+    return ' '.join(text.split())
+
+
+class TextBlobScorer:
+    """Polarity from TextBlob's pattern analyzer (imported on first use)."""
+
+    def __init__(self):
+        self._textblob = None
+
+    def score_batch(self, texts: Sequence[str]) -> List[float]:
+        if self._textblob is None:
+            from textblob import TextBlob
+            self._textblob = TextBlob
+        return [self._textblob(text).sentiment.polarity for text in texts]
+
+
+class LexiconScorer:
+    """Score text against a weighted lexicon in one pass per message.
+
+    Every lexicon entry is compiled into a single automaton, so a message
+    is scanned once no matter how large the lexicon is. With ``average``
+    the score is the mean weight of all hits (a polarity in [-1, 1]);
+    otherwise it is their sum. ``whole_words`` restricts hits to complete
+    words; without it entries match as plain substrings, like ``str.count``.
+    """
+
+    def __init__(self, lexicon: Dict[str, float], average: bool = True, whole_words: bool = True):
+        self.average = average
+        self.whole_words = whole_words
+        entries = ((f' {word} ' if whole_words else word, weight)
+                   for word, weight in lexicon.items())
+        self._automaton = Automaton(entries)
+
+    def score(self, text: str) -> float:
+        text = text.lower()
+        if self.whole_words:
+            text = ' ' + _NON_WORD_RE.sub(' ', text) + ' '
+        total = 0.0
+        hits = 0
+        for weight in self._automaton.iter_matches(text):
+            total += weight
+            hits += 1
+        if not self.average:
+            return total
+        return max(-1.0, min(1.0, total / hits)) if hits else 0.0
+
+    def score_batch(self, texts: Sequence[str]) -> List[float]:
+        return [self.score(text) for text in texts]
+
+
+class SentimentAnalyzer:
+    """LRU-memoized front end for a sentiment scorer.
+
+    Results are cached on the normalized text, bounded to ``maxsize``
+    entries. Batches are de-duplicated and only the cache misses are sent
+    to the scorer, in a single call. The scorer always sees the caller's
+    text, never the cache key.
+    """
+
+    def __init__(self, scorer, maxsize: int = 4096):
+        self.scorer = scorer
+        self.maxsize = maxsize
+        self._cache: 'OrderedDict[str, float]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def analyze(self, text: str) -> float:
+        return self.analyze_batch([text])[0]
+
+    def analyze_batch(self, texts: Iterable[str]) -> List[float]:
+        texts = list(texts)
+        keys = [normalize(text) for text in texts]
+        scores: Dict[str, float] = {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    scores[key] = self._cache[key]
+                    self.hits += 1
+                else:
+                    self.misses += 1
+
+        # The first text seen for each missing key is the one scored
+        originals = dict(zip(reversed(keys), reversed(texts)))
+        missing = [key for key in dict.fromkeys(keys) if key not in scores]
+        if missing:
+            computed = self.scorer.score_batch([originals[key] for key in missing])
+            scores.update(zip(missing, computed))
+            with self._lock:
+                for key, value in zip(missing, computed):
+                    self._cache[key] = value
+                    self._cache.move_to_end(key)
+                while len(self._cache) > self.maxsize:
+                    self._cache.popitem(last=False)
+                    self.evictions += 1
+        return [scores[key] for key in keys]
+
+    def cache_info(self) -> Dict[str, int]:
+        """Return hit/miss/eviction counters and the current cache size."""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._cache),
+            'maxsize': self.maxsize,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+_analyzers: Dict[str, SentimentAnalyzer] = {}
+_analyzers_lock = threading.Lock()
+
+
+def get_analyzer(backend: str = 'textblob') -> SentimentAnalyzer:
+    """Return the process-wide analyzer for ``backend`` ('textblob' or 'lexicon')."""
+    analyzer: Optional[SentimentAnalyzer] = _analyzers.get(backend)
+    if analyzer is None:
+        with _analyzers_lock:
+            analyzer = _analyzers.get(backend)
+            if analyzer is None:
+                if backend == 'textblob':
+                    scorer = TextBlobScorer()
+                elif backend == 'lexicon':
+                    scorer = LexiconScorer(DEFAULT_LEXICON)
+                else:
+                    raise ValueError(f"Unknown sentiment backend: {backend}")
+                analyzer = _analyzers[backend] = SentimentAnalyzer(scorer)
+    return analyzer
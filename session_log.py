@@ -0,0 +1,239 @@
+import heapq
+import itertools
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+SYNC_POLICIES = ('always', 'group', 'never')
+
+
+def session_snapshot_path(session_id: Optional[str], directory: str = 'sessions',
+                          default: str = 'conversation_context.json') -> str:
+    """Return the snapshot path for a session, one file per session id."""
+    if session_id is None:
+        return default
+    safe_id = re.sub(r'[^A-Za-z0-9_.-]', '_', session_id)
+    return os.path.join(directory, f'{safe_id}.json')
+
+
+class _Flusher:
+    """One daemon thread that writes SessionLog records once they are due.
+
+    Shared by every SessionLog in the process, so a session that goes quiet
+    is still synced ``group_interval`` seconds after its last record, and
+    logs opened with ``background`` never write on the caller's thread.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._heap: List[Tuple[float, int, 'SessionLog']] = []
+        self._counter = itertools.count()
+        self._pid: Optional[int] = None
+
+    def schedule(self, log: 'SessionLog', deadline: float):
+        with self._cond:
+            # Started lazily, and again in a forked child, which inherits the heap but not the thread
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._heap = []
+                threading.Thread(target=self._run, name='session-log-flusher', daemon=True).start()
+            if log._due is not None and log._due <= deadline:
+                return
+            log._due = deadline
+            heapq.heappush(self._heap, (deadline, next(self._counter), log))
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    if self._heap and self._heap[0][0] <= now:
+                        break
+                    self._cond.wait(self._heap[0][0] - now if self._heap else None)
+                deadline, _, log = heapq.heappop(self._heap)
+                if log._due != deadline:
+                    # Superseded by an earlier deadline that already ran
+                    continue
+                log._due = None
+            try:
+                log._flush_due()
+            except OSError as e:
+                logging.error(f"Error flushing {log.log_path}: {e}")
+
+
+_flusher = _Flusher()
+
+
+class SessionLog:
+    """Append-only write-ahead log of conversation messages plus a compacted snapshot.
+
+    Each message is appended to ``<snapshot>l`` (e.g. ``conversation_context.jsonl``)
+    as one JSON line tagged with a sequence number, so a turn costs O(1) I/O
+    instead of rewriting the whole conversation. ``compact`` atomically writes
+    the full conversation to the snapshot and truncates the log; recovery loads
+    the snapshot and replays only the log records newer than it. Callers that
+    compact a bounded window append what fell out of it to ``archive_path``
+    (e.g. ``conversation_context.archive.jsonl``) first.
+
+    ``sync`` controls durability: 'always' fsyncs every record, 'group' writes
+    and fsyncs once per ``group_size`` records or ``group_interval`` seconds
+    (a shared background thread syncs records left waiting when the session
+    goes quiet), and 'never' leaves flushing to the OS. With ``background``
+    even due records are handed to that thread, so ``append`` never touches
+    the disk; asyncio callers use this to keep writes off the event loop.
+    """
+
+    def __init__(self, snapshot_path: str = 'conversation_context.json', sync: str = 'group',
+                 group_size: int = 8, group_interval: float = 1.0, compact_every: int = 500,
+                 background: bool = False):
+        if sync not in SYNC_POLICIES:
+            raise ValueError(f"Unknown sync policy: {sync}")
+        self.snapshot_path = snapshot_path
+        self.log_path = snapshot_path + 'l' if snapshot_path.endswith('.json') else snapshot_path + '.jsonl'
+        base = snapshot_path[:-len('.json')] if snapshot_path.endswith('.json') else snapshot_path
+        self.archive_path = base + '.archive.jsonl'
+        self.sync = sync
+        self.group_size = group_size
+        self.group_interval = group_interval
+        self.compact_every = compact_every
+        self.background = background
+
+        self._seq = 0
+        self._snapshot_seq = 0
+        self._pending: List[str] = []
+        self._last_sync = time.monotonic()
+        self._file = None
+        self._lock = threading.Lock()
+        self._io_lock = threading.RLock()
+        # When the background flusher will sync the held-back records (guarded by the flusher)
+        self._due: Optional[float] = None
+
+    def load(self) -> Tuple[Optional[List[Dict]], List[Dict]]:
+        """Recover the conversation as (snapshot messages or None, replayed log tail)."""
+        snapshot = None
+        try:
+            with open(self.snapshot_path, 'r') as f:
+                data = json.load(f)
+            if isinstance(data, list):
+                # Plain list written before the log existed
+                snapshot = data
+            else:
+                snapshot = data['messages']
+                self._snapshot_seq = data.get('seq', 0)
+        except FileNotFoundError:
+            pass
+        self._seq = self._snapshot_seq
+        return snapshot, self._replay()
+
+    def _replay(self) -> List[Dict]:
+        tail = []
+        good_offset = 0
+        try:
+            with open(self.log_path, 'rb') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A torn write from a crash; everything after it is discarded
+                        logging.warning(f"Truncating damaged record in {self.log_path}")
+                        break
+                    good_offset += len(line)
+                    seq = record.pop('seq', 0)
+                    if seq > self._snapshot_seq:
+                        tail.append(record)
+                        self._seq = max(self._seq, seq)
+                else:
+                    return tail
+            with open(self.log_path, 'r+b') as f:
+                f.truncate(good_offset)
+        except FileNotFoundError:
+            pass
+        return tail
+
+    def append(self, message: Dict):
+        """Append one message to the log, syncing according to the policy.
+
+        With ``background`` the record is only queued here; the flusher
+        thread writes it (immediately when it is due under the policy).
+        """
+        with self._lock:
+            self._seq += 1
+            self._pending.append(json.dumps({'seq': self._seq, **message}) + '\n')
+            due = (self.sync != 'group' or len(self._pending) >= self.group_size
+                   or time.monotonic() - self._last_sync >= self.group_interval)
+            deadline = time.monotonic() if due else self._last_sync + self.group_interval
+        if due and not self.background:
+            self._write_pending(fsync=self.sync != 'never')
+        else:
+            _flusher.schedule(self, deadline)
+
+    def _write_pending(self, fsync: bool):
+        # File I/O happens under _io_lock only, so appends never wait for an fsync
+        with self._io_lock:
+            with self._lock:
+                records, self._pending = self._pending, []
+            self._write_records(records, fsync)
+
+    def _write_records(self, records: List[str], fsync: bool):
+        if not records:
+            return
+        if self._file is None:
+            directory = os.path.dirname(self.log_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.log_path, 'a', encoding='utf-8')
+        self._file.write(''.join(records))
+        self._file.flush()
+        if fsync:
+            os.fsync(self._file.fileno())
+        self._last_sync = time.monotonic()
+
+    def _flush_due(self):
+        """Called by the flusher thread when held-back records are due."""
+        self._write_pending(fsync=self.sync != 'never')
+
+    def flush(self):
+        """Write and fsync any records held back by group commit or queued for the background writer."""
+        self._write_pending(fsync=True)
+
+    def should_compact(self) -> bool:
+        return self._seq - self._snapshot_seq >= self.compact_every
+
+    def compact(self, messages: List[Dict]):
+        """Atomically replace the snapshot with ``messages`` and truncate the log."""
+        with self._io_lock:
+            # Records appended from here on stay queued for the truncated log
+            with self._lock:
+                seq = self._seq
+                records, self._pending = self._pending, []
+            self._write_records(records, fsync=self.sync != 'never')
+            directory = os.path.dirname(self.snapshot_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f'{self.snapshot_path}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump({'seq': seq, 'messages': messages}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+            self._snapshot_seq = seq
+
+            # Records up to seq are now in the snapshot; if we crash
+            # before truncating, replay skips them by sequence number.
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            with open(self.log_path, 'w'):
+                pass
+
+    def close(self):
+        with self._io_lock:
+            self._write_pending(fsync=self.sync != 'never')
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -1,92 +1,167 @@
-import json
 import random
-from datetime import datetime
-from typing import Dict, List
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 import os
+from conversation_history import ConversationHistory
+from kb_registry import FAQ_PATH, FAQMatch, KnowledgeBase, get_knowledge_base, prefetch_knowledge_base
+from metrics import metrics
+from near_duplicate import NearDuplicateIndex, cached_faq_lookup, cached_faq_lookup_batch
+from sentiment import LexiconScorer
+from turn_log import turn_log
+from warmup import ENGINE_TASKS, start_background
+
+DEFAULT_FAQ = {
+    "greetings": {
+        "responses": ["Hello! How can I assist you today?", "Hi there! What can I help you with?"]
+    },
+    "goodbye": {
+        "responses": ["Goodbye! Have a great day!", "Thank you for chatting with us. Goodbye!"]
+    },
+    "help": {
+        "responses": ["I can help you with general inquiries, product information, and more. What would you like to know?"]
+    }
+}
+
+POSITIVE_WORDS = ['good', 'great', 'excellent', 'happy', 'thanks', 'thank you', 'awesome']
+NEGATIVE_WORDS = ['bad', 'terrible', 'awful', 'angry', 'frustrated', 'unhappy']
+
+# Net count of positive minus negative words, matched as substrings
+_keyword_sentiment = LexiconScorer(
+    {**{word: 1 for word in POSITIVE_WORDS}, **{word: -1 for word in NEGATIVE_WORDS}},
+    average=False, whole_words=False
+)
+
+# Default for _check_faq: look the match up rather than take one from the caller
+_LOOKUP = object()
 
 class SimpleChatbot:
-    def __init__(self):
-        self.conversation_history: List[Dict] = []
-        self.faq = self._load_faq()
+    def __init__(self, fuzzy_min_score: float = 3.0, faq_path: str = FAQ_PATH,
+                 history_capacity: int = 1000, history_max_bytes: Optional[int] = 1 << 20,
+                 near_duplicates: Optional[NearDuplicateIndex] = None):
+        self.conversation_history = ConversationHistory(capacity=history_capacity, max_bytes=history_max_bytes)
+        self.faq_path = faq_path
+        self.fuzzy_min_score = fuzzy_min_score
+        # Rephrasings of earlier questions reuse their FAQ match instead of rescanning
+        self.near_duplicates = near_duplicates
+        # Compiled off the critical path; the first reply waits for it if needed
+        prefetch_knowledge_base(self.faq_path, DEFAULT_FAQ)
         self.user_context = {}
     
-    def _load_faq(self) -> Dict:
-        """Load FAQ knowledge base from JSON file."""
-        try:
-            with open('faq_knowledge_base.json', 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except FileNotFoundError:
-            print("FAQ knowledge base not found. Using default FAQs.")
-            return {
-                "greetings": {
-                    "responses": ["Hello! How can I assist you today?", "Hi there! What can I help you with?"]
-                },
-                "goodbye": {
-                    "responses": ["Goodbye! Have a great day!", "Thank you for chatting with us. Goodbye!"]
-                },
-                "help": {
-                    "responses": ["I can help you with general inquiries, product information, and more. What would you like to know?"]
-                }
-            }
+    def _load_faq(self) -> KnowledgeBase:
+        """Get the shared, precompiled FAQ knowledge base (reloaded when the file changes)."""
+        return get_knowledge_base(self.faq_path, DEFAULT_FAQ)
+    
+    @property
+    def faq(self) -> Dict:
+        return self._load_faq().faq
     
     def analyze_sentiment(self, text: str) -> int:
         """Simple sentiment analysis based on keywords."""
-        positive_words = ['good', 'great', 'excellent', 'happy', 'thanks', 'thank you', 'awesome']
-        negative_words = ['bad', 'terrible', 'awful', 'angry', 'frustrated', 'unhappy']
-        
-        text_lower = text.lower()
-        positive_count = sum(text_lower.count(word) for word in positive_words)
-        negative_count = sum(text_lower.count(word) for word in negative_words)
+        score = _keyword_sentiment.score(text)
         
-        if positive_count > negative_count:
+        if score > 0:
             return 1  # Positive
-        elif negative_count > positive_count:
+        elif score < 0:
             return -1  # Negative
         return 0  # Neutral
     
     def get_response(self, user_input: str) -> str:
         """Generate a response to user input."""
-        # Add user input to conversation history
-        self.conversation_history.append({
-            'role': 'user',
-            'content': user_input,
-            'timestamp': datetime.now().isoformat()
-        })
-        
-        # Analyze sentiment
-        sentiment = self.analyze_sentiment(user_input)
-        
-        # Check for FAQ matches
-        response = self._check_faq(user_input)
-        if response:
-            return self._format_response(response, sentiment)
-        
-        # Handle fallback for unclear queries
-        if self._is_unclear_query(user_input):
-            return self._handle_unclear_query()
-        
-        # Default response if no FAQ match
-        return self._generate_default_response(sentiment)
+        return self._respond(user_input, _LOOKUP)
     
-    def _check_faq(self, user_input: str) -> str:
-        """Check if user input matches any FAQ questions."""
-        user_input = user_input.lower()
-        
-        # Check for direct matches
-        for intent, data in self.faq.items():
-            if 'patterns' in data:
-                for pattern in data['patterns']:
-                    if pattern.lower() in user_input:
-                        return random.choice(data['responses'])
+    def respond_to_match(self, match: Optional[FAQMatch], user_input: str,
+                         kb: Optional[KnowledgeBase] = None) -> str:
+        """Generate a response to input whose FAQ match (or None) the caller already looked up.
+
+        Pass the ``kb`` snapshot the match was found in, so a hot reload in
+        between cannot answer it from a knowledge base without that intent.
+        """
+        return self._respond(user_input, match, kb)
+    
+    def _respond(self, user_input: str, match, kb: Optional[KnowledgeBase] = None) -> str:
+        with metrics.stage('simple', 'total'):
+            # Add user input to conversation history
+            self.conversation_history.append('user', user_input)
+            
+            # Analyze sentiment
+            with metrics.stage('simple', 'sentiment'):
+                sentiment = self.analyze_sentiment(user_input)
+            
+            # Check for FAQ matches
+            with metrics.stage('simple', 'faq'):
+                match, response = self._check_faq(user_input, match, kb)
+            if response:
+                turn_log.record('simple', user_input, 'faq', match, sentiment)
+                with metrics.stage('simple', 'format'):
+                    return self._format_response(response, sentiment)
+            
+            # Handle fallback for unclear queries
+            with metrics.stage('simple', 'unclear'):
+                unclear = self._is_unclear_query(user_input)
+            if unclear:
+                metrics.fallback('simple', 'unclear')
+                turn_log.record('simple', user_input, 'unclear', sentiment=sentiment)
+                return self._handle_unclear_query()
+            
+            # Default response if no FAQ match
+            metrics.fallback('simple', 'default')
+            turn_log.record('simple', user_input, 'default', sentiment=sentiment)
+            return self._generate_default_response(sentiment)
+    
+    def get_responses(self, messages: Iterable[str], workers: int = 1,
+                      chunk_size: int = 256) -> Iterator[str]:
+        """Answer many independent messages, yielding replies in input order.
+
+        Conversation history is left untouched. With ``workers`` > 1 the
+        chunks are answered in a process pool (see batch_inference.py).
+        """
+        from batch_inference import respond_all
+        return respond_all(self, messages, workers, chunk_size)
+    
+    def _respond_batch(self, messages: List[str]) -> List[str]:
+        """Answer one chunk: FAQ matching runs once for the whole chunk."""
+        with metrics.stage('simple', 'batch'):
+            kb = self._load_faq()
+            matches = cached_faq_lookup_batch(self.near_duplicates, kb, messages, self.fuzzy_min_score)
         
-        # Check for keyword matches
-        for intent, data in self.faq.items():
-            if 'keywords' in data:
-                for keyword in data['keywords']:
-                    if keyword in user_input:
-                        return random.choice(data['responses'])
+        responses = []
+        for user_input, match in zip(messages, matches):
+            sentiment = self.analyze_sentiment(user_input)
+            metrics.faq_lookup('simple', match)
+            if match is not None:
+                turn_log.record('simple', user_input, 'faq', match, sentiment)
+                response = random.choice(kb.faq[match.intent]['responses'])
+                responses.append(self._format_response(response, sentiment))
+            elif self._is_unclear_query(user_input):
+                metrics.fallback('simple', 'unclear')
+                turn_log.record('simple', user_input, 'unclear', sentiment=sentiment)
+                responses.append(self._handle_unclear_query())
+            else:
+                metrics.fallback('simple', 'default')
+                turn_log.record('simple', user_input, 'default', sentiment=sentiment)
+                responses.append(self._generate_default_response(sentiment))
+        return responses
+    
+    def match_faq(self, user_input: str, kb: Optional[KnowledgeBase] = None) -> Optional[FAQMatch]:
+        """Find the FAQ intent for the input, with a confidence score."""
+        if kb is None:
+            kb = self._load_faq()
+        return cached_faq_lookup(self.near_duplicates, kb, user_input, self.fuzzy_min_score)
+    
+    def _check_faq(self, user_input: str, match=_LOOKUP,
+                   kb: Optional[KnowledgeBase] = None) -> Tuple[Optional[FAQMatch], str]:
+        """Check if user input matches any FAQ questions; return the match and a response."""
+        if kb is None:
+            kb = self._load_faq()
+        if match is not _LOOKUP and match is not None and match.intent not in kb.faq:
+            # Matched against an older snapshot; a reload has since dropped the intent
+            match = _LOOKUP
+        if match is _LOOKUP:
+            match = cached_faq_lookup(self.near_duplicates, kb, user_input, self.fuzzy_min_score)
+        metrics.faq_lookup('simple', match)
+        if match is not None:
+            return match, random.choice(kb.faq[match.intent]['responses'])
         
-        return ""
+        return None, ""
     
     def _is_unclear_query(self, user_input: str) -> bool:
         """Determine if the user's query is unclear or vague."""
@@ -127,6 +202,7 @@ class SimpleChatbot:
 
 def main():
     print("Simple AI Chatbot: Hello! I'm your AI assistant. Type 'quit' to exit.")
+    start_background(ENGINE_TASKS['simple'])
     chatbot = SimpleChatbot()
     
     while True:
@@ -1,99 +1,130 @@
-import json
 import random
-from datetime import datetime
-from typing import Dict, List
+from typing import Dict, Iterable, Iterator, List, Optional
+from conversation_history import ConversationHistory
+from kb_registry import FAQ_PATH, FAQMatch, KnowledgeBase, get_knowledge_base, prefetch_knowledge_base
+from metrics import metrics
+from near_duplicate import NearDuplicateIndex, cached_faq_lookup, cached_faq_lookup_batch
+from turn_log import turn_log
+from warmup import ENGINE_TASKS, start_background
+
+DEFAULT_FAQ = {
+    "greetings": {
+        "patterns": ["hi", "hello", "hey", "good morning", "good afternoon", "good evening"],
+        "responses": ["Hello! How can I assist you today?", "Hi there! What can I help you with?"]
+    },
+    "goodbye": {
+        "patterns": ["bye", "goodbye", "see you", "farewell"],
+        "responses": ["Goodbye! Have a great day!", "Thank you for chatting with us. Goodbye!"]
+    },
+    "help": {
+        "patterns": ["help", "support", "assistance"],
+        "responses": ["I can help you with general inquiries, product information, and more."]
+    },
+    "thanks": {
+        "patterns": ["thank", "thanks", "appreciate"],
+        "responses": ["You're welcome!", "Happy to help!"]
+    },
+    "about": {
+        "patterns": ["who are you", "what are you", "your name"],
+        "responses": ["I'm a rule-based chatbot designed to help answer your questions."]
+    },
+    "default": {
+        "responses": [
+            "I'm not sure I understand. Could you rephrase that?",
+            "I don't have enough information to answer that. Could you provide more details?",
+            "I'm still learning. Could you ask me something else?"
+        ]
+    }
+}
 
 class RuleBasedChatbot:
-    def __init__(self):
-        self.conversation_history: List[Dict] = []
-        self.faq = self._load_faq()
+    def __init__(self, fuzzy_min_score: float = 3.0, faq_path: str = FAQ_PATH,
+                 history_capacity: int = 1000, history_max_bytes: Optional[int] = 1 << 20,
+                 near_duplicates: Optional[NearDuplicateIndex] = None):
+        self.conversation_history = ConversationHistory(capacity=history_capacity, max_bytes=history_max_bytes)
+        self.faq_path = faq_path
+        self.fuzzy_min_score = fuzzy_min_score
+        # Rephrasings of earlier questions reuse their FAQ match instead of rescanning
+        self.near_duplicates = near_duplicates
+        # Compiled off the critical path; the first reply waits for it if needed
+        prefetch_knowledge_base(self.faq_path, DEFAULT_FAQ)
         self.user_context = {}
     
-    def _load_faq(self) -> Dict:
-        """Load FAQ knowledge base from JSON file."""
-        try:
-            with open('faq_knowledge_base.json', 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except FileNotFoundError:
-            print("FAQ knowledge base not found. Using default FAQs.")
-            return {
-                "greetings": {
-                    "patterns": ["hi", "hello", "hey", "good morning", "good afternoon", "good evening"],
-                    "responses": ["Hello! How can I assist you today?", "Hi there! What can I help you with?"]
-                },
-                "goodbye": {
-                    "patterns": ["bye", "goodbye", "see you", "farewell"],
-                    "responses": ["Goodbye! Have a great day!", "Thank you for chatting with us. Goodbye!"]
-                },
-                "help": {
-                    "patterns": ["help", "support", "assistance"],
-                    "responses": ["I can help you with general inquiries, product information, and more."]
-                },
-                "thanks": {
-                    "patterns": ["thank", "thanks", "appreciate"],
-                    "responses": ["You're welcome!", "Happy to help!"]
-                },
-                "about": {
-                    "patterns": ["who are you", "what are you", "your name"],
-                    "responses": ["I'm a rule-based chatbot designed to help answer your questions."]
-                },
-                "default": {
-                    "responses": [
-                        "I'm not sure I understand. Could you rephrase that?",
-                        "I don't have enough information to answer that. Could you provide more details?",
-                        "I'm still learning. Could you ask me something else?"
-                    ]
-                }
-            }
+    def _load_faq(self) -> KnowledgeBase:
+        """Get the shared, precompiled FAQ knowledge base (reloaded when the file changes)."""
+        return get_knowledge_base(self.faq_path, DEFAULT_FAQ)
+    
+    @property
+    def faq(self) -> Dict:
+        return self._load_faq().faq
+    
+    def match_faq(self, user_input: str) -> Optional[FAQMatch]:
+        """Find the FAQ intent for the input, with a confidence score."""
+        return self._load_faq().lookup(user_input, self.fuzzy_min_score, first=True, skip=('default',))
     
     def get_response(self, user_input: str) -> str:
         """Generate a response to user input."""
-        # Add user input to conversation history
-        self.conversation_history.append({
-            'role': 'user',
-            'content': user_input,
-            'timestamp': datetime.now().isoformat()
-        })
-        
-        # Convert input to lowercase for matching
-        user_input_lower = user_input.lower()
-        
-        # Check for matches in FAQ
-        for intent, data in self.faq.items():
-            if intent == 'default':
-                continue
-                
-            # Check patterns
-            if 'patterns' in data:
-                for pattern in data['patterns']:
-                    if pattern.lower() in user_input_lower:
-                        response = random.choice(data['responses'])
-                        self._add_to_history('assistant', response)
-                        return response
+        with metrics.stage('rule', 'total'):
+            # Add user input to conversation history
+            self.conversation_history.append('user', user_input)
             
-            # Check keywords
-            if 'keywords' in data:
-                for keyword in data['keywords']:
-                    if keyword in user_input_lower:
-                        response = random.choice(data['responses'])
-                        self._add_to_history('assistant', response)
-                        return response
+            # Check for matches in FAQ
+            with metrics.stage('rule', 'faq'):
+                kb = self._load_faq()
+                match = cached_faq_lookup(self.near_duplicates, kb, user_input, self.fuzzy_min_score,
+                                          first=True, skip=('default',))
+            metrics.faq_lookup('rule', match)
+            
+            if match is not None:
+                turn_log.record('rule', user_input, 'faq', match)
+                response = random.choice(kb.faq[match.intent]['responses'])
+                self._add_to_history('assistant', response)
+                return response
+            
+            # Default response if no match found
+            metrics.fallback('rule', 'default')
+            turn_log.record('rule', user_input, 'default')
+            response = random.choice(kb.faq.get('default', {}).get('responses', ["I'm not sure how to respond to that."]))
+            self._add_to_history('assistant', response)
+            return response
+    
+    def get_responses(self, messages: Iterable[str], workers: int = 1,
+                      chunk_size: int = 256) -> Iterator[str]:
+        """Answer many independent messages, yielding replies in input order.
+
+        Conversation history is left untouched. With ``workers`` > 1 the
+        chunks are answered in a process pool (see batch_inference.py).
+        """
+        from batch_inference import respond_all
+        return respond_all(self, messages, workers, chunk_size)
+    
+    def _respond_batch(self, messages: List[str]) -> List[str]:
+        """Answer one chunk: FAQ matching runs once for the whole chunk."""
+        with metrics.stage('rule', 'batch'):
+            kb = self._load_faq()
+            matches = cached_faq_lookup_batch(self.near_duplicates, kb, messages, self.fuzzy_min_score,
+                                              first=True, skip=('default',))
         
-        # Default response if no match found
-        response = random.choice(self.faq.get('default', {}).get('responses', ["I'm not sure how to respond to that."]))
-        self._add_to_history('assistant', response)
-        return response
+        defaults = kb.faq.get('default', {}).get('responses', ["I'm not sure how to respond to that."])
+        responses = []
+        for user_input, match in zip(messages, matches):
+            metrics.faq_lookup('rule', match)
+            if match is not None:
+                turn_log.record('rule', user_input, 'faq', match)
+                responses.append(random.choice(kb.faq[match.intent]['responses']))
+            else:
+                metrics.fallback('rule', 'default')
+                turn_log.record('rule', user_input, 'default')
+                responses.append(random.choice(defaults))
+        return responses
     
     def _add_to_history(self, role: str, content: str):
         """Add a message to the conversation history."""
-        self.conversation_history.append({
-            'role': role,
-            'content': content,
-            'timestamp': datetime.now().isoformat()
-        })
+        self.conversation_history.append(role, content)
 
 def main():
     print("Simple Rule-Based Chatbot: Hello! I'm here to help. Type 'quit' to exit.")
+    start_background(ENGINE_TASKS['rule'])
     chatbot = RuleBasedChatbot()
     
     try:
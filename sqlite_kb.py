@@ -0,0 +1,367 @@
+"""SQLite-backed knowledge base for very large FAQ catalogs.
+
+The catalog lives in a local database instead of an in-memory dict, so
+start-up time and resident memory do not grow with the number of intents:
+intents are read on demand and only the hot ones are kept in an LRU cache.
+
+Exact matching keeps the in-memory semantics (patterns lowercased,
+keywords as-is, matched as substrings of the lowercased input, pattern
+hits before keyword hits, ties by catalog order). Every pattern and keyword
+is indexed under its longest word; any needle that occurs in the input has
+that word inside one whitespace-separated chunk of the input, so looking up
+the chunks' substrings finds every candidate, which is then verified with
+a real substring test.
+
+The ranked fallback scores exactly like faq_retrieval.FAQIndex (the same
+faq_terms tokenizer and BM25 parameters, and the same formula), so ``fuzzy_min_score``
+and the reported confidence mean the same with either backend. The
+importer precomputes every (term, intent) BM25 weight into a ``postings``
+table; a query sums the weights of its terms per intent. (SQLite's FTS5
+``bm25()`` uses a different IDF and tokenizer, so its scores are not
+comparable with the in-memory index and are not used.)
+
+Build a database from the JSON catalog (streamed, so it never has to fit
+in memory), then point a bot at it:
+
+    python sqlite_kb.py faq_knowledge_base.json faq.sqlite
+    SimpleChatbot(faq_path='faq.sqlite')
+
+Databases built by an older importer must be re-imported.
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from faq_matcher import KEYWORD, PATTERN
+from faq_terms import BM25_B, BM25_K1, tokenize
+from kb_registry import RETRIEVAL_HALF_CONFIDENCE, FAQMatch
+
+# Bump when the schema or scoring changes; older databases are rejected
+FORMAT_VERSION = 2
+
+_SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE intents (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL, data TEXT NOT NULL);
+CREATE TABLE needles (anchor TEXT NOT NULL, needle TEXT NOT NULL, kind INTEGER NOT NULL,
+                      intent_id INTEGER NOT NULL);
+CREATE TABLE postings (term TEXT NOT NULL, intent_id INTEGER NOT NULL, weight REAL NOT NULL);
+CREATE TEMP TABLE term_counts (term TEXT NOT NULL, intent_id INTEGER NOT NULL, tf INTEGER NOT NULL);
+CREATE TEMP TABLE doc_lengths (intent_id INTEGER PRIMARY KEY, length INTEGER NOT NULL);
+"""
+
+
+def _anchor(needle: str) -> str:
+    """The needle's longest word, under which it is indexed."""
+    return max(needle.split(), key=len, default='')
+
+
+def iter_json_object(path: str, chunk_size: int = 1 << 20) -> Iterator[Tuple[str, object]]:
+    """Yield the (key, value) pairs of a top-level JSON object without loading the whole file."""
+    decoder = json.JSONDecoder()
+    with open(path, encoding='utf-8') as f:
+        buffer = ''
+        pos = 0
+        eof = False
+
+        def fill() -> bool:
+            nonlocal buffer, pos, eof
+            chunk = f.read(chunk_size)
+            if not chunk:
+                eof = True
+                return False
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            return True
+
+        def skip_space():
+            nonlocal pos
+            while True:
+                while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+                    pos += 1
+                if pos < len(buffer) or not fill():
+                    return
+
+        def decode():
+            nonlocal pos
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if not eof and fill():
+                        continue
+                    raise
+                # A number at the end of the buffer may continue in the next chunk
+                if end == len(buffer) and not eof and fill():
+                    continue
+                pos = end
+                return value
+
+        def expect(char: str):
+            nonlocal pos
+            skip_space()
+            if pos >= len(buffer) or buffer[pos] != char:
+                raise ValueError(f"Expected {char!r} in {path} (offset {f.tell()})")
+            pos += 1
+
+        expect('{')
+        skip_space()
+        if buffer[pos:pos + 1] == '}':
+            return
+        while True:
+            skip_space()
+            key = decode()
+            expect(':')
+            skip_space()
+            yield key, decode()
+            skip_space()
+            if buffer[pos:pos + 1] == ',':
+                pos += 1
+                continue
+            expect('}')
+            return
+
+
+def import_json(json_path: str, db_path: str, batch_size: int = 1000) -> int:
+    """Build ``db_path`` from a JSON catalog, streaming it; return the number of intents.
+
+    The database is written next to the target and swapped in atomically.
+    """
+    tmp_path = f'{db_path}.{os.getpid()}.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    digest = hashlib.sha256()
+    count = 0
+    max_anchor = 0
+    try:
+        conn.executescript(_SCHEMA)
+        intents, needles, term_counts, lengths = [], [], [], []
+
+        def flush():
+            conn.executemany("INSERT INTO intents (id, name, data) VALUES (?, ?, ?)", intents)
+            conn.executemany("INSERT INTO needles VALUES (?, ?, ?, ?)", needles)
+            conn.executemany("INSERT INTO term_counts VALUES (?, ?, ?)", term_counts)
+            conn.executemany("INSERT INTO doc_lengths VALUES (?, ?)", lengths)
+            intents.clear()
+            needles.clear()
+            term_counts.clear()
+            lengths.clear()
+
+        for count, (name, data) in enumerate(iter_json_object(json_path), 1):
+            encoded = json.dumps(data, separators=(',', ':'))
+            digest.update(f'{name}\0{encoded}\0'.encode('utf-8'))
+            intents.append((count, name, encoded))
+            for pattern in data.get('patterns', ()):
+                needles.append((_anchor(pattern.lower()), pattern.lower(), PATTERN, count))
+            for keyword in data.get('keywords', ()):
+                needles.append((_anchor(keyword), keyword, KEYWORD, count))
+            if name != 'default':
+                # One document per intent, as FAQIndex builds it
+                tokens = tokenize(' '.join(list(data.get('patterns', ())) + list(data.get('keywords', ()))
+                                           + list(data.get('responses', ()))))
+                counts: Dict[str, int] = {}
+                for token in tokens:
+                    counts[token] = counts.get(token, 0) + 1
+                term_counts.extend((term, count, tf) for term, tf in counts.items())
+                lengths.append((count, len(tokens)))
+            if len(intents) >= batch_size:
+                max_anchor = max(max_anchor, max((len(n[0]) for n in needles), default=0))
+                flush()
+        max_anchor = max(max_anchor, max((len(n[0]) for n in needles), default=0))
+        flush()
+
+        _build_postings(conn)
+        conn.execute("CREATE INDEX needles_anchor ON needles (anchor)")
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", [
+            ('digest', digest.hexdigest()), ('intents', str(count)), ('max_anchor', str(max_anchor)),
+            ('format', str(FORMAT_VERSION)),
+        ])
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, db_path)
+    return count
+
+
+def _build_postings(conn: sqlite3.Connection):
+    """Turn the raw term counts into BM25 weights, computed exactly as FAQIndex does."""
+    num_docs, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM doc_lengths").fetchone()
+    avg_length = total / num_docs if num_docs and total else 1.0
+
+    def weight(tf: int, df: int, length: int) -> float:
+        idf = math.log1p((num_docs - df + 0.5) / (df + 0.5))
+        norm = BM25_K1 * (1.0 - BM25_B + BM25_B * length / avg_length)
+        return idf * tf * (BM25_K1 + 1.0) / (tf + norm)
+
+    conn.create_function('bm25_weight', 3, weight, deterministic=True)
+    conn.execute(
+        "INSERT INTO postings "
+        "SELECT t.term, t.intent_id, bm25_weight(t.tf, d.df, l.length) FROM term_counts t "
+        "JOIN (SELECT term, COUNT(*) AS df FROM term_counts GROUP BY term) d ON d.term = t.term "
+        "JOIN doc_lengths l ON l.intent_id = t.intent_id"
+    )
+    conn.execute("CREATE INDEX postings_term ON postings (term)")
+    conn.execute("DROP TABLE term_counts")
+    conn.execute("DROP TABLE doc_lengths")
+
+
+class LazyIntents(Mapping):
+    """Read-only mapping of intent name to intent data, loaded on access.
+
+    The ``maxsize`` most recently used intents are kept decoded in memory.
+    """
+
+    def __init__(self, kb: 'SQLiteKnowledgeBase', maxsize: int = 1024):
+        self._kb = kb
+        self.maxsize = maxsize
+        self._cache: 'OrderedDict[str, Dict]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __getitem__(self, name: str) -> Dict:
+        with self._lock:
+            data = self._cache.get(name)
+            if data is not None:
+                self._cache.move_to_end(name)
+                self.hits += 1
+                return data
+        row = self._kb._query("SELECT data FROM intents WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            raise KeyError(name)
+        data = json.loads(row[0])
+        with self._lock:
+            self.misses += 1
+            self._cache[name] = data
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        return data
+
+    def __iter__(self) -> Iterator[str]:
+        for (name,) in self._kb._query("SELECT name FROM intents ORDER BY id"):
+            yield name
+
+    def __len__(self) -> int:
+        return self._kb.size
+
+    def __contains__(self, name) -> bool:
+        if name in self._cache:
+            return True
+        return self._kb._query("SELECT 1 FROM intents WHERE name = ?", (name,)).fetchone() is not None
+
+
+class SQLiteKnowledgeBase:
+    """Knowledge base served from a database built by ``import_json``.
+
+    Offers the same ``faq`` mapping and ``lookup`` as kb_registry.KnowledgeBase,
+    so bots can use either. Connections are opened read-only, one per thread
+    (and per process after a fork).
+    """
+
+    def __init__(self, path: str, cache_size: int = 1024):
+        self.path = os.path.abspath(path)
+        self._local = threading.local()
+        meta = dict(self._query("SELECT key, value FROM meta").fetchall())
+        if meta.get('format') != str(FORMAT_VERSION):
+            raise ValueError(f"{path} was built by an older sqlite_kb.py; re-import it from the JSON catalog")
+        self.digest = meta['digest']
+        self.size = int(meta['intents'])
+        self.max_anchor = int(meta['max_anchor'])
+        self.faq = LazyIntents(self, cache_size)
+
+    def _query(self, sql: str, params: Sequence = ()) -> sqlite3.Cursor:
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            local.conn = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True, check_same_thread=False)
+            local.pid = os.getpid()
+        return local.conn.execute(sql, params)
+
+    def _fragments(self, text: str) -> List[str]:
+        # Every substring (up to the longest anchor) of every whitespace-separated chunk
+        fragments = {''}
+        limit = self.max_anchor
+        for chunk in set(text.split()):
+            for start in range(len(chunk)):
+                for end in range(start + 1, min(len(chunk), start + limit) + 1):
+                    fragments.add(chunk[start:end])
+        return list(fragments)
+
+    def _exact(self, user_input: str, first: bool, skip: Sequence[str]) -> Optional[Tuple[str, int]]:
+        text = user_input.lower()
+        rows = self._query(
+            "SELECT needles.intent_id, needles.kind, needles.needle, intents.name FROM needles "
+            "JOIN intents ON intents.id = needles.intent_id "
+            "WHERE needles.anchor IN (SELECT value FROM json_each(?))",
+            (json.dumps(self._fragments(text)),)
+        )
+        best = None
+        for intent_id, kind, needle, name in rows:
+            if name in skip or needle not in text:
+                continue
+            rank = (intent_id, kind) if first else (kind, intent_id)
+            if best is None or rank < best[0]:
+                best = (rank, name, kind)
+        if best is None:
+            return None
+        # With ``first``, an intent hit by both a pattern and a keyword ranks as a pattern hit
+        return best[1], best[2]
+
+    def search(self, query: str, k: int = 3, min_score: float = 3.0) -> List[Tuple[str, float]]:
+        """Return up to ``k`` (intent, BM25 score) pairs scoring at least ``min_score``.
+
+        Scores equal FAQIndex.search's for the same catalog: a repeated
+        query term counts once per occurrence, as it does there.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+        rows = self._query(
+            "SELECT intents.name, SUM(postings.weight) AS score FROM json_each(?) AS q "
+            "JOIN postings ON postings.term = q.value "
+            "JOIN intents ON intents.id = postings.intent_id "
+            "GROUP BY postings.intent_id ORDER BY score DESC, postings.intent_id LIMIT ?",
+            (json.dumps(terms), k)
+        )
+        return [(name, score) for name, score in rows if score >= min_score and score > 0]
+
+    def lookup(self, user_input: str, fuzzy_min_score: Optional[float] = None,
+               first: bool = False, skip: Sequence[str] = ()) -> Optional[FAQMatch]:
+        """Match exact patterns/keywords, falling back to ranked retrieval (see KnowledgeBase.lookup)."""
+        hit = self._exact(user_input, first, skip)
+        if hit is not None:
+            intent, kind = hit
+            if kind == PATTERN:
+                return FAQMatch(intent, 'pattern', 1.0)
+            return FAQMatch(intent, 'keyword', 0.75)
+
+        if fuzzy_min_score is not None:
+            for intent, score in self.search(user_input, 1 + len(skip), fuzzy_min_score):
+                if intent not in skip:
+                    return FAQMatch(intent, 'retrieval', score / (score + RETRIEVAL_HALF_CONFIDENCE))
+        return None
+
+    def lookup_batch(self, user_inputs: Sequence[str], fuzzy_min_score: Optional[float] = None,
+                     first: bool = False, skip: Sequence[str] = ()) -> List[Optional[FAQMatch]]:
+        """``lookup`` for many messages; each query is ranked with its own postings scan."""
+        return [self.lookup(user_input, fuzzy_min_score, first, skip) for user_input in user_inputs]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import a JSON FAQ catalog into an SQLite knowledge base.')
+    parser.add_argument('json_path')
+    parser.add_argument('db_path')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+    count = import_json(args.json_path, args.db_path, args.batch_size)
+    print(f"Imported {count} intents into {args.db_path}")
+
+
+if __name__ == '__main__':
+    main()
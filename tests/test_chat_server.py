@@ -0,0 +1,44 @@
+import asyncio
+import json
+import threading
+
+from chat_server import ChatServer, Session
+
+
+def _chat(server, payload):
+    return server._route('POST', '/chat', json.dumps(payload).encode())
+
+
+def test_non_string_message_is_rejected_without_a_session():
+    async def main():
+        server = ChatServer('simple')
+        status, payload = await _chat(server, {'message': 5, 'session_id': 'a'})
+        assert status == 400
+        assert 'message' in payload['error']
+        assert server.sessions == {}
+        status, payload = await _chat(server, {'message': 'hello', 'session_id': 'a'})
+        assert status == 200 and payload['session_id'] == 'a'
+        await server.close()
+
+    asyncio.run(main())
+
+
+class _SavingBot:
+    def __init__(self):
+        self.saved_on = None
+
+    def save_conversation_context(self):
+        self.saved_on = threading.get_ident()
+
+
+def test_evicted_session_is_saved_off_the_event_loop():
+    async def main():
+        server = ChatServer('simple', max_sessions=1)
+        bot = _SavingBot()
+        server.sessions['old'] = Session('old', 'simple', bot)
+        await server._session('new', None)
+        assert list(server.sessions) == ['new']
+        assert bot.saved_on is not None and bot.saved_on != threading.get_ident()
+        await server.close()
+
+    asyncio.run(main())
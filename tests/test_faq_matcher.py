@@ -0,0 +1,75 @@
+import json
+import random
+
+import pytest
+
+from faq_matcher import FAQMatcher
+
+
+def legacy_check_faq(faq, user_input):
+    """The two-pass scan AIChatbot/SimpleChatbot._check_faq used before FAQMatcher."""
+    user_input = user_input.lower()
+    for intent, data in faq.items():
+        for pattern in data.get('patterns', ()):
+            if pattern.lower() in user_input:
+                return intent
+    for intent, data in faq.items():
+        for keyword in data.get('keywords', ()):
+            if keyword in user_input:
+                return intent
+    return None
+
+
+def legacy_rule_scan(faq, user_input, skip=('default',)):
+    """The single per-intent scan RuleBasedChatbot.get_response used."""
+    user_input = user_input.lower()
+    for intent, data in faq.items():
+        if intent in skip:
+            continue
+        for pattern in data.get('patterns', ()):
+            if pattern.lower() in user_input:
+                return intent
+        for keyword in data.get('keywords', ()):
+            if keyword in user_input:
+                return intent
+    return None
+
+
+def _text(rng, alphabet='abAB c'):
+    # A tiny alphabet makes needles overlap, nest and share prefixes
+    return ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 5)))
+
+
+def _random_faq(rng):
+    return {
+        f'intent_{i}': {
+            'patterns': [_text(rng) for _ in range(rng.randint(0, 3))],
+            'keywords': [_text(rng) for _ in range(rng.randint(0, 2))],
+        }
+        for i in range(rng.randint(1, 8))
+    }
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_matches_the_nested_loops_on_random_catalogs(seed):
+    rng = random.Random(seed)
+    for _ in range(25):
+        faq = _random_faq(rng)
+        if rng.random() < 0.3:
+            faq['default'] = {'patterns': [_text(rng)]}
+        matcher = FAQMatcher(faq)
+        for _ in range(40):
+            query = _text(rng) + _text(rng) + _text(rng)
+            assert matcher.match(query) == legacy_check_faq(faq, query), (faq, query)
+            assert matcher.match_first(query, skip=('default',)) == legacy_rule_scan(faq, query), (faq, query)
+
+
+def test_matches_the_nested_loops_on_the_shipped_catalog(repo_root):
+    with open('faq_knowledge_base.json') as f:
+        faq = json.load(f)
+    with open('benchmarks/corpus.jsonl') as f:
+        queries = [json.loads(line)['message'] for line in f if line.strip()]
+    matcher = FAQMatcher(faq)
+    for query in queries:
+        assert matcher.match(query) == legacy_check_faq(faq, query), query
+        assert matcher.match_first(query, skip=('default',)) == legacy_rule_scan(faq, query), query
@@ -0,0 +1,25 @@
+from hybrid_router import HybridRouter
+from simple_chatbot import SimpleChatbot
+
+
+class _ReloadingBot(SimpleChatbot):
+    """Hot-reloads to a KB without any intents right after each lookup."""
+
+    def match_faq(self, user_input, kb=None):
+        match = super().match_faq(user_input, kb)
+        emptied = self._load_faq()._replace(faq={})
+        self._load_faq = lambda: emptied
+        return match
+
+
+def test_reload_between_route_and_answer_keeps_the_routed_snapshot():
+    router = HybridRouter(local=_ReloadingBot(), min_confidence=0.0, clarify=False, llm_factory=lambda: None)
+    assert router.get_response('What are your business hours?')
+    assert router.counts['faq'] == 1
+
+
+def test_match_from_a_dropped_intent_is_looked_up_again():
+    bot = SimpleChatbot()
+    match = bot.match_faq('What are your business hours?')
+    stale = match._replace(intent='renamed_away')
+    assert bot.respond_to_match(stale, 'What are your business hours?')
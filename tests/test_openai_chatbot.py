@@ -0,0 +1,27 @@
+import json
+
+from openai_chatbot import OpenAIChatbot
+
+
+def _bot():
+    return OpenAIChatbot(history_capacity=4, session_id='s', use_scheduler=False)
+
+
+def test_compaction_archives_turns_evicted_from_the_history(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    bot = _bot()
+    for i in range(10):
+        bot._record('user', f'm{i}')
+    bot.save_conversation_context()
+    for i in range(10, 13):
+        bot._record('user', f'm{i}')
+    bot.session_log.close()
+
+    # Recovery replays the uncompacted turns and evicts the oldest ones again
+    bot = _bot()
+    bot.save_conversation_context()
+    with open(bot.session_log.archive_path) as f:
+        archived = [json.loads(line)['content'] for line in f]
+    with open(bot.session_log.snapshot_path) as f:
+        kept = [m['content'] for m in json.load(f)['messages'] if m['role'] == 'user']
+    assert archived + kept == [f'm{i}' for i in range(13)]
@@ -0,0 +1,131 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from openai_scheduler import CircuitBreaker, CircuitOpenError, OpenAIScheduler, QueueFullError
+from openai_stub_server import serve_in_thread
+
+openai = pytest.importorskip('openai')
+
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(**options):
+        server, base_url = serve_in_thread(**options)
+        servers.append(server)
+        client = openai.OpenAI(base_url=base_url, api_key='test', max_retries=0)
+        return server, client
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def _chat(client, text='hello'):
+    return lambda: client.chat.completions.create(model='stub', messages=[{'role': 'user', 'content': text}])
+
+
+def test_client_errors_do_not_open_the_breaker(stub):
+    _, client = stub()
+    scheduler = OpenAIScheduler(breaker=CircuitBreaker(failure_threshold=2))
+    # The stub has no /embeddings route: a 404, the caller's fault
+    for _ in range(5):
+        with pytest.raises(openai.NotFoundError):
+            scheduler.submit(lambda: client.embeddings.create(model='stub', input='hello'))
+    assert scheduler.breaker.state == 'closed'
+    assert scheduler.counters['failed'] == 5
+    assert scheduler.submit(_chat(client)).choices[0].message.content == 'You said: hello'
+
+
+def test_upstream_failures_open_the_breaker(stub):
+    _, client = stub(fail_first=100, retry_after=0)
+    scheduler = OpenAIScheduler(max_retries=0, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+    for _ in range(2):
+        with pytest.raises(openai.RateLimitError):
+            scheduler.submit(_chat(client))
+    assert scheduler.breaker.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        scheduler.submit(_chat(client))
+
+
+def test_rate_limits_are_retried_until_the_request_succeeds(stub):
+    server, client = stub(fail_first=2, retry_after=0)
+    scheduler = OpenAIScheduler(base_delay=0.01)
+    assert scheduler.submit(_chat(client)).choices[0].message.content == 'You said: hello'
+    assert server.RequestHandlerClass.config.rate_limited == 2
+    assert scheduler.counters['retries'] == 2
+    assert scheduler.counters['rate_limited'] == 2
+    assert scheduler.breaker.state == 'closed'
+
+
+def test_retry_after_header_sets_the_backoff(stub):
+    _, client = stub(fail_first=1, retry_after=2.5)
+    scheduler = OpenAIScheduler(max_retries=0, base_delay=0.01)
+    with pytest.raises(openai.RateLimitError) as caught:
+        scheduler.submit(_chat(client))
+    assert 2.5 <= scheduler.backoff(0, caught.value) <= 2.5 + 0.01
+
+
+def test_async_submit_retries(stub):
+    import asyncio
+    server, _ = stub(fail_first=1, retry_after=0)
+    base_url = f'http://127.0.0.1:{server.server_address[1]}/v1'
+
+    async def main():
+        client = openai.AsyncOpenAI(base_url=base_url, api_key='test', max_retries=0)
+        scheduler = OpenAIScheduler(base_delay=0.01)
+        result = await scheduler.asubmit(lambda: client.chat.completions.create(
+            model='stub', messages=[{'role': 'user', 'content': 'hi'}]))
+        await client.close()
+        return scheduler, result
+
+    scheduler, result = asyncio.run(main())
+    assert result.choices[0].message.content == 'You said: hi'
+    assert scheduler.counters['retries'] == 1
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_full_queue_sheds_the_lowest_priority_request(stub):
+    _, client = stub(latency=0.3)
+    scheduler = OpenAIScheduler(max_concurrency=1, max_queue=1)
+    with ThreadPoolExecutor(4) as pool:
+        running = pool.submit(scheduler.submit, _chat(client, 'first'))
+        _wait_for(lambda: scheduler.stats()['in_flight'] == 1)
+        low = pool.submit(scheduler.submit, _chat(client, 'low'), 0, 5)
+        _wait_for(lambda: scheduler.stats()['queued'] == 1)
+        # Outranks the queued request, which is shed to make room
+        high = pool.submit(scheduler.submit, _chat(client, 'high'), 0, 0)
+        with pytest.raises(QueueFullError):
+            low.result(timeout=5)
+        _wait_for(lambda: scheduler.stats()['queued'] == 1)
+        # Does not outrank anything queued, so the newcomer itself is shed
+        with pytest.raises(QueueFullError):
+            scheduler.submit(_chat(client, 'lowest'), 0, 9)
+        assert running.result(timeout=5).choices[0].message.content == 'You said: first'
+        assert high.result(timeout=5).choices[0].message.content == 'You said: high'
+    assert scheduler.counters['shed'] == 2
+
+
+def test_half_open_trial_closes_the_breaker(stub):
+    _, client = stub(fail_first=2, retry_after=0)
+    scheduler = OpenAIScheduler(max_retries=0, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=0.1))
+    for _ in range(2):
+        with pytest.raises(openai.RateLimitError):
+            scheduler.submit(_chat(client))
+    with pytest.raises(CircuitOpenError):
+        scheduler.submit(_chat(client))
+    time.sleep(0.15)
+    assert scheduler.breaker.state == 'half-open'
+    assert scheduler.submit(_chat(client)).choices[0].message.content == 'You said: hello'
+    assert scheduler.breaker.state == 'closed'
+    assert scheduler.counters['rejected_open'] == 1
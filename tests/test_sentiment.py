@@ -0,0 +1,59 @@
+import random
+
+from sentiment import LexiconScorer, SentimentAnalyzer
+from simple_chatbot import NEGATIVE_WORDS, POSITIVE_WORDS, SimpleChatbot
+
+
+def legacy_sentiment(text):
+    """SimpleChatbot.analyze_sentiment before the lexicon automaton."""
+    text_lower = text.lower()
+    positive_count = sum(text_lower.count(word) for word in POSITIVE_WORDS)
+    negative_count = sum(text_lower.count(word) for word in NEGATIVE_WORDS)
+    if positive_count > negative_count:
+        return 1
+    elif negative_count > positive_count:
+        return -1
+    return 0
+
+
+def _messages(seed, count=3000):
+    rng = random.Random(seed)
+    pieces = POSITIVE_WORDS + NEGATIVE_WORDS + ['Good', 'THANK', 'you', 'not', 'bad!', 'x', ' ', '...']
+    for _ in range(count):
+        # Glued and spaced pieces: the legacy counts are substring counts
+        yield rng.choice(('', ' ')).join(rng.choice(pieces) for _ in range(rng.randint(0, 8)))
+
+
+def test_keyword_sentiment_matches_str_count():
+    bot = SimpleChatbot()
+    for text in _messages(0):
+        assert bot.analyze_sentiment(text) == legacy_sentiment(text), text
+
+
+def test_substring_lexicon_sums_str_counts():
+    lexicon = {word: 1 for word in POSITIVE_WORDS}
+    lexicon.update({word: -1 for word in NEGATIVE_WORDS})
+    scorer = LexiconScorer(lexicon, average=False, whole_words=False)
+    for text in _messages(1):
+        lower = text.lower()
+        expected = sum(lower.count(w) for w in POSITIVE_WORDS) - sum(lower.count(w) for w in NEGATIVE_WORDS)
+        assert scorer.score(text) == expected, text
+
+
+class _RecordingScorer:
+    def __init__(self):
+        self.seen = []
+
+    def score_batch(self, texts):
+        self.seen.extend(texts)
+        return [float(len(text)) for text in texts]
+
+
+def test_analyzer_scores_each_text_once_as_written():
+    scorer = _RecordingScorer()
+    analyzer = SentimentAnalyzer(scorer, maxsize=2)
+    assert analyzer.analyze_batch(['Bad  :D', 'Bad :D', 'ok']) == [7.0, 7.0, 2.0]
+    # Whitespace variants share a cache entry; case is kept for the scorer
+    assert scorer.seen == ['Bad  :D', 'ok']
+    assert analyzer.analyze('Bad :D') == 7.0
+    assert analyzer.cache_info()['hits'] == 1
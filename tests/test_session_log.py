@@ -0,0 +1,95 @@
+import shutil
+import threading
+import time
+
+from session_log import SessionLog
+
+
+def _messages(start, stop):
+    return [{'role': 'user', 'content': f'm{i}'} for i in range(start, stop)]
+
+
+def _log(tmp_path, **options):
+    return SessionLog(str(tmp_path / 'session.json'), **options)
+
+
+def test_replays_the_log_without_a_snapshot(tmp_path):
+    log = _log(tmp_path, sync='always')
+    for message in _messages(0, 5):
+        log.append(message)
+    log.close()
+    assert _log(tmp_path).load() == (None, _messages(0, 5))
+
+
+def test_recovers_the_snapshot_plus_newer_records(tmp_path):
+    log = _log(tmp_path)
+    for message in _messages(0, 5):
+        log.append(message)
+    log.compact(_messages(0, 5))
+    for message in _messages(5, 8):
+        log.append(message)
+    log.close()
+
+    recovered = _log(tmp_path)
+    assert recovered.load() == (_messages(0, 5), _messages(5, 8))
+    # Sequence numbers carry on after recovery
+    recovered.append(_messages(8, 9)[0])
+    recovered.close()
+    assert _log(tmp_path).load() == (_messages(0, 5), _messages(5, 9))
+
+
+def test_crash_before_truncating_the_log_replays_nothing_twice(tmp_path):
+    log = _log(tmp_path)
+    for message in _messages(0, 4):
+        log.append(message)
+    log.flush()
+    shutil.copy(log.log_path, tmp_path / 'before.jsonl')
+    log.compact(_messages(0, 4))
+    log.close()
+    # The snapshot was replaced but the old log survived
+    shutil.copy(tmp_path / 'before.jsonl', log.log_path)
+    assert _log(tmp_path).load() == (_messages(0, 4), [])
+
+
+def test_torn_write_is_truncated(tmp_path):
+    log = _log(tmp_path, sync='always')
+    for message in _messages(0, 3):
+        log.append(message)
+    log.close()
+    with open(log.log_path, 'a') as f:
+        f.write('{"seq": 4, "role": "us')
+
+    recovered = _log(tmp_path)
+    assert recovered.load() == (None, _messages(0, 3))
+    recovered.append(_messages(3, 4)[0])
+    recovered.close()
+    assert _log(tmp_path).load() == (None, _messages(0, 4))
+
+
+def test_group_commit_flushes_a_quiet_session(tmp_path):
+    log = _log(tmp_path, sync='group', group_size=100, group_interval=0.05)
+    log.append(_messages(0, 1)[0])
+    log.append(_messages(1, 2)[0])
+    deadline = time.monotonic() + 5
+    while _log(tmp_path).load()[1] != _messages(0, 2):
+        assert time.monotonic() < deadline, 'held-back records were never written'
+        time.sleep(0.02)
+
+
+def test_background_log_never_writes_on_the_caller(tmp_path):
+    log = _log(tmp_path, sync='always', background=True)
+    writers = []
+    write_records = log._write_records
+
+    def recording(records, fsync):
+        writers.append(threading.get_ident())
+        write_records(records, fsync)
+
+    log._write_records = recording
+    for message in _messages(0, 3):
+        log.append(message)
+    deadline = time.monotonic() + 5
+    while _log(tmp_path).load()[1] != _messages(0, 3):
+        assert time.monotonic() < deadline, 'queued records were never written'
+        time.sleep(0.02)
+    assert writers and threading.get_ident() not in writers
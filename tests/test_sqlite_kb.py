@@ -0,0 +1,63 @@
+import json
+import random
+
+import pytest
+
+from kb_registry import get_knowledge_base
+from sqlite_kb import SQLiteKnowledgeBase, import_json
+
+pytest.importorskip('numpy')
+
+
+def _queries(repo_root):
+    with open('benchmarks/corpus.jsonl') as f:
+        return [json.loads(line)['message'] for line in f if line.strip()]
+
+
+def _generated_catalog(path, intents=300, seed=0):
+    rng = random.Random(seed)
+    words = [f'w{i}' for i in range(400)] + ['refund', 'password', 'order', 'shipping', 'account']
+
+    def phrase(n):
+        return ' '.join(rng.choice(words) for _ in range(n))
+
+    faq = {f'intent_{i}': {'patterns': [phrase(3) for _ in range(3)], 'keywords': [rng.choice(words)],
+                           'responses': [phrase(8)]} for i in range(intents)}
+    with open(path, 'w') as f:
+        json.dump(faq, f)
+    return [phrase(rng.randint(1, 6)) for _ in range(500)]
+
+
+def _assert_same(memory, sqlite, queries):
+    for query in queries:
+        expected = memory.lookup(query, 3.0)
+        actual = sqlite.lookup(query, 3.0)
+        assert (actual is None) == (expected is None), query
+        if expected is not None:
+            assert (actual.intent, actual.source) == (expected.intent, expected.source), query
+            assert actual.confidence == pytest.approx(expected.confidence, abs=1e-9), query
+        expected_scores = [score for _, score in memory.index.search(query, 5, 0.0)]
+        actual_scores = [score for _, score in sqlite.search(query, 5, 0.0)]
+        assert actual_scores == pytest.approx(expected_scores, abs=1e-9), query
+
+
+def test_shipped_catalog_looks_up_the_same(tmp_path, repo_root):
+    db = str(tmp_path / 'faq.sqlite')
+    import_json('faq_knowledge_base.json', db)
+    _assert_same(get_knowledge_base('faq_knowledge_base.json'), SQLiteKnowledgeBase(db), _queries(repo_root))
+
+
+def test_generated_catalog_looks_up_the_same(tmp_path):
+    catalog = str(tmp_path / 'catalog.json')
+    queries = _generated_catalog(catalog)
+    db = str(tmp_path / 'catalog.sqlite')
+    import_json(catalog, db)
+    _assert_same(get_knowledge_base(catalog), SQLiteKnowledgeBase(db), queries)
+
+
+def test_lookup_batch_matches_lookup(tmp_path, repo_root):
+    db = str(tmp_path / 'faq.sqlite')
+    import_json('faq_knowledge_base.json', db)
+    kb = SQLiteKnowledgeBase(db)
+    queries = _queries(repo_root)[:200]
+    assert kb.lookup_batch(queries, 3.0) == [kb.lookup(query, 3.0) for query in queries]
@@ -0,0 +1,35 @@
+import os
+import signal
+import time
+
+import pytest
+
+from worker_pool import WorkerPool
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'fork'), reason='the worker pool forks')
+
+
+def _wait_for_respawn(pool, pid, timeout=10):
+    deadline = time.monotonic() + timeout
+    while pool.pids[0] == pid:
+        assert time.monotonic() < deadline, 'worker was not respawned'
+        time.sleep(0.05)
+
+
+def test_replies_in_order():
+    with WorkerPool('simple', workers=2) as pool:
+        futures = [pool.submit(f"s{i % 3}", 'hello') for i in range(20)]
+        assert all(isinstance(future.result(timeout=10), str) for future in futures)
+
+
+def test_killed_worker_fails_pending_and_is_respawned():
+    with WorkerPool('simple', workers=1) as pool:
+        assert pool.get_response('a', 'hello')
+        pid = pool.pids[0]
+        os.kill(pid, signal.SIGKILL)
+        # A turn sent around the crash fails (or reaches the new worker); it never hangs
+        future = pool.submit('a', 'hello')
+        error = future.exception(timeout=10)
+        assert error is None or 'worker exited' in str(error)
+        _wait_for_respawn(pool, pid)
+        assert pool.submit('a', 'hello').result(timeout=10)
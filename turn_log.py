@@ -0,0 +1,59 @@
+"""Structured per-turn match records for offline analysis.
+
+Each turn a bot answers is written as one JSON line saying how it was
+answered:
+
+    {"timestamp": "...", "bot": "ai", "query": "...", "outcome": "default",
+     "intent": null, "source": null, "confidence": null, "sentiment": -0.4}
+
+``outcome`` is ``faq`` (an intent matched), ``unclear`` (the clarifying
+prompt), ``default`` (no match: the generic reply) or ``llm`` (the hybrid
+router escalated to OpenAI). ``analytics.py`` reads these files.
+
+Disabled by default; set ``CHATBOT_TURN_LOG`` to a path (or ``1`` for
+``turns.jsonl``) or call ``turn_log.enable(path)``. Records go through the
+batched background writer in feedback_sink, so logging never blocks a reply.
+"""
+import os
+from datetime import datetime
+from typing import Optional
+
+from feedback_sink import get_feedback_sink
+from kb_registry import FAQMatch
+
+TURN_LOG_PATH = 'turns.jsonl'
+
+
+class TurnLog:
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def enable(self, path: str = TURN_LOG_PATH):
+        self.path = path
+
+    def disable(self):
+        self.path = None
+
+    def record(self, bot: str, query: str, outcome: str, match: Optional[FAQMatch] = None,
+               sentiment: Optional[float] = None):
+        """Queue one turn's record; returns immediately when disabled."""
+        if self.path is None:
+            return
+        get_feedback_sink(self.path).submit({
+            'timestamp': datetime.now().isoformat(),
+            'bot': bot,
+            'query': query,
+            'outcome': outcome,
+            'intent': match.intent if match is not None else None,
+            'source': match.source if match is not None else None,
+            'confidence': round(match.confidence, 4) if match is not None else None,
+            'sentiment': sentiment,
+        })
+
+
+_env_path = os.getenv('CHATBOT_TURN_LOG', '')
+turn_log = TurnLog(None if _env_path in ('', '0') else TURN_LOG_PATH if _env_path == '1' else _env_path)
@@ -0,0 +1,111 @@
+"""Warm up the slow first-use steps of the chatbots.
+
+Heavy imports (NumPy, TextBlob, openai), compiling the knowledge base and
+loading TextBlob's lexicon are deferred until first use so the entry
+points start quickly. ``start_background`` runs them on a daemon thread
+while the user is still typing. ``python warmup.py`` runs them ahead of
+time, for example in a container build or before a deploy. It also writes
+the compiled knowledge base snapshot to .kb_cache, so later cold starts
+skip the compile.
+
+Usage: python warmup.py [--engines ai simple rule openai hybrid] [--faq-path faq_knowledge_base.json]
+"""
+import argparse
+import logging
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from kb_registry import FAQ_PATH, get_knowledge_base
+
+
+def warm_knowledge_base(faq_path: str = FAQ_PATH):
+    try:
+        get_knowledge_base(faq_path)
+    except FileNotFoundError:
+        # The bots fall back to their built-in FAQs; nothing to compile
+        pass
+
+
+def warm_sentiment(faq_path: str = FAQ_PATH):
+    from sentiment import get_analyzer
+    get_analyzer('textblob').scorer.score_batch(['warm up'])
+
+
+def warm_openai(faq_path: str = FAQ_PATH):
+    import openai  # noqa: F401
+    from openai_chatbot import load_env
+    load_env()
+
+
+def warm_tokenizer(faq_path: str = FAQ_PATH):
+    from context_window import get_encoding
+    get_encoding()
+
+
+TASKS = {
+    'kb': warm_knowledge_base,
+    'sentiment': warm_sentiment,
+    'openai': warm_openai,
+    'tokenizer': warm_tokenizer,
+}
+
+ENGINE_TASKS = {
+    'ai': ('kb', 'sentiment'),
+    'simple': ('kb',),
+    'rule': ('kb',),
+    'openai': ('openai', 'tokenizer'),
+    'hybrid': ('kb', 'openai', 'tokenizer'),
+}
+
+_started: Dict[str, threading.Thread] = {}
+_started_lock = threading.Lock()
+
+
+def tasks_for(engines: Iterable[str]) -> List[str]:
+    return list(dict.fromkeys(task for engine in engines for task in ENGINE_TASKS[engine]))
+
+
+def warm(tasks: Iterable[str], faq_path: str = FAQ_PATH) -> Dict[str, float]:
+    """Run the tasks now; return the seconds each one took."""
+    timings = {}
+    for task in tasks:
+        start = time.perf_counter()
+        try:
+            TASKS[task](faq_path)
+        except ImportError as e:
+            logging.info(f"Skipping {task} warm-up: {e}")
+        timings[task] = time.perf_counter() - start
+    return timings
+
+
+def start_background(tasks: Iterable[str], faq_path: str = FAQ_PATH):
+    """Run the tasks on a daemon thread; each task is started at most once per process."""
+    with _started_lock:
+        pending = [task for task in tasks if task not in _started]
+        if not pending:
+            return
+        thread = threading.Thread(target=warm, args=(pending, faq_path), name='warmup', daemon=True)
+        for task in pending:
+            _started[task] = thread
+    thread.start()
+
+
+def wait(timeout: Optional[float] = None):
+    """Block until every background warm-up started so far has finished."""
+    for thread in set(_started.values()):
+        thread.join(timeout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--engines', nargs='+', choices=sorted(ENGINE_TASKS), default=['ai', 'openai'])
+    parser.add_argument('--faq-path', default=FAQ_PATH)
+    args = parser.parse_args()
+
+    for task, seconds in warm(tasks_for(args.engines), args.faq_path).items():
+        print(f"{task:>10}: {seconds * 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
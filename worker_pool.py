@@ -0,0 +1,205 @@
+"""Prefork worker pool for the CPU-bound FAQ bots.
+
+The parent loads the knowledge base, its compiled matcher and index and the
+TextBlob models once, freezes them out of the garbage collector and then
+forks the workers, so every worker shares those pages copy-on-write
+instead of holding its own copy. Each session is pinned to one worker (by a
+stable hash of its id), so its conversation history lives in exactly one
+process.
+"""
+import gc
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import zlib
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import List, Optional
+
+from chat_server import create_bot
+from kb_registry import FAQ_PATH, get_knowledge_base
+from warmup import ENGINE_TASKS, warm
+
+POOL_ENGINES = ('ai', 'simple', 'rule', 'hybrid')
+
+
+def preload(engine: str = 'ai', faq_path: str = FAQ_PATH):
+    """Load everything the workers share, then freeze it so GC never dirties those pages."""
+    from ai_chatbot import DEFAULT_FAQ
+    get_knowledge_base(faq_path, DEFAULT_FAQ)
+    create_bot(engine, 'preload')
+    warm(ENGINE_TASKS[engine], faq_path)
+    gc.collect()
+    if hasattr(gc, 'freeze'):
+        gc.freeze()
+
+
+def _worker_main(conn, engine: str, max_sessions: int):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    sessions: 'OrderedDict[str, object]' = OrderedDict()
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+        kind, session_id, message = request
+        if kind == 'end':
+            sessions.pop(session_id, None)
+            continue
+        try:
+            bot = sessions.get(session_id)
+            if bot is None:
+                bot = sessions[session_id] = create_bot(engine, session_id)
+                if len(sessions) > max_sessions:
+                    sessions.popitem(last=False)
+            sessions.move_to_end(session_id)
+            conn.send((True, bot.get_response(message)))
+        except Exception as e:
+            conn.send((False, f"{type(e).__name__}: {e}"))
+
+
+class _Worker:
+    __slots__ = ('process', 'conn', 'lock', 'pending', 'alive', 'outbox', 'reader', 'writer')
+
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        self.lock = threading.Lock()
+        self.pending: deque = deque()
+        # Cleared by the reader once the process is gone; submit then fails fast
+        self.alive = True
+        # Requests waiting for the writer thread; conn.send blocks while the pipe is full
+        self.outbox: queue.Queue = queue.Queue()
+        self.reader: Optional[threading.Thread] = None
+        self.writer: Optional[threading.Thread] = None
+
+
+class WorkerPool:
+    """Forked worker processes answering turns with session affinity.
+
+    ``submit`` returns a Future and is safe to call from any thread (or via
+    ``asyncio.wrap_future`` from an event loop): it never blocks, because a
+    writer thread per worker does the pipe sends. Each worker answers its
+    requests in order, so replies are matched to callers FIFO per worker.
+    A worker that dies fails its pending turns and is respawned; the
+    sessions it held start over with an empty history.
+    """
+
+    def __init__(self, engine: str = 'ai', workers: Optional[int] = None,
+                 faq_path: str = FAQ_PATH, max_sessions: int = 10000):
+        if engine not in POOL_ENGINES:
+            raise ValueError(f"Engine {engine!r} cannot run in the worker pool")
+        self.engine = engine
+        self.size = workers or os.cpu_count() or 1
+        self.faq_path = faq_path
+        self.max_sessions = max_sessions
+        self._workers: List[_Worker] = []
+        self._closing = False
+
+    def start(self) -> 'WorkerPool':
+        preload(self.engine, self.faq_path)
+        self._closing = False
+        self._workers = [self._spawn(index) for index in range(self.size)]
+        return self
+
+    def _spawn(self, index: int) -> _Worker:
+        context = multiprocessing.get_context('fork')
+        parent_conn, child_conn = context.Pipe()
+        process = context.Process(target=_worker_main, daemon=True,
+                                  args=(child_conn, self.engine, self.max_sessions))
+        process.start()
+        child_conn.close()
+        worker = _Worker(process, parent_conn)
+        worker.reader = threading.Thread(target=self._read_replies, args=(worker, index), daemon=True)
+        worker.reader.start()
+        worker.writer = threading.Thread(target=self._send_requests, args=(worker,), daemon=True)
+        worker.writer.start()
+        return worker
+
+    @property
+    def pids(self) -> List[int]:
+        return [worker.process.pid for worker in self._workers]
+
+    def _worker_for(self, session_id: str) -> _Worker:
+        return self._workers[zlib.crc32(session_id.encode('utf-8')) % len(self._workers)]
+
+    def submit(self, session_id: str, message: str) -> Future:
+        """Queue one turn on the session's worker."""
+        worker = self._worker_for(session_id)
+        future: Future = Future()
+        with worker.lock:
+            if not worker.alive:
+                future.set_exception(RuntimeError('worker exited'))
+                return future
+            worker.pending.append(future)
+            worker.outbox.put(('turn', session_id, message))
+        return future
+
+    def get_response(self, session_id: str, message: str) -> str:
+        return self.submit(session_id, message).result()
+
+    def end_session(self, session_id: str):
+        """Drop the session's bot from its worker."""
+        self._worker_for(session_id).outbox.put(('end', session_id, None))
+
+    @staticmethod
+    def _send_requests(worker: _Worker):
+        while True:
+            request = worker.outbox.get()
+            try:
+                worker.conn.send(request)
+            except OSError:
+                # The worker is gone; _read_replies fails its pending futures
+                break
+            if request is None:
+                break
+
+    def _read_replies(self, worker: _Worker, index: int):
+        while True:
+            try:
+                ok, value = worker.conn.recv()
+            except (EOFError, OSError):
+                break
+            future = worker.pending.popleft()
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(RuntimeError(value))
+        with worker.lock:
+            worker.alive = False
+            failed = list(worker.pending)
+            worker.pending.clear()
+        # Stop the writer, which may be waiting on an empty outbox
+        worker.outbox.put(None)
+        for future in failed:
+            future.set_exception(RuntimeError('worker exited'))
+        if self._closing:
+            return
+        worker.process.join(timeout=5)
+        logging.warning(f"Worker {worker.process.pid} exited (code {worker.process.exitcode}); respawning")
+        worker.conn.close()
+        self._workers[index] = self._spawn(index)
+
+    def close(self):
+        self._closing = True
+        for worker in self._workers:
+            worker.outbox.put(None)
+        for worker in self._workers:
+            worker.writer.join(timeout=5)
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                logging.warning(f"Worker {worker.process.pid} did not exit; terminating")
+                worker.process.terminate()
+            worker.conn.close()
+        self._workers = []
+
+    def __enter__(self) -> 'WorkerPool':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()